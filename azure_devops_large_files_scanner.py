@@ -2,25 +2,2621 @@
 # azure_devops_large_files_scanner.py
 
 import requests
+import argparse
+import base64
+import codecs
+import csv
+import hashlib
+import heapq
+import hmac
+import importlib
 import json
-from typing import List, Dict
-from collections import defaultdict
-from datetime import datetime
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-from openpyxl.utils import get_column_letter
+import os
+import queue
+import random
+import re
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import weakref
+from requests.adapters import HTTPAdapter
+from array import array
+from typing import List, Dict, Iterable, Iterator, Tuple
+from collections import deque
+from collections.abc import Mapping, Sequence
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ExitStack, closing, contextmanager, redirect_stdout
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from fnmatch import fnmatchcase
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, urlsplit, urlunsplit
+
+class _IncrementalJsonReader:
+    """Pull-style JSON tokenizer over an iterable of byte chunks"""
+
+    WHITESPACE = ' \t\r\n'
+    NUMBER_TAIL = re.compile(r'[0-9+\-.eE]*')  # What may still continue a number
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self._decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+
+    def _fill(self) -> bool:
+        """Append the next chunk, dropping what has been consumed; False at end of input"""
+        for chunk in self._chunks:
+            text = self._utf8.decode(chunk)
+            if text:
+                self.buffer = self.buffer[self.pos:] + text
+                self.pos = 0
+                return True
+        return False
+
+    def peek(self) -> str:
+        """Next non-whitespace character, or '' at end of input"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in self.WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char: str):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Malformed JSON stream: expected {char!r}, found {found or 'end of input'!r}")
+        self.pos += 1
+
+    def skip(self, char: str) -> bool:
+        """Consume ``char`` if it is next"""
+        if self.peek() == char:
+            self.pos += 1
+            return True
+        return False
+
+    def value(self):
+        """Decode one complete JSON value, reading more chunks until it is complete"""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number is complete only once something that cannot continue it follows;
+            # "0." or "1e" at the end of a chunk decodes as a shorter number
+            if type(value) in (int, float) and self.NUMBER_TAIL.fullmatch(self.buffer, end) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_json_array_items(chunks: Iterable[bytes], key: str = 'value') -> Iterator:
+    """
+    Incrementally yield the elements of a top-level array in a JSON object
+
+    Only the element being decoded and the unconsumed part of the current
+    chunk are held in memory, so a multi-megabyte ``{"count": n, "value": [...]}``
+    listing is processed in constant space while it downloads. A truncated
+    body raises ValueError instead of silently ending the iteration.
+    """
+    reader = _IncrementalJsonReader(chunks)
+    reader.expect('{')
+    if reader.skip('}'):
+        return
+    while True:
+        name = reader.value()
+        if not isinstance(name, str):
+            raise ValueError(f"Malformed JSON stream: expected a member name, found {name!r}")
+        reader.expect(':')
+        if name != key:
+            reader.value()
+        else:
+            reader.expect('[')
+            if not reader.skip(']'):
+                while True:
+                    yield reader.value()
+                    if not reader.skip(','):
+                        reader.expect(']')
+                        break
+        if not reader.skip(','):
+            reader.expect('}')
+            return
+
+
+def _atomic_write_json(path: str, data):
+    """Write JSON to ``path`` via a temporary file and rename, so readers never see a partial file"""
+    _atomic_write_text(path, json.dumps(data))
+
+
+def _atomic_write_text(path: str, text: str):
+    """Write ``text`` to ``path`` via a temporary file and rename"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix='.tmp-', suffix=os.path.splitext(path)[1], dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class ScanCache:
+    """
+    Persistent per-repository scan results for incremental re-scans
+
+    Entries are keyed by repository ID and store the default-branch head
+    commit they were computed at. A repository whose head has not moved is
+    served from the cache instead of being re-listed. Keying on the ID keeps
+    entries valid across repository renames; entries for repositories that
+    no longer exist are evicted after each scan. The whole cache is dropped
+    when it was built with a different minimum file size. Entries keep the
+    repository's BlobDigests, so cached repositories count towards the
+    unique-blob totals.
+    """
+
+    VERSION = 3
+
+    def __init__(self, path: str, min_size_bytes: int):
+        self.path = path
+        self.min_size_bytes = min_size_bytes
+        self.entries = {}
+        self._lock = threading.Lock()
+
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == self.VERSION and data.get('min_size_bytes') == min_size_bytes:
+                self.entries = data['repositories']
+
+    def get(self, repo_id: str, head_commit: str) -> Dict:
+        """Cached repository result, or None if missing or computed at another commit"""
+        with self._lock:
+            entry = self.entries.get(repo_id)
+        if entry is None or entry['head'] != head_commit:
+            return None
+        return entry['result']
+
+    def put(self, repo_id: str, head_commit: str, repo_result: Dict):
+        """Store a successfully scanned repository"""
+        result = {
+            'total_files_scanned': repo_result['total_files_scanned'],
+            'large_files': repo_result['large_files'],
+            'histogram': repo_result['histogram'].to_dict(),
+            'extension_histograms': {
+                ext: histogram.to_dict() for ext, histogram in repo_result['extension_histograms'].items()
+            },
+            'blobs': repo_result['blobs'].to_dict(),
+        }
+        with self._lock:
+            self.entries[repo_id] = {
+                'head': head_commit,
+                'project': repo_result['project'],
+                'repository': repo_result['repository'],
+                'result': result,
+            }
+
+    def evict(self, live_repo_ids: set, unlisted_projects: set = frozenset()) -> int:
+        """
+        Drop entries for repositories that were not seen in this scan
+
+        Entries of projects whose repository listing failed are kept, since
+        their repositories were not necessarily deleted.
+        """
+        with self._lock:
+            stale = [
+                repo_id for repo_id, entry in self.entries.items()
+                if repo_id not in live_repo_ids and entry['project'] not in unlisted_projects
+            ]
+            for repo_id in stale:
+                del self.entries[repo_id]
+        return len(stale)
+
+    def save(self):
+        with self._lock:
+            data = {
+                'version': self.VERSION,
+                'min_size_bytes': self.min_size_bytes,
+                'repositories': self.entries,
+            }
+            _atomic_write_json(self.path, data)
+
+
+def _repo_result_to_json(repo_result: Dict) -> Dict:
+    """JSON-serializable copy of a per-repository scan result"""
+    data = dict(repo_result)
+    if data['histogram'] is not None:
+        data['histogram'] = data['histogram'].to_dict()
+    data['extension_histograms'] = {
+        ext: histogram.to_dict() for ext, histogram in data['extension_histograms'].items()
+    }
+    if data.get('blobs') is not None:
+        data['blobs'] = data['blobs'].to_dict()
+    return data
+
+
+def _repo_result_from_json(data: Dict) -> Dict:
+    """Inverse of _repo_result_to_json"""
+    repo_result = dict(data)
+    if repo_result['histogram'] is not None:
+        repo_result['histogram'] = SizeHistogram.from_dict(repo_result['histogram'])
+    repo_result['extension_histograms'] = {
+        ext: SizeHistogram.from_dict(histogram) for ext, histogram in repo_result['extension_histograms'].items()
+    }
+    if repo_result.get('blobs') is not None:
+        repo_result['blobs'] = BlobDigests.from_dict(repo_result['blobs'])
+    return repo_result
+
+
+def _shard_of(repo_id: str, shard_count: int) -> int:
+    """
+    Shard (1..shard_count) a repository belongs to
+
+    Hashes the repository ID, so the assignment is the same on every
+    process and machine and does not move when repositories are renamed.
+    """
+    digest = hashlib.sha1(repo_id.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % shard_count + 1
+
+
+def parse_shard(text: str) -> Tuple[int, int]:
+    """Parse an ``i/N`` shard specification (1 <= i <= N)"""
+    try:
+        index, count = (int(part) for part in text.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected i/N, got {text!r}")
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"shard index must be between 1 and {count}, got {index}")
+    return index, count
+
+
+def read_token(env_var: str = None, token_file: str = None) -> str:
+    """Bearer token from ``token_file`` ('-' for stdin), else from the ``env_var`` environment variable"""
+    if token_file == '-':
+        return sys.stdin.readline().strip()
+    if token_file:
+        with open(token_file, encoding='utf-8') as f:
+            return f.read().strip()
+    return os.environ.get(env_var) if env_var else None
+
+
+def parse_organization(spec: str, default_token: str = None) -> Tuple[str, str]:
+    """Parse a ``NAME[:TOKEN_VAR]`` organization; without a variable the token is ``default_token``"""
+    organization, _, token_var = spec.partition(':')
+    if not token_var:
+        return organization, default_token
+    if not os.environ.get(token_var):
+        raise ValueError(f"{token_var} is not set (token of organization {organization})")
+    return organization, os.environ[token_var]
+
+
+class ScanCheckpoint:
+    """
+    Journal of completed repositories, so an interrupted scan can resume
+
+    The file is a JSON Lines journal: a header identifying the organization
+    and size threshold, then one line per finished repository (its full
+    result, including large files and histograms) and per finished project.
+    The header is written atomically and every record goes out in a single
+    write, so a crash can at most leave a torn last line, which is ignored
+    on load. Records are fsynced every ``sync_interval`` seconds and when
+    the journal is closed. Failed repositories are not recorded and are
+    retried on resume. Records include the repository's BlobDigests, which
+    the resumed run adds to its BlobIndex. A journal is only resumed by a
+    scan with the same threshold and branch patterns.
+    """
+
+    VERSION = 2
+
+    def __init__(self, path: str, organization: str, min_size_bytes: int, sync_interval: float = 30.0,
+                 branches: List[str] = None):
+        self.path = path
+        self.organization = organization
+        self.min_size_bytes = min_size_bytes
+        self.branches = branches
+        self.sync_interval = sync_interval
+        self.completed_projects = set()
+        self._file = None
+        self._last_sync = 0.0
+
+    def _header(self) -> Dict:
+        header = {
+            'type': 'header',
+            'version': self.VERSION,
+            'organization': self.organization,
+            'min_size_bytes': self.min_size_bytes,
+        }
+        if self.branches is not None:
+            header['branches'] = list(self.branches)
+        return header
+
+    def load(self) -> Dict[str, Dict]:
+        """Completed repository results by repository ID; empty if there is no usable journal"""
+        repositories = {}
+        self.completed_projects = set()
+        if not os.path.exists(self.path):
+            return repositories
+
+        with open(self.path, 'rb') as f:
+            content = f.read()
+        lines = content.decode('utf-8', errors='replace').split('\n')
+        try:
+            header = json.loads(lines[0])
+        except ValueError:
+            return repositories
+        if header != self._header():
+            return repositories
+
+        for line in lines[1:]:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # Torn write at the end of an interrupted journal
+            if record['type'] == 'repository':
+                repo_result = _repo_result_from_json(record['result'])
+                repositories[repo_result['repo_id']] = repo_result
+            elif record['type'] == 'project':
+                self.completed_projects.add(record['name'])
+        return repositories
+
+    def start(self, resume: bool = False) -> Dict[str, Dict]:
+        """
+        Open the journal for appending
+
+        With ``resume``, returns the repositories completed by a previous
+        run and keeps appending to its journal; otherwise (or if no matching
+        journal exists) starts a new one and returns an empty dict.
+        """
+        completed = self.load() if resume else {}
+        if completed:
+            # Drop a torn last line so new records start on a line of their own
+            with open(self.path, 'rb+') as f:
+                content = f.read()
+                f.truncate(content.rfind(b'\n') + 1)
+        else:
+            self.completed_projects = set()
+            _atomic_write_text(self.path, json.dumps(self._header()) + '\n')
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._last_sync = time.monotonic()
+        return completed
+
+    def _append(self, record: Dict):
+        self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+        now = time.monotonic()
+        if now - self._last_sync >= self.sync_interval:
+            os.fsync(self._file.fileno())
+            self._last_sync = now
+
+    def record_repository(self, repo_result: Dict):
+        """Journal a successfully scanned repository"""
+        self._append({'type': 'repository', 'result': _repo_result_to_json(repo_result)})
+
+    def record_project(self, project_name: str):
+        """Journal a project whose repositories have all been merged"""
+        self.completed_projects.add(project_name)
+        self._append({'type': 'project', 'name': project_name})
+
+    def close(self, finished: bool = False):
+        """Sync and close the journal; a finished scan no longer needs it and removes it"""
+        if self._file is None:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+        if finished:
+            os.remove(self.path)
+
+
+class BlobIndex:
+    """
+    Content-addressed index of the blobs and trees seen during one org scan
+
+    Maps every listed blob objectId to its size, so the report can show the
+    unique bytes behind forks and copied repositories, and remembers a
+    summary per tree objectId so an identical tree (e.g. the root of an
+    unmodified fork) is not listed and processed again. A repository claims
+    its root tree before listing it, so forks scanned at the same time wait
+    for that one listing instead of downloading the tree again. Object IDs
+    are kept as 20-byte digests to keep the index small on large orgs.
+    """
+
+    def __init__(self):
+        self.blobs = {}
+        self.trees = {}
+        self.unique_blob_bytes = 0
+        self._listing = {}  # Tree key -> event set once the repository listing it puts or releases it
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(object_id: str):
+        try:
+            return bytes.fromhex(object_id)
+        except (TypeError, ValueError):
+            return object_id
+
+    def add_blob(self, object_id: str, size: int) -> bool:
+        """Record a blob; True if it had not been seen before"""
+        if not object_id:
+            return True
+        key = self._key(object_id)
+        with self._lock:
+            if key in self.blobs:
+                return False
+            self.blobs[key] = size
+            self.unique_blob_bytes += size
+            return True
+
+    def get_tree(self, tree_id: str) -> Dict:
+        """Summary stored for a tree objectId, or None"""
+        if not tree_id:
+            return None
+        with self._lock:
+            return self.trees.get(self._key(tree_id))
+
+    def put_tree(self, tree_id: str, summary: Dict):
+        """
+        Remember what a fully processed tree contains
+
+        ``summary`` holds the blob count, the (path, size, objectId) of its
+        large blobs with paths relative to the tree root, and its size
+        histograms; it must not be modified afterwards.
+        """
+        if not tree_id:
+            return
+        key = self._key(tree_id)
+        with self._lock:
+            self.trees.setdefault(key, summary)
+            listing = self._listing.pop(key, None)
+        if listing is not None:
+            listing.set()
+
+    def claim_tree(self, tree_id: str) -> Tuple[Dict, threading.Event]:
+        """
+        Claim a tree for listing unless it is known or being listed
+
+        Returns (summary, None) for a known tree, (None, event) while another
+        repository lists it (wait, then get_tree(); None if it gave up), or
+        (None, None) when the caller now lists it and must put_tree() or
+        release_tree() it.
+        """
+        if not tree_id:
+            return None, None
+        key = self._key(tree_id)
+        with self._lock:
+            summary = self.trees.get(key)
+            if summary is not None:
+                return summary, None
+            listing = self._listing.get(key)
+            if listing is not None:
+                return None, listing
+            self._listing[key] = threading.Event()
+            return None, None
+
+    def release_tree(self, tree_id: str):
+        """Give up a claimed tree without a summary"""
+        with self._lock:
+            listing = self._listing.pop(self._key(tree_id), None)
+        if listing is not None:
+            listing.set()
+
+    def merge(self, other: 'BlobIndex') -> 'BlobIndex':
+        """Add the blobs of another index (trees are not merged)"""
+        self._add_keyed(other.blobs.items())
+        return self
+
+    def add_digests(self, blobs: 'BlobDigests'):
+        """Add the blobs of a repository that was not listed in this run (cached or resumed)"""
+        self._add_keyed(blobs)
+
+    def _add_keyed(self, keyed_sizes: Iterable[Tuple[object, int]]):
+        with self._lock:
+            for key, size in keyed_sizes:
+                if key not in self.blobs:
+                    self.blobs[key] = size
+                    self.unique_blob_bytes += size
+
+    def to_dict(self) -> Dict:
+        """Compact JSON form of the blobs, for merging shard results; the one of BlobDigests.to_dict()"""
+        blobs = BlobDigests()
+        for key, size in self.blobs.items():
+            blobs.add_key(key, size)
+        return blobs.to_dict()
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'BlobIndex':
+        index = cls()
+        index.add_digests(BlobDigests.from_dict(data))
+        return index
+
+
+class BlobDigests:
+    """
+    The (objectId, size) of every blob listed in one repository
+
+    Stored with scan cache entries and checkpoint journal records, so a
+    repository served from the cache or resumed from a journal still adds
+    its blobs to the run's BlobIndex and the unique-bytes totals match a
+    run that listed it. Packed as 20-byte digests and 8-byte sizes; object
+    IDs that are not SHA-1 hex are kept as a plain mapping. BlobIndex.to_dict()
+    packs shard results through this class, so both share one JSON form.
+    """
+
+    def __init__(self):
+        self.digests = bytearray()
+        self.sizes = array('q')
+        self.other = {}
+
+    def add(self, object_id: str, size: int):
+        if object_id:
+            self.add_key(BlobIndex._key(object_id), size)
+
+    def add_key(self, key, size: int):
+        """Add a blob by its BlobIndex key"""
+        if isinstance(key, bytes) and len(key) == 20:
+            self.digests += key
+            self.sizes.append(size)
+        else:
+            self.other[key if isinstance(key, str) else key.hex()] = size
+
+    def __iter__(self) -> Iterator[Tuple[object, int]]:
+        """(BlobIndex key, size) pairs"""
+        digests = bytes(self.digests)
+        for i, size in enumerate(self.sizes):
+            yield digests[i * 20:(i + 1) * 20], size
+        for object_id, size in self.other.items():
+            yield BlobIndex._key(object_id), size
+
+    def to_dict(self) -> Dict:
+        return {
+            'digests': base64.b64encode(bytes(self.digests)).decode('ascii'),
+            'sizes': base64.b64encode(self.sizes.tobytes()).decode('ascii'),
+            'other': dict(self.other),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'BlobDigests':
+        blobs = cls()
+        blobs.digests = bytearray(base64.b64decode(data['digests']))
+        blobs.sizes.frombytes(base64.b64decode(data['sizes']))
+        blobs.other = dict(data['other'])
+        return blobs
+
+
+FILE_RECORD_FIELDS = [
+    'project', 'repository', 'file_path', 'file_name', 'size_bytes', 'size_mb', 'size_gb',
+    'extension', 'repo_url', 'object_id', 'branches',
+]
+REPO_STAT_FIELDS = [
+    'project', 'repository', 'total_files_scanned', 'large_files_count', 'large_files_total_size_mb',
+    'large_files_total_size_gb', 'large_files_unique_size_mb', 'largest_file_mb', 'repo_url',
+]
+
+
+def _file_extension(file_name: str) -> str:
+    """Extension as reported in the file records (e.g. '.zip' or 'no extension')"""
+    return '.' + file_name.split('.')[-1] if '.' in file_name else 'no extension'
+
+
+class SizeHistogram:
+    """
+    Compact log-scale histogram of blob sizes
+
+    Each power of two is split into SUB_BUCKETS equal-width buckets (about
+    9% wide), and every bucket keeps a file count and a byte total, so a
+    saved scan can answer "how many files / bytes above X, or between X and
+    Y" for any threshold without rescanning. Bucket 0 holds empty files.
+    Answers are exact when thresholds fall on bucket boundaries and
+    interpolated inside a bucket otherwise.
+    """
+
+    SUB_BUCKETS = 8
+
+    def __init__(self):
+        self.buckets = {}  # bucket -> [count, total bytes]
+
+    @classmethod
+    def bucket_of(cls, size: int) -> int:
+        if size <= 0:
+            return 0
+        exponent = size.bit_length() - 1
+        return 1 + exponent * cls.SUB_BUCKETS + (((size - (1 << exponent)) * cls.SUB_BUCKETS) >> exponent)
+
+    @classmethod
+    def bucket_bounds(cls, bucket: int) -> tuple:
+        """Sizes covered by a bucket as [low, high)"""
+        if bucket == 0:
+            return 0, 1
+        exponent, sub = divmod(bucket - 1, cls.SUB_BUCKETS)
+        step = 1 << exponent
+        return step - (-step * sub // cls.SUB_BUCKETS), step - (-step * (sub + 1) // cls.SUB_BUCKETS)
+
+    def add(self, size: int):
+        bucket = self.bucket_of(size)
+        entry = self.buckets.get(bucket)
+        if entry is None:
+            self.buckets[bucket] = [1, size]
+        else:
+            entry[0] += 1
+            entry[1] += size
+
+    def remove(self, size: int):
+        """Undo add(size), e.g. for a blob a push deleted"""
+        bucket = self.bucket_of(size)
+        entry = self.buckets.get(bucket)
+        if entry is None:
+            return
+        entry[0] -= 1
+        entry[1] -= size
+        if entry[0] <= 0:
+            del self.buckets[bucket]
+
+    def merge(self, other: 'SizeHistogram'):
+        for bucket, (count, total) in other.buckets.items():
+            entry = self.buckets.get(bucket)
+            if entry is None:
+                self.buckets[bucket] = [count, total]
+            else:
+                entry[0] += count
+                entry[1] += total
+        return self
+
+    @property
+    def count(self) -> int:
+        return sum(entry[0] for entry in self.buckets.values())
+
+    @property
+    def total_size(self) -> int:
+        return sum(entry[1] for entry in self.buckets.values())
+
+    def summarize(self, min_size: int = 0, max_size: int = None) -> tuple:
+        """(file count, total bytes) of blobs with min_size <= size < max_size"""
+        count = 0.0
+        total = 0.0
+        for bucket, (bucket_count, bucket_bytes) in self.buckets.items():
+            low, high = self.bucket_bounds(bucket)
+            overlap_low = max(low, min_size)
+            overlap_high = high if max_size is None else min(high, max_size)
+            if overlap_high <= overlap_low:
+                continue
+            share = (overlap_high - overlap_low) / (high - low)
+            count += bucket_count * share
+            total += bucket_bytes * share
+        return round(count), round(total)
+
+    def to_dict(self) -> Dict:
+        return {str(bucket): entry for bucket, entry in sorted(self.buckets.items())}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'SizeHistogram':
+        histogram = cls()
+        histogram.buckets = {int(bucket): list(entry) for bucket, entry in data.items()}
+        return histogram
+
+
+class FileRecord(Mapping):
+    """
+    Read-only dict-like view of one row of a LargeFileStore
+
+    Supports the same keys as the file_info dicts built during the scan;
+    ``file_name``, ``extension``, ``size_mb`` and ``size_gb`` are derived
+    on access instead of being stored.
+    """
+
+    __slots__ = ('_store', '_index')
+
+    def __init__(self, store: 'LargeFileStore', index: int):
+        self._store = store
+        self._index = index
+
+    def __getitem__(self, key: str):
+        return self._store._field(self._index, key)
+
+    def __iter__(self):
+        return iter(FILE_RECORD_FIELDS)
+
+    def __len__(self):
+        return len(FILE_RECORD_FIELDS)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class LargeFileStore(Sequence):
+    """
+    Compact, append-only storage for discovered large files
+
+    Project and repository strings (and the repository URL) are interned in
+    small tables and referenced by index, sizes live in a typed array,
+    paths in one UTF-8 buffer, object IDs as 20-byte digests and branch
+    sets, repeated across many rows, in their own interned table. Rows are
+    read back as FileRecord mappings, so code written against the
+    ``large_files`` list of dicts keeps working at a fraction of the memory.
+    """
+
+    SORT_RUN_ROWS = 1 << 16  # Rows sorted at a time by iter_by_size()
+
+    def __init__(self, files: Iterable[Dict] = ()):
+        self._projects = []
+        self._project_index = {}
+        self._repos = []  # (project index, repository name, repository URL)
+        self._repo_index = {}
+
+        self._row_repo = array('I')
+        self._sizes = array('q')
+        self._path_offsets = array('Q', [0])
+        self._path_data = bytearray()
+        self._object_ids = bytearray()
+        self._odd_object_ids = {}  # Rows whose object ID is missing or not a SHA-1 hex string
+        self._branch_sets = ['']  # Interned 'branches' values; most rows share a few
+        self._branch_set_index = {'': 0}
+        self._row_branches = array('I')
+
+        self.extend(files)
+
+    def append(self, file_info: Dict):
+        project = file_info['project']
+        project_idx = self._project_index.get(project)
+        if project_idx is None:
+            project_idx = self._project_index[project] = len(self._projects)
+            self._projects.append(project)
+
+        repo_key = (project_idx, file_info['repository'], file_info['repo_url'])
+        repo_idx = self._repo_index.get(repo_key)
+        if repo_idx is None:
+            repo_idx = self._repo_index[repo_key] = len(self._repos)
+            self._repos.append(repo_key)
+
+        row = len(self._sizes)
+        self._row_repo.append(repo_idx)
+        self._sizes.append(file_info['size_bytes'])
+        self._path_data += file_info['file_path'].encode('utf-8')
+        self._path_offsets.append(len(self._path_data))
+
+        object_id = file_info.get('object_id')
+        digest = None
+        if isinstance(object_id, str) and len(object_id) == 40:
+            try:
+                digest = bytes.fromhex(object_id)
+            except ValueError:
+                pass
+        if digest is None:
+            digest = bytes(20)
+            self._odd_object_ids[row] = object_id
+        self._object_ids += digest
+
+        branches = file_info.get('branches') or ''
+        branch_set_idx = self._branch_set_index.get(branches)
+        if branch_set_idx is None:
+            branch_set_idx = self._branch_set_index[branches] = len(self._branch_sets)
+            self._branch_sets.append(branches)
+        self._row_branches.append(branch_set_idx)
+
+    def extend(self, files: Iterable[Dict]):
+        for file_info in files:
+            self.append(file_info)
+
+    def __len__(self):
+        return len(self._sizes)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [FileRecord(self, i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("LargeFileStore index out of range")
+        return FileRecord(self, index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield FileRecord(self, i)
+
+    def iter_by_size(self) -> Iterator['FileRecord']:
+        """
+        Yield the rows largest first, equal sizes in insertion order
+
+        Sorts runs of SORT_RUN_ROWS row numbers into typed arrays and merges
+        them lazily, so the ordering costs 4 bytes per row instead of a
+        sorted list of records.
+        """
+        sizes = self._sizes
+
+        def descending(row):
+            return -sizes[row]
+
+        runs = [
+            array('I', sorted(range(start, min(start + self.SORT_RUN_ROWS, len(sizes))), key=descending))
+            for start in range(0, len(sizes), self.SORT_RUN_ROWS)
+        ]
+        for row in heapq.merge(*runs, key=descending):
+            yield FileRecord(self, row)
+
+    def iter_rows(self) -> Iterator[Tuple[str, str, str, str, int, str, str]]:
+        """
+        Yield (project, repository, repo_url, file_path, size_bytes, object_id, branches) per row
+
+        For bulk consumers such as ScanDatabase: decodes each column once
+        instead of going through a FileRecord per field.
+        """
+        path_data = bytes(self._path_data)
+        offsets = self._path_offsets
+        object_ids = bytes(self._object_ids).hex()
+        repos = [(self._projects[project_idx], repo_name, repo_url) for project_idx, repo_name, repo_url in self._repos]
+        for row in range(len(self._sizes)):
+            if row in self._odd_object_ids:
+                object_id = self._odd_object_ids[row]
+            else:
+                object_id = object_ids[row * 40:(row + 1) * 40]
+            yield (
+                *repos[self._row_repo[row]],
+                path_data[offsets[row]:offsets[row + 1]].decode('utf-8'),
+                self._sizes[row],
+                object_id,
+                self._branch_sets[self._row_branches[row]],
+            )
+
+    def _field(self, row: int, key: str):
+        if key == 'size_bytes':
+            return self._sizes[row]
+        if key == 'size_mb':
+            return round(self._sizes[row] / (1024 * 1024), 2)
+        if key == 'size_gb':
+            return round(self._sizes[row] / (1024 ** 3), 3)
+
+        if key in ('file_path', 'file_name', 'extension'):
+            file_path = self._path_data[self._path_offsets[row]:self._path_offsets[row + 1]].decode('utf-8')
+            if key == 'file_path':
+                return file_path
+            file_name = file_path.split('/')[-1] if '/' in file_path else file_path
+            if key == 'file_name':
+                return file_name
+            return _file_extension(file_name)
+
+        if key == 'object_id':
+            if row in self._odd_object_ids:
+                return self._odd_object_ids[row]
+            return self._object_ids[row * 20:(row + 1) * 20].hex()
+        if key == 'branches':
+            return self._branch_sets[self._row_branches[row]]
+
+        project_idx, repo_name, repo_url = self._repos[self._row_repo[row]]
+        if key == 'project':
+            return self._projects[project_idx]
+        if key == 'repository':
+            return repo_name
+        if key == 'repo_url':
+            return repo_url
+        raise KeyError(key)
+
+
+class ResultExporter:
+    """
+    Base class for incremental exporters
+
+    An exporter receives every large-file record and repository statistic
+    as soon as the scan merges it and writes it out right away, so partial
+    results survive a crash and memory stays bounded. Output goes to
+    ``<prefix>_files.<extension>`` and ``<prefix>_repos.<extension>``.
+    """
+
+    extension = None
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self.files_path = f"{prefix}_files.{self.extension}"
+        self.repos_path = f"{prefix}_repos.{self.extension}"
+
+    def open(self):
+        raise NotImplementedError
+
+    def write_file(self, file_info: Dict):
+        raise NotImplementedError
+
+    def write_repo_stat(self, repo_stat: Dict):
+        raise NotImplementedError
+
+    def flush(self):
+        """Called after each repository; make everything written so far durable"""
+
+    def close(self):
+        raise NotImplementedError
+
+
+class CsvExporter(ResultExporter):
+    """Writes file records and repository statistics as CSV"""
+
+    extension = 'csv'
+
+    def open(self):
+        self._files = open(self.files_path, 'w', newline='', encoding='utf-8')
+        self._repos = open(self.repos_path, 'w', newline='', encoding='utf-8')
+        self._file_writer = csv.DictWriter(self._files, fieldnames=FILE_RECORD_FIELDS, extrasaction='ignore')
+        self._repo_writer = csv.DictWriter(self._repos, fieldnames=REPO_STAT_FIELDS, extrasaction='ignore')
+        self._file_writer.writeheader()
+        self._repo_writer.writeheader()
+
+    def write_file(self, file_info: Dict):
+        self._file_writer.writerow(file_info)
+
+    def write_repo_stat(self, repo_stat: Dict):
+        self._repo_writer.writerow(repo_stat)
+
+    def flush(self):
+        self._files.flush()
+        self._repos.flush()
+
+    def close(self):
+        self._files.close()
+        self._repos.close()
+
+
+class JsonLinesExporter(ResultExporter):
+    """Writes one JSON object per line"""
+
+    extension = 'jsonl'
+
+    def open(self):
+        self._files = open(self.files_path, 'w', encoding='utf-8')
+        self._repos = open(self.repos_path, 'w', encoding='utf-8')
+
+    def write_file(self, file_info: Dict):
+        self._files.write(json.dumps({field: file_info.get(field) for field in FILE_RECORD_FIELDS}, ensure_ascii=False) + '\n')
+
+    def write_repo_stat(self, repo_stat: Dict):
+        self._repos.write(json.dumps({field: repo_stat.get(field) for field in REPO_STAT_FIELDS}, ensure_ascii=False) + '\n')
+
+    def flush(self):
+        self._files.flush()
+        self._repos.flush()
+
+    def close(self):
+        self._files.close()
+        self._repos.close()
+
+
+class ParquetExporter(ResultExporter):
+    """
+    Writes columnar Parquet files in row groups of ``batch_size`` records
+
+    Requires pyarrow. Only one row group per output is buffered at a time;
+    a Parquet footer is written on close, so an interrupted scan keeps the
+    CSV/JSONL outputs but not a readable Parquet file.
+    """
+
+    extension = 'parquet'
+
+    def __init__(self, prefix: str, batch_size: int = 50000):
+        super().__init__(prefix)
+        self.batch_size = batch_size
+
+    def open(self):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Parquet export requires pyarrow: pip install pyarrow") from e
+
+        types = {
+            'size_bytes': pa.int64(), 'size_mb': pa.float64(), 'size_gb': pa.float64(),
+            'total_files_scanned': pa.int64(), 'large_files_count': pa.int64(),
+            'large_files_total_size_mb': pa.float64(), 'large_files_total_size_gb': pa.float64(),
+            'large_files_unique_size_mb': pa.float64(), 'largest_file_mb': pa.float64(),
+        }
+        self._pa = pa
+        self._file_schema = pa.schema([(field, types.get(field, pa.string())) for field in FILE_RECORD_FIELDS])
+        self._repo_schema = pa.schema([(field, types.get(field, pa.string())) for field in REPO_STAT_FIELDS])
+        self._file_writer = pq.ParquetWriter(self.files_path, self._file_schema)
+        self._repo_writer = pq.ParquetWriter(self.repos_path, self._repo_schema)
+        self._file_rows = []
+        self._repo_rows = []
+
+    def write_file(self, file_info: Dict):
+        self._file_rows.append({field: file_info.get(field) for field in FILE_RECORD_FIELDS})
+        if len(self._file_rows) >= self.batch_size:
+            self._write_batch(self._file_writer, self._file_schema, self._file_rows)
+
+    def write_repo_stat(self, repo_stat: Dict):
+        self._repo_rows.append({field: repo_stat.get(field) for field in REPO_STAT_FIELDS})
+        if len(self._repo_rows) >= self.batch_size:
+            self._write_batch(self._repo_writer, self._repo_schema, self._repo_rows)
+
+    def _write_batch(self, writer, schema, rows: List[Dict]):
+        if rows:
+            writer.write_table(self._pa.Table.from_pylist(rows, schema=schema))
+            rows.clear()
+
+    def close(self):
+        self._write_batch(self._file_writer, self._file_schema, self._file_rows)
+        self._write_batch(self._repo_writer, self._repo_schema, self._repo_rows)
+        self._file_writer.close()
+        self._repo_writer.close()
+
+
+EXPORTERS = {
+    'csv': CsvExporter,
+    'jsonl': JsonLinesExporter,
+    'parquet': ParquetExporter,
+}
+
+# Outputs written from the final results: format -> writer(scanner, results, path without extension)
+REPORT_WRITERS = {
+    'xlsx': lambda scanner, results, base: scanner.export_to_excel(results, base + '.xlsx'),
+    'scan': lambda scanner, results, base: scanner.save_scan(results, base + '.scan.json'),
+}
+
+OUTPUT_FORMATS = list(REPORT_WRITERS) + list(EXPORTERS)
+
+# Outputs built from results['large_files']; without them (or a database) a scan only streams its records to disk
+RECORD_FORMATS = {'xlsx'}
+
+# Optional packages a format needs; imported only when the format is chosen
+FORMAT_DEPENDENCIES = {
+    'xlsx': 'openpyxl',
+    'parquet': 'pyarrow',
+}
+
+
+def _require_file_records(results: Dict, output: str):
+    """
+    Raise ValueError if ``results`` do not hold every large file record
+
+    Results scanned with retain_files=False keep only the totals, so an
+    output built from them would silently list no files.
+    """
+    if len(results['large_files']) != results['total_large_files']:
+        raise ValueError(f"{output} needs every large file record, but the results hold "
+                         f"{len(results['large_files']):,} of {results['total_large_files']:,}; "
+                         f"scan with retain_files=True")
+
+
+def parse_formats(text: str) -> List[str]:
+    """Parse a comma-separated list of OUTPUT_FORMATS; 'none' selects no output files"""
+    formats = [fmt.strip().lower() for fmt in text.split(',') if fmt.strip()]
+    if formats == ['none']:
+        return []
+    unknown = [fmt for fmt in formats if fmt not in OUTPUT_FORMATS]
+    if unknown or not formats:
+        raise argparse.ArgumentTypeError(f"expected formats from {', '.join(OUTPUT_FORMATS)} or none, got {text!r}")
+    return list(dict.fromkeys(formats))
+
+
+def load_format_dependencies(formats: Iterable[str]):
+    """
+    Import the optional packages of the chosen formats
+
+    Called before a scan starts, so a missing package fails the run at once
+    rather than after an hour of scanning; formats not chosen are never imported.
+    """
+    for fmt in formats:
+        if fmt in FORMAT_DEPENDENCIES:
+            try:
+                importlib.import_module(FORMAT_DEPENDENCIES[fmt])
+            except ImportError as e:
+                raise ImportError(f"{fmt} output requires {FORMAT_DEPENDENCIES[fmt]}: "
+                                  f"pip install {FORMAT_DEPENDENCIES[fmt]}") from e
+
+
+class ScanAggregator:
+    """
+    Single-pass aggregates over the large files found by a scan
+
+    Fed once per file as the scan merges results; keeps per-extension,
+    per-repository and per-project totals plus a bounded top-K heap of the
+    largest files, so every report reads these in O(n log k) total instead
+    of re-sorting ``large_files`` for each view. Ties keep scan order, the
+    same as a stable sort of the full list.
+    """
+
+    def __init__(self, top_k: int = 10):
+        self.top_k = top_k
+        self.extension_stats = {}
+        self.repo_totals = {}
+        self.project_totals = {}
+        self._top = []
+        self._seq = 0
+
+    @classmethod
+    def from_files(cls, files: Iterable[Dict], top_k: int = 10) -> 'ScanAggregator':
+        """Aggregate an existing list of file records"""
+        aggregator = cls(top_k)
+        for file_info in files:
+            aggregator.add_file(file_info)
+        return aggregator
+
+    @staticmethod
+    def _add(totals: Dict, key, size: int):
+        stats = totals.get(key)
+        if stats is None:
+            stats = totals[key] = {'count': 0, 'total_size': 0}
+        stats['count'] += 1
+        stats['total_size'] += size
+
+    def add_file(self, file_info: Dict):
+        size = file_info['size_bytes']
+        self._add(self.extension_stats, file_info['extension'], size)
+        self._add(self.repo_totals, (file_info['project'], file_info['repository']), size)
+        self._add(self.project_totals, file_info['project'], size)
+
+        # Min-heap on (size, -seq): the smallest, latest-seen entry is evicted first
+        entry = (size, -self._seq, file_info)
+        self._seq += 1
+        if len(self._top) < self.top_k:
+            heapq.heappush(self._top, entry)
+        elif entry[:2] > self._top[0][:2]:
+            heapq.heapreplace(self._top, entry)
+
+    def top_files(self, n: int = None) -> List[Dict]:
+        """Largest files first, at most ``n`` (and at most top_k)"""
+        ordered = [entry[2] for entry in sorted(self._top, key=lambda entry: entry[:2], reverse=True)]
+        return ordered[:n] if n is not None else ordered
+
+    def sorted_extensions(self) -> List[tuple]:
+        """(extension, {'count', 'total_size'}) pairs, largest total first"""
+        return sorted(self.extension_stats.items(), key=lambda x: x[1]['total_size'], reverse=True)
+
+
+class ScanResultBuilder:
+    """
+    Merges per-repository scan results into the report structure
+
+    Repositories must be added in enumeration order; the builder does no
+    sorting of its own, so the same inputs always give the same results.
+    Exporters receive every file record and repository statistic as it is
+    merged; with ``retain_files=False`` file records are only streamed to
+    them and not kept in ``large_files`` (a compact LargeFileStore). Either way the ScanAggregator in
+    ``results['aggregator']`` holds the totals and top files for reporting.
+    """
+
+    def __init__(self, blob_index: BlobIndex = None, exporters: List['ResultExporter'] = None,
+                 retain_files: bool = True):
+        self.blob_index = blob_index
+        self.exporters = exporters or []
+        self.retain_files = retain_files
+
+        self.aggregator = ScanAggregator()
+        self.histograms = {
+            'organization': SizeHistogram(),
+            'projects': {},
+            'repositories': {},
+            'extensions': {},
+        }
+        self.all_large_files = LargeFileStore()
+        self.repo_stats = []
+        self.project_stats = []
+        self.failed_repos = []
+        self.retried_repos = []
+        self.repos_fetched = 0
+        self.repos_from_cache = 0
+        self.repos_deduplicated = 0
+
+        # Large blobs already counted; a blob's bytes are unique to the first repository that has it
+        self.seen_large_blobs = set()
+        self.unique_large_files = 0
+        self.unique_size = 0
+
+        self.total_repos = 0
+        self.total_files_scanned = 0
+        self.total_large_files = 0
+        self.total_size_all_large_files = 0
+
+        self.project_large_files = 0
+        self.project_total_size = 0
+
+    def add_project(self, project_name: str, repo_results: List[Dict]):
+        """Merge the results of every repository in a project"""
+        for repo_result in repo_results:
+            self.add_repository(project_name, repo_result)
+        self.finish_project(project_name, len(repo_results))
+
+    def add_repository(self, project_name: str, repo_result: Dict):
+        """Merge one repository of the current project"""
+        self.total_repos += 1
+        self.total_files_scanned += repo_result['total_files_scanned']
+
+        if repo_result.get('histogram') is not None:
+            self._merge_histograms(project_name, repo_result)
+
+        if repo_result.get('status') == 'cached':
+            self.repos_from_cache += 1
+        elif repo_result.get('status') == 'ok':
+            self.repos_fetched += 1
+        if repo_result.get('shared_tree_with'):
+            self.repos_deduplicated += 1
+
+        if repo_result.get('retries'):
+            self.retried_repos.append({
+                'project': project_name,
+                'repository': repo_result['repository'],
+                'retries': repo_result['retries'],
+            })
+        if repo_result.get('status') == 'failed':
+            self.failed_repos.append({
+                'project': project_name,
+                'repository': repo_result['repository'],
+                'error': repo_result['error'],
+                'repo_url': repo_result['repo_url'],
+            })
+
+        repo_large_files = repo_result['large_files']
+        repo_large_files_size = sum(f['size_bytes'] for f in repo_large_files)
+        repo_unique_size = 0
+        for f in repo_large_files:
+            blob_key = f.get('object_id') or (project_name, repo_result['repository'], f['file_path'])
+            if blob_key not in self.seen_large_blobs:
+                self.seen_large_blobs.add(blob_key)
+                self.unique_large_files += 1
+                repo_unique_size += f['size_bytes']
+        self.unique_size += repo_unique_size
+
+        if self.retain_files:
+            self.all_large_files.extend(repo_large_files)
+        for f in repo_large_files:
+            self.aggregator.add_file(f)
+        for exporter in self.exporters:
+            for f in repo_large_files:
+                exporter.write_file(f)
+
+        self.total_large_files += len(repo_large_files)
+        self.total_size_all_large_files += repo_large_files_size
+        self.project_large_files += len(repo_large_files)
+        self.project_total_size += repo_large_files_size
+
+        # Repository statistics
+        if repo_large_files:
+            repo_stat = {
+                'project': project_name,
+                'repository': repo_result['repository'],
+                'total_files_scanned': repo_result['total_files_scanned'],
+                'large_files_count': len(repo_large_files),
+                'large_files_total_size_mb': round(repo_large_files_size / (1024 * 1024), 2),
+                'large_files_total_size_gb': round(repo_large_files_size / (1024 ** 3), 3),
+                'large_files_unique_size_mb': round(repo_unique_size / (1024 * 1024), 2),
+                'largest_file_mb': max(f['size_mb'] for f in repo_large_files),
+                'repo_url': repo_result['repo_url'],
+            }
+            self.repo_stats.append(repo_stat)
+            for exporter in self.exporters:
+                exporter.write_repo_stat(repo_stat)
+
+        for exporter in self.exporters:
+            exporter.flush()
+
+    def _merge_histograms(self, project_name: str, repo_result: Dict):
+        """Fold a repository's size histograms into the organization, project and extension ones"""
+        histograms = self.histograms
+        repo_histogram = repo_result['histogram']
+        histograms['organization'].merge(repo_histogram)
+        histograms['projects'].setdefault(project_name, SizeHistogram()).merge(repo_histogram)
+        histograms['repositories'][f"{project_name}/{repo_result['repository']}"] = repo_histogram
+        for ext, histogram in repo_result['extension_histograms'].items():
+            histograms['extensions'].setdefault(ext, SizeHistogram()).merge(histogram)
+
+    def finish_project(self, project_name: str, repo_count: int):
+        """Close the current project once all of its repositories were added"""
+        # Project statistics
+        if self.project_large_files > 0:
+            self.project_stats.append({
+                'project': project_name,
+                'repositories': repo_count,
+                'large_files_count': self.project_large_files,
+                'total_size_mb': round(self.project_total_size / (1024 * 1024), 2),
+                'total_size_gb': round(self.project_total_size / (1024 ** 3), 3),
+            })
+
+        self.project_large_files = 0
+        self.project_total_size = 0
+
+    def build(self, total_projects: int) -> Dict:
+        """Return the results dict consumed by print_summary and export_to_excel"""
+        return {
+            'large_files': self.all_large_files,
+            'aggregator': self.aggregator,
+            'histograms': self.histograms,
+            'repo_stats': self.repo_stats,
+            'project_stats': self.project_stats,
+            'total_projects': total_projects,
+            'total_repos': self.total_repos,
+            'total_files_scanned': self.total_files_scanned,
+            'total_large_files': self.total_large_files,
+            'total_size': self.total_size_all_large_files,
+            'failed_repos': self.failed_repos,
+            'retried_repos': self.retried_repos,
+            'repos_fetched': self.repos_fetched,
+            'repos_from_cache': self.repos_from_cache,
+            'repos_deduplicated': self.repos_deduplicated,
+            'unique_large_files': self.unique_large_files,
+            'unique_size': self.unique_size,
+            'unique_blob_count': len(self.blob_index.blobs) if self.blob_index else 0,
+            'unique_blob_bytes': self.blob_index.unique_blob_bytes if self.blob_index else 0,
+        }
+
+
+class ScanDatabase:
+    """
+    Local SQLite store of scan results, for comparing scans over time
+
+    Each saved scan adds a row to ``scans`` (totals and summary counters)
+    plus its large files, repository and project statistics. Repositories
+    are stored once per organization and referenced by ID, so file rows
+    stay small and organizations sharing one database stay apart. Rows are
+    inserted with executemany() in batches of ``batch_size`` within one
+    transaction, and every query below runs off an index, so top-N lists,
+    per-group totals and scan-over-scan diffs stay fast over millions of
+    files. load_results() rebuilds a results dict for print_summary() and
+    export_to_excel() without contacting Azure DevOps.
+
+    Stores the files in results['large_files'], so save scans run with
+    ``retain_files=True``.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS scans (
+            id INTEGER PRIMARY KEY,
+            organization TEXT NOT NULL,
+            scanned_at TEXT NOT NULL,
+            min_size_bytes INTEGER NOT NULL,
+            total_projects INTEGER NOT NULL,
+            total_repos INTEGER NOT NULL,
+            total_files_scanned INTEGER NOT NULL,
+            total_large_files INTEGER NOT NULL,
+            total_size INTEGER NOT NULL,
+            summary TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS scans_by_organization ON scans (organization, scanned_at);
+
+        CREATE TABLE IF NOT EXISTS repositories (
+            id INTEGER PRIMARY KEY,
+            organization TEXT NOT NULL,
+            project TEXT NOT NULL,
+            repository TEXT NOT NULL,
+            repo_url TEXT NOT NULL,
+            UNIQUE (organization, project, repository)
+        );
+
+        CREATE TABLE IF NOT EXISTS files (
+            scan_id INTEGER NOT NULL REFERENCES scans (id),
+            repo_id INTEGER NOT NULL REFERENCES repositories (id),
+            file_path TEXT NOT NULL,
+            size_bytes INTEGER NOT NULL,
+            extension TEXT NOT NULL,
+            object_id TEXT,
+            branches TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS files_by_size ON files (scan_id, size_bytes);
+        CREATE INDEX IF NOT EXISTS files_by_extension ON files (scan_id, extension, size_bytes);
+        CREATE INDEX IF NOT EXISTS files_by_repository ON files (scan_id, repo_id, file_path, size_bytes);
+
+        CREATE TABLE IF NOT EXISTS repo_stats (
+            scan_id INTEGER NOT NULL REFERENCES scans (id),
+            repo_id INTEGER NOT NULL REFERENCES repositories (id),
+            total_files_scanned INTEGER NOT NULL,
+            large_files_count INTEGER NOT NULL,
+            large_files_total_size_mb REAL NOT NULL,
+            large_files_total_size_gb REAL NOT NULL,
+            large_files_unique_size_mb REAL NOT NULL,
+            largest_file_mb REAL NOT NULL,
+            PRIMARY KEY (scan_id, repo_id)
+        );
+        CREATE INDEX IF NOT EXISTS repo_stats_by_repository ON repo_stats (repo_id, scan_id);
+
+        CREATE TABLE IF NOT EXISTS project_stats (
+            scan_id INTEGER NOT NULL REFERENCES scans (id),
+            project TEXT NOT NULL,
+            repositories INTEGER NOT NULL,
+            large_files_count INTEGER NOT NULL,
+            total_size_mb REAL NOT NULL,
+            total_size_gb REAL NOT NULL,
+            PRIMARY KEY (scan_id, project)
+        );
+    """
+
+    # Results keys kept as JSON in scans.summary
+    SUMMARY_KEYS = (
+        'failed_projects', 'failed_repos', 'retried_repos', 'repos_fetched', 'repos_from_cache',
+        'repos_deduplicated', 'unique_large_files', 'unique_size', 'unique_blob_count', 'unique_blob_bytes',
+        'cache_evicted', 'http_cache',
+    )
+
+    FILE_COLUMNS = "r.project, r.repository, r.repo_url, f.file_path, f.size_bytes, f.object_id, f.branches"
+
+    def __init__(self, path: str, batch_size: int = 50000):
+        self.path = path
+        self.batch_size = batch_size
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA cache_size = -65536")  # 64 MB, so bulk inserts keep the indexes in memory
+        self.connection.executescript(self.SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def add_scan(self, results: Dict, organization: str, min_size_bytes: int, scanned_at: str = None) -> int:
+        """
+        Store the results of a scan in one transaction and return its scan ID
+
+        Raises:
+            ValueError: if the results were scanned with retain_files=False
+        """
+        _require_file_records(results, "The scan database")
+        scanned_at = scanned_at or datetime.now().isoformat(timespec='seconds')
+        summary = {key: results[key] for key in self.SUMMARY_KEYS if key in results}
+        repo_ids = {}
+
+        def repo_id(project: str, repository: str, repo_url: str) -> int:
+            key = (organization, project, repository)
+            if key not in repo_ids:
+                row = self.connection.execute(
+                    "SELECT id, repo_url FROM repositories WHERE organization = ? AND project = ? AND repository = ?",
+                    key,
+                ).fetchone()
+                if row is None:
+                    repo_ids[key] = self.connection.execute(
+                        "INSERT INTO repositories (organization, project, repository, repo_url) VALUES (?, ?, ?, ?)",
+                        key + (repo_url or '',),
+                    ).lastrowid
+                else:
+                    repo_ids[key] = row['id']
+                    if repo_url and repo_url != row['repo_url']:
+                        self.connection.execute("UPDATE repositories SET repo_url = ? WHERE id = ?", (repo_url, row['id']))
+            return repo_ids[key]
+
+        with self.connection:
+            scan_id = self.connection.execute(
+                "INSERT INTO scans (organization, scanned_at, min_size_bytes, total_projects, total_repos,"
+                " total_files_scanned, total_large_files, total_size, summary) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (organization, scanned_at, min_size_bytes, results['total_projects'], results['total_repos'],
+                 results['total_files_scanned'], results['total_large_files'], results['total_size'],
+                 json.dumps(summary)),
+            ).lastrowid
+
+            large_files = results['large_files']
+            if isinstance(large_files, LargeFileStore):
+                file_rows = large_files.iter_rows()
+            else:
+                file_rows = (
+                    (f['project'], f['repository'], f['repo_url'], f['file_path'], f['size_bytes'], f['object_id'],
+                     f.get('branches') or '') for f in large_files
+                )
+            self._insert_batched(
+                "INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ((scan_id, repo_id(project, repository, repo_url), file_path, size_bytes,
+                  _file_extension(file_path.rsplit('/', 1)[-1]), object_id, branches)
+                 for project, repository, repo_url, file_path, size_bytes, object_id, branches in file_rows),
+            )
+            self._insert_batched(
+                "INSERT INTO repo_stats VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                ((scan_id, repo_id(stat['project'], stat['repository'], stat['repo_url']),
+                  stat['total_files_scanned'], stat['large_files_count'], stat['large_files_total_size_mb'],
+                  stat['large_files_total_size_gb'],
+                  stat.get('large_files_unique_size_mb', stat['large_files_total_size_mb']),
+                  stat['largest_file_mb']) for stat in results['repo_stats']),
+            )
+            self._insert_batched(
+                "INSERT INTO project_stats VALUES (?, ?, ?, ?, ?, ?)",
+                ((scan_id, stat['project'], stat['repositories'], stat['large_files_count'], stat['total_size_mb'],
+                  stat['total_size_gb']) for stat in results['project_stats']),
+            )
+        return scan_id
+
+    def _insert_batched(self, sql: str, rows: Iterable[tuple]):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == self.batch_size:
+                self.connection.executemany(sql, batch)
+                batch = []
+        if batch:
+            self.connection.executemany(sql, batch)
+
+    def scans(self, organization: str = None) -> List[Dict]:
+        """Stored scans, oldest first"""
+        sql = ("SELECT id, organization, scanned_at, min_size_bytes, total_projects, total_repos, total_files_scanned,"
+               " total_large_files, total_size FROM scans")
+        if organization is not None:
+            return [dict(row) for row in self.connection.execute(
+                sql + " WHERE organization = ? ORDER BY scanned_at, id", (organization,))]
+        return [dict(row) for row in self.connection.execute(sql + " ORDER BY scanned_at, id")]
+
+    def scan(self, scan_id: int) -> Dict:
+        """
+        Metadata of one stored scan
+
+        Raises:
+            ValueError: if there is no scan with this ID
+        """
+        row = self.connection.execute("SELECT * FROM scans WHERE id = ?", (scan_id,)).fetchone()
+        if row is None:
+            raise ValueError(f"No scan {scan_id} in {self.path}")
+        scan = dict(row)
+        scan['summary'] = json.loads(scan['summary'])
+        return scan
+
+    def latest_scan_id(self, organization: str = None) -> int:
+        """ID of the most recent scan (of ``organization``), None if there is none"""
+        scans = self.scans(organization)
+        return scans[-1]['id'] if scans else None
+
+    def previous_scan_id(self, scan_id: int) -> int:
+        """ID of the scan of the same organization before ``scan_id``, None if it is the first"""
+        scan = self.scan(scan_id)
+        ids = [row['id'] for row in self.scans(scan['organization'])]
+        position = ids.index(scan_id)
+        return ids[position - 1] if position else None
+
+    def _file_records(self, sql: str, params: tuple) -> Iterator[Dict]:
+        for row in self.connection.execute(sql, params):
+            yield AzureDevOpsOrgScanner._file_info(
+                row['project'], row['repository'], row['repo_url'], row['file_path'], row['size_bytes'],
+                row['object_id'], row['branches'],
+            )
+
+    def load_results(self, scan_id: int) -> Dict:
+        """
+        Results dict of a stored scan, as scan_organization() returned it
+
+        Holds what print_summary() and export_to_excel() use; size
+        histograms are not stored, so it cannot be passed to save_scan().
+        results['scan'] has the scan's metadata (organization, scanned_at,
+        min_size_bytes).
+        """
+        scan = self.scan(scan_id)
+        large_files = LargeFileStore(self._file_records(
+            f"SELECT {self.FILE_COLUMNS} FROM files f JOIN repositories r ON r.id = f.repo_id"
+            " WHERE f.scan_id = ? ORDER BY f.rowid", (scan_id,)
+        ))
+        repo_stats = [
+            dict(row) for row in self.connection.execute(
+                "SELECT r.project, r.repository, s.total_files_scanned, s.large_files_count,"
+                " s.large_files_total_size_mb, s.large_files_total_size_gb, s.large_files_unique_size_mb,"
+                " s.largest_file_mb, r.repo_url FROM repo_stats s JOIN repositories r ON r.id = s.repo_id"
+                " WHERE s.scan_id = ? ORDER BY s.rowid", (scan_id,)
+            )
+        ]
+        project_stats = [
+            dict(row) for row in self.connection.execute(
+                "SELECT project, repositories, large_files_count, total_size_mb, total_size_gb FROM project_stats"
+                " WHERE scan_id = ? ORDER BY rowid", (scan_id,)
+            )
+        ]
+
+        results = {
+            'large_files': large_files,
+            'aggregator': None,  # Rebuilt from large_files when needed
+            'repo_stats': repo_stats,
+            'project_stats': project_stats,
+            'total_projects': scan['total_projects'],
+            'total_repos': scan['total_repos'],
+            'total_files_scanned': scan['total_files_scanned'],
+            'total_large_files': scan['total_large_files'],
+            'total_size': scan['total_size'],
+            'failed_projects': [],
+            'failed_repos': [],
+            'retried_repos': [],
+            'repos_fetched': scan['total_repos'],
+            'repos_from_cache': 0,
+            'repos_deduplicated': 0,
+            'unique_large_files': scan['total_large_files'],
+            'unique_size': scan['total_size'],
+            'unique_blob_count': 0,
+            'unique_blob_bytes': 0,
+            'exported_files': [],
+        }
+        results.update(scan.pop('summary'))
+        results['scan'] = scan
+        return results
+
+    def top_files(self, scan_id: int, limit: int = 20, extension: str = None, project: str = None) -> List[Dict]:
+        """Largest files of a scan, optionally of one extension or project"""
+        sql = f"SELECT {self.FILE_COLUMNS} FROM files f JOIN repositories r ON r.id = f.repo_id WHERE f.scan_id = ?"
+        params = [scan_id]
+        if extension is not None:
+            sql += " AND f.extension = ?"
+            params.append(extension)
+        if project is not None:
+            sql += (" AND f.repo_id IN (SELECT id FROM repositories WHERE project = ?"
+                    " AND organization = (SELECT organization FROM scans WHERE id = ?))")
+            params += [project, scan_id]
+        sql += " ORDER BY f.size_bytes DESC LIMIT ?"
+        params.append(limit)
+        return list(self._file_records(sql, tuple(params)))
+
+    def totals_by(self, scan_id: int, group_by: str) -> List[Dict]:
+        """
+        Large file count and bytes of a scan per 'extension', 'project' or 'repository'
+
+        Returns rows of {'name', 'count', 'total_size'}, largest first, like query_scan().
+        """
+        if group_by == 'extension':
+            sql = ("SELECT extension AS name, COUNT(*) AS count, SUM(size_bytes) AS total_size FROM files"
+                   " WHERE scan_id = ? GROUP BY extension")
+        elif group_by in ('project', 'repository'):
+            name = "r.project" if group_by == 'project' else "r.project || '/' || r.repository"
+            sql = (f"SELECT {name} AS name, SUM(t.count) AS count, SUM(t.total_size) AS total_size FROM"
+                   " (SELECT repo_id, COUNT(*) AS count, SUM(size_bytes) AS total_size FROM files"
+                   "  WHERE scan_id = ? GROUP BY repo_id) t"
+                   f" JOIN repositories r ON r.id = t.repo_id GROUP BY {name}")
+        else:
+            raise ValueError(f"Cannot group by {group_by!r}")
+        return [dict(row) for row in self.connection.execute(sql + " ORDER BY total_size DESC", (scan_id,))]
+
+    def files_added(self, scan_id: int, since_scan_id: int) -> List[Dict]:
+        """Files of ``scan_id`` whose repository and path were not in ``since_scan_id``, largest first"""
+        # The difference is taken on the covering index alone; only the rows in it are read from the table
+        return list(self._file_records(
+            f"SELECT {self.FILE_COLUMNS} FROM"
+            " (SELECT repo_id, file_path FROM files WHERE scan_id = ?1"
+            "  EXCEPT SELECT repo_id, file_path FROM files WHERE scan_id = ?2) d"
+            " JOIN files f ON f.scan_id = ?1 AND f.repo_id = d.repo_id AND f.file_path = d.file_path"
+            " JOIN repositories r ON r.id = f.repo_id ORDER BY f.size_bytes DESC", (scan_id, since_scan_id)
+        ))
+
+    def files_removed(self, scan_id: int, since_scan_id: int) -> List[Dict]:
+        """Files of ``since_scan_id`` whose repository and path are gone in ``scan_id``, largest first"""
+        return self.files_added(since_scan_id, scan_id)
+
+    def repository_growth(self, organization: str, project: str = None) -> List[Dict]:
+        """
+        Large file count and size of each repository across the scans of an organization
+
+        Returns one row per repository with a 'series' of {'scan_id',
+        'scanned_at', 'large_files_count', 'size_mb'} in scan order (zero
+        where a scan found no large files in it) and 'change_mb' from the
+        first to the last scan, largest growth first.
+        """
+        scans = self.scans(organization)
+        if not scans:
+            return []
+        scan_positions = {scan['id']: position for position, scan in enumerate(scans)}
+
+        sql = ("SELECT s.scan_id, r.project, r.repository, s.large_files_count, s.large_files_total_size_mb"
+               " FROM repo_stats s JOIN repositories r ON r.id = s.repo_id AND r.organization = ?1"
+               " WHERE s.scan_id IN (SELECT id FROM scans WHERE organization = ?1)")
+        params = [organization]
+        if project is not None:
+            sql += " AND r.project = ?"
+            params.append(project)
+
+        growth = {}
+        for row in self.connection.execute(sql, params):
+            series = growth.get((row['project'], row['repository']))
+            if series is None:
+                series = growth[(row['project'], row['repository'])] = [
+                    {'scan_id': scan['id'], 'scanned_at': scan['scanned_at'], 'large_files_count': 0, 'size_mb': 0.0}
+                    for scan in scans
+                ]
+            point = series[scan_positions[row['scan_id']]]
+            point['large_files_count'] = row['large_files_count']
+            point['size_mb'] = row['large_files_total_size_mb']
+
+        rows = [
+            {
+                'project': project_name,
+                'repository': repo_name,
+                'series': series,
+                'change_mb': round(series[-1]['size_mb'] - series[0]['size_mb'], 2),
+            }
+            for (project_name, repo_name), series in growth.items()
+        ]
+        rows.sort(key=lambda row: row['change_mb'], reverse=True)
+        return rows
+
+
+class ScanTelemetry:
+    """
+    Request, phase and repository timings of one scan
+
+    RateLimitScheduler reports every HTTP attempt (latency to the response
+    headers, status, bytes, retries and throttles) per endpoint; streamed
+    item listings add their body bytes, the time spent waiting for the body
+    and the time spent decoding its JSON, apart. Phases record
+    wall and CPU time, and the slowest repositories are kept. Export with
+    to_dict()/save_json() or to_prometheus() (text exposition format).
+    """
+
+    def __init__(self, slowest_repos: int = 20):
+        self.slowest_repos = slowest_repos
+        self.endpoints = {}
+        self.phases = {}
+        self._slowest = []  # Min-heap of (seconds, seq, repository record)
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def endpoint_of(url: str, params: Dict = None) -> str:
+        """Name of the REST endpoint a URL belongs to, e.g. 'items' or 'repositories'"""
+        path = url.split('?', 1)[0].rstrip('/')
+        if path.endswith('/_apis/projects'):
+            return 'projects'
+        if path.endswith('/items'):
+            return 'items_folder' if (params or {}).get('recursionLevel') == 'OneLevel' else 'items'
+        return path.rsplit('/', 1)[-1]
+
+    def _endpoint(self, endpoint: str) -> Dict:
+        stats = self.endpoints.get(endpoint)
+        if stats is None:
+            stats = self.endpoints[endpoint] = {
+                'requests': 0,
+                'cache_hits': 0,
+                'errors': 0,
+                'retries': 0,
+                'throttled': 0,
+                'bytes': 0,
+                'stream_seconds': 0.0,
+                'decode_seconds': 0.0,
+                'latencies': array('d'),
+                'status_codes': {},
+            }
+        return stats
+
+    def record_request(self, endpoint: str, seconds: float, status: int = None, size: int = 0):
+        """One HTTP attempt; ``status`` None means it failed to connect or timed out"""
+        with self._lock:
+            stats = self._endpoint(endpoint)
+            stats['requests'] += 1
+            stats['latencies'].append(seconds)
+            stats['bytes'] += size
+            code = str(status) if status is not None else 'error'
+            stats['status_codes'][code] = stats['status_codes'].get(code, 0) + 1
+            if status is None or status >= 400:
+                stats['errors'] += 1
+
+    def record_cache_hit(self, endpoint: str):
+        """A response served from the HTTP cache without any request"""
+        with self._lock:
+            self._endpoint(endpoint)['cache_hits'] += 1
+
+    def record_retry(self, endpoint: str, throttled: bool = False):
+        with self._lock:
+            stats = self._endpoint(endpoint)
+            stats['retries'] += 1
+            if throttled:
+                stats['throttled'] += 1
+
+    def record_stream(self, endpoint: str, seconds: float, size: int, decode_seconds: float = 0.0):
+        """
+        Body of a streamed response, read after record_request() saw its headers
+
+        ``seconds`` is the time spent waiting for body chunks and
+        ``decode_seconds`` the time spent decoding them; the consumer's own
+        work on the decoded items counts in neither.
+        """
+        with self._lock:
+            stats = self._endpoint(endpoint)
+            stats['stream_seconds'] += seconds
+            stats['decode_seconds'] += decode_seconds
+            stats['bytes'] += size
+
+    def record_repository(self, repo_result: Dict, seconds: float):
+        record = {
+            'project': repo_result['project'],
+            'repository': repo_result['repository'],
+            'seconds': round(seconds, 3),
+            'files': repo_result['total_files_scanned'],
+            'status': repo_result['status'],
+        }
+        with self._lock:
+            self._seq += 1
+            entry = (seconds, self._seq, record)
+            if len(self._slowest) < self.slowest_repos:
+                heapq.heappush(self._slowest, entry)
+            elif entry > self._slowest[0]:
+                heapq.heapreplace(self._slowest, entry)
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time a phase of the scan (wall and process CPU time); repeated phases add up"""
+        started, started_cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - started, time.process_time() - started_cpu
+            with self._lock:
+                phase = self.phases.setdefault(name, {'wall_seconds': 0.0, 'cpu_seconds': 0.0})
+                phase['wall_seconds'] += wall
+                phase['cpu_seconds'] += cpu
+
+    @staticmethod
+    def _percentile(sorted_values: Sequence, fraction: float) -> float:
+        """Nearest-rank percentile of sorted values"""
+        if not sorted_values:
+            return 0.0
+        rank = max(1, -(-len(sorted_values) * fraction // 1))
+        return sorted_values[int(rank) - 1]
+
+    def slowest(self) -> List[Dict]:
+        """Slowest repositories, slowest first"""
+        with self._lock:
+            return [record for _, _, record in sorted(self._slowest, reverse=True)]
+
+    def to_dict(self) -> Dict:
+        """JSON-serializable snapshot"""
+        with self._lock:
+            endpoints = {}
+            for endpoint, stats in sorted(self.endpoints.items()):
+                latencies = sorted(stats['latencies'])
+                endpoints[endpoint] = {
+                    **{key: value for key, value in stats.items() if key != 'latencies'},
+                    'latency_seconds': {
+                        'sum': sum(latencies),
+                        'mean': sum(latencies) / len(latencies) if latencies else 0.0,
+                        'p50': self._percentile(latencies, 0.5),
+                        'p90': self._percentile(latencies, 0.9),
+                        'p99': self._percentile(latencies, 0.99),
+                        'max': latencies[-1] if latencies else 0.0,
+                    },
+                }
+            phases = {name: dict(phase) for name, phase in self.phases.items()}
+        return {'endpoints': endpoints, 'phases': phases, 'slowest_repositories': self.slowest()}
+
+    def save_json(self, path: str) -> str:
+        _atomic_write_json(path, self.to_dict())
+        return path
+
+    def to_prometheus(self, prefix: str = 'azure_devops_scan') -> str:
+        """Prometheus text exposition format, e.g. for the node_exporter textfile collector"""
+        def label(value) -> str:
+            return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+        data = self.to_dict()
+        lines = []
+
+        def metric(name: str, kind: str, help_text: str, samples: Iterable):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for labels, value in samples:
+                rendered = ','.join(f'{key}="{label(val)}"' for key, val in labels.items())
+                lines.append(f"{prefix}_{name}{{{rendered}}} {value}")
+
+        endpoints = data['endpoints']
+        metric('http_requests_total', 'counter', "HTTP attempts per endpoint",
+               (({'endpoint': e}, s['requests']) for e, s in endpoints.items()))
+        metric('http_cache_hits_total', 'counter', "Responses served from the HTTP cache without a request",
+               (({'endpoint': e}, s['cache_hits']) for e, s in endpoints.items()))
+        metric('http_errors_total', 'counter', "HTTP attempts that failed or returned an error status",
+               (({'endpoint': e}, s['errors']) for e, s in endpoints.items()))
+        metric('http_retries_total', 'counter', "Retried HTTP attempts",
+               (({'endpoint': e}, s['retries']) for e, s in endpoints.items()))
+        metric('http_throttled_total', 'counter', "Attempts throttled by the service (429/503)",
+               (({'endpoint': e}, s['throttled']) for e, s in endpoints.items()))
+        metric('http_response_bytes_total', 'counter', "Response body bytes received",
+               (({'endpoint': e}, s['bytes']) for e, s in endpoints.items()))
+        metric('http_stream_seconds_total', 'counter', "Time spent waiting for streamed response bodies",
+               (({'endpoint': e}, s['stream_seconds']) for e, s in endpoints.items()))
+        metric('decode_seconds_total', 'counter', "Time spent decoding streamed JSON response bodies",
+               (({'endpoint': e}, s['decode_seconds']) for e, s in endpoints.items()))
+        metric('http_request_duration_seconds', 'summary', "Time to response headers",
+               (({'endpoint': e, 'quantile': q}, s['latency_seconds'][key])
+                for e, s in endpoints.items() for q, key in (('0.5', 'p50'), ('0.9', 'p90'), ('0.99', 'p99'))))
+        for e, s in endpoints.items():
+            lines.append(f'{prefix}_http_request_duration_seconds_sum{{endpoint="{label(e)}"}} {s["latency_seconds"]["sum"]}')
+            lines.append(f'{prefix}_http_request_duration_seconds_count{{endpoint="{label(e)}"}} {s["requests"]}')
+        metric('phase_wall_seconds', 'gauge', "Wall-clock time per scan phase",
+               (({'phase': name}, phase['wall_seconds']) for name, phase in data['phases'].items()))
+        metric('phase_cpu_seconds', 'gauge', "Process CPU time per scan phase",
+               (({'phase': name}, phase['cpu_seconds']) for name, phase in data['phases'].items()))
+        metric('repository_scan_seconds', 'gauge', "Scan time of the slowest repositories",
+               (({'project': r['project'], 'repository': r['repository']}, r['seconds'])
+                for r in data['slowest_repositories']))
+        return '\n'.join(lines) + '\n'
+
+    def save_prometheus(self, path: str) -> str:
+        _atomic_write_text(path, self.to_prometheus())
+        return path
+
+
+class HttpResponseCache:
+    """
+    On-disk cache of JSON API responses, revalidated with conditional requests
+
+    Entries store the body with its ETag, Last-Modified and continuation
+    token (paged listings). A cached URL is re-requested with If-None-Match
+    / If-Modified-Since, and a 304 is served from the cache, so unchanged
+    listings cost an empty response. With
+    ``ttl`` an entry younger than ``ttl`` seconds is served without any
+    request. The cache is bounded to ``max_bytes``, evicting least recently
+    used entries. Only URLs accepted by ``cacheable`` are cached; the
+    default is the project and repository listings, which rarely change.
+
+    Keys include a fingerprint of the Authorization header, so identities
+    sharing a directory never see each other's responses.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 64 * 1024 * 1024, ttl: float = None, cacheable=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.cacheable = cacheable or self.is_listing
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self._entries = {}  # key -> (size, last used); insertion order is not LRU, see _evict
+        for entry in os.scandir(directory):
+            if entry.name.endswith('.json') and entry.is_file():
+                stat = entry.stat()
+                self._entries[entry.name[:-len('.json')]] = (stat.st_size, stat.st_mtime)
+        self._total_bytes = sum(size for size, _ in self._entries.values())
+
+    @staticmethod
+    def is_listing(url: str) -> bool:
+        """Project and repository listings"""
+        path = url.split('?', 1)[0].rstrip('/')
+        return path.endswith('/_apis/projects') or path.endswith('/_apis/git/repositories')
+
+    @staticmethod
+    def key(url: str, params: Dict = None, headers: Dict = None) -> str:
+        identity = hashlib.sha256((headers or {}).get('Authorization', '').encode('utf-8')).hexdigest()
+        request = json.dumps([url, sorted((params or {}).items()), identity])
+        return hashlib.sha256(request.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + '.json')
+
+    def load(self, key: str) -> Dict:
+        """Cached entry, or None"""
+        with self._lock:
+            if key not in self._entries:
+                return None
+        try:
+            with open(self._path(key), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            self._forget(key)
+            return None
+
+    def is_fresh(self, entry: Dict) -> bool:
+        return self.ttl is not None and time.time() - entry['stored_at'] < self.ttl
+
+    @staticmethod
+    def conditional_headers(entry: Dict) -> Dict:
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def store(self, key: str, response: requests.Response):
+        """Cache a 200 response that can be revalidated (or any, when a TTL is set)"""
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if not (etag or last_modified or self.ttl):
+            return
+        try:
+            body = response.content.decode('utf-8')
+        except UnicodeDecodeError:
+            return
+        text = json.dumps({
+            'url': response.url,
+            'stored_at': time.time(),
+            'etag': etag,
+            'last_modified': last_modified,
+            'content_type': response.headers.get('Content-Type'),
+            'continuation_token': response.headers.get('x-ms-continuationtoken'),
+            'body': body,
+        })
+        _atomic_write_text(self._path(key), text)
+        self._used(key, len(text.encode('utf-8')))
+
+    def refresh(self, key: str, entry: Dict):
+        """Restart the TTL of an entry the server confirmed unchanged"""
+        entry['stored_at'] = time.time()
+        text = json.dumps(entry)
+        _atomic_write_text(self._path(key), text)
+        self._used(key, len(text.encode('utf-8')))
+
+    def touch(self, key: str):
+        """Mark an entry as used (the file's mtime keeps the LRU order across runs)"""
+        with self._lock:
+            if key in self._entries:
+                self._entries[key] = (self._entries[key][0], time.time())
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            pass
+
+    def count(self, outcome: str):
+        """Count a lookup outcome: 'hits', 'revalidated' or 'misses'"""
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def _used(self, key: str, size: int):
+        with self._lock:
+            previous = self._entries.get(key)
+            self._total_bytes += size - (previous[0] if previous else 0)
+            self._entries[key] = (size, time.time())
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits (lock held)"""
+        for key, (size, _) in sorted(self._entries.items(), key=lambda item: item[1][1]):
+            if self._total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            del self._entries[key]
+            self._total_bytes -= size
+
+    def _forget(self, key: str):
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous:
+                self._total_bytes -= previous[0]
+
+    @staticmethod
+    def response(entry: Dict, cache_status: str) -> requests.Response:
+        """Rebuild a 200 response from an entry; ``cache_status`` is 'hit' or 'revalidated'"""
+        response = requests.Response()
+        response.status_code = 200
+        response.url = entry['url']
+        response.encoding = 'utf-8'
+        response._content = entry['body'].encode('utf-8')
+        response.headers['Content-Type'] = entry.get('content_type') or 'application/json'
+        if entry.get('continuation_token'):
+            response.headers['x-ms-continuationtoken'] = entry['continuation_token']
+        response.cache_status = cache_status
+        return response
+
+
+class AzureDevOpsTransport:
+    """
+    Shared HTTP transport for the scanner
+
+    Wraps a requests.Session with a keep-alive connection pool, compressed
+    responses and connect/read timeouts. Pass an instance to
+    AzureDevOpsOrgScanner to share it between scanners, or to point a scan at
+    a local stand-in server together with ``base_url``.
+    """
+
+    def __init__(self, pool_size: int = 8, connect_timeout: float = 10.0, read_timeout: float = 300.0,
+                 cache: HttpResponseCache = None):
+        """
+        Args:
+            pool_size: Maximum number of pooled keep-alive connections per host;
+                       should be at least the scan concurrency
+            connect_timeout: Seconds to wait for a TCP/TLS connection
+            read_timeout: Seconds to wait between bytes of a response
+            cache: Conditional-request cache for (non-streamed) listing responses
+        """
+        self.timeout = (connect_timeout, read_timeout)
+        self.cache = cache
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Accept": "application/json",
+            "Accept-Encoding": "gzip, deflate",
+            "Connection": "keep-alive",
+        })
+
+    def get(self, url: str, headers: Dict = None, params: Dict = None, stream: bool = False) -> requests.Response:
+        """
+        Send a GET request over the pooled session
+
+        Cacheable requests are answered from the cache when fresh, and
+        otherwise revalidated; such responses carry a ``cache_status``
+        attribute ('hit' or 'revalidated').
+        """
+        cache = self.cache
+        if cache is None or stream or not cache.cacheable(url):
+            return self.session.get(url, headers=headers, params=params, stream=stream, timeout=self.timeout)
+
+        key = cache.key(url, params, headers)
+        entry = cache.load(key)
+        request_headers = dict(headers or {})
+        if entry is not None:
+            if cache.is_fresh(entry):
+                cache.touch(key)
+                cache.count('hits')
+                return cache.response(entry, 'hit')
+            request_headers.update(cache.conditional_headers(entry))
+
+        response = self.session.get(url, headers=request_headers, params=params, timeout=self.timeout)
+        if response.status_code == 304 and entry is not None:
+            cache.refresh(key, entry)
+            cache.count('revalidated')
+            return cache.response(entry, 'revalidated')
+        if response.status_code == 200:
+            cache.count('misses')
+            cache.store(key, response)
+        return response
+
+    def close(self):
+        """Close all pooled connections"""
+        self.session.close()
+
+
+class RateLimitScheduler:
+    """
+    Rate-limit-aware scheduler wrapping every scanner API call
+
+    Azure DevOps throttles heavy readers with TSTU budgets and answers 429/503
+    with ``Retry-After``. The scheduler retries those (and transient 5xx and
+    connection errors) with jittered backoff, pauses all workers while the
+    service asks us to wait, and adapts the number of in-flight requests:
+    halved on a throttle, reduced when ``X-RateLimit-Remaining`` runs low or
+    ``X-RateLimit-Delay`` reports we are being slowed, and raised by one after
+    a run of clean responses. A streamed response keeps its slot until it is
+    closed, so long downloads count against the limit while their body is read.
+    """
+
+    RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+    THROTTLE_STATUS_CODES = {429, 503}
+
+    def __init__(self, transport: AzureDevOpsTransport, max_concurrency: int = 8, max_retries: int = 6,
+                 base_delay: float = 1.0, max_delay: float = 120.0, low_remaining_ratio: float = 0.1,
+                 telemetry: ScanTelemetry = None):
+        """
+        Args:
+            transport: Transport used to send the requests
+            max_concurrency: Upper bound for in-flight requests
+            max_retries: Retries per request before giving up
+            base_delay: First backoff delay in seconds when no Retry-After is given
+            max_delay: Cap for a single backoff delay in seconds
+            low_remaining_ratio: Back off when X-RateLimit-Remaining drops below this share of X-RateLimit-Limit
+            telemetry: Receives every attempt, retry and throttle per endpoint
+        """
+        self.transport = transport
+        self.telemetry = telemetry
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.low_remaining_ratio = low_remaining_ratio
+
+        self.concurrency_limit = self.max_concurrency
+        self.in_flight = 0
+        self.total_retries = 0
+        self.total_throttled = 0
+
+        self._condition = threading.Condition()
+        self._paused_until = 0.0
+        self._clean_responses = 0
+        self._local = threading.local()
+
+    def budget(self) -> int:
+        """Requests allowed at once right now: 0 while paused, else the current concurrency limit"""
+        with self._condition:
+            return 0 if self._paused_until > time.monotonic() else self.concurrency_limit
+
+    def begin_task(self):
+        """Reset the retry counter of the calling thread (one task = one repository)"""
+        self._local.retries = 0
+
+    def task_retries(self) -> int:
+        """Number of retries made by the calling thread since begin_task()"""
+        return getattr(self._local, 'retries', 0)
+
+    def get(self, url: str, headers: Dict = None, params: Dict = None, stream: bool = False) -> requests.Response:
+        """
+        Send a GET request, retrying throttled and transient failures
+
+        Returns the last response once it is not retryable or retries are
+        exhausted (the caller still calls raise_for_status()); re-raises the
+        last connection error if every attempt failed to connect. With
+        ``stream`` the caller must close the response, which frees its slot.
+        """
+        endpoint = ScanTelemetry.endpoint_of(url, params) if self.telemetry is not None else None
+        attempt = 0
+        while True:
+            self._acquire()
+            throttled = False
+            held = False
+            started = time.perf_counter()
+            try:
+                response = self.transport.get(url, headers=headers, params=params, stream=stream)
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+                self._record(endpoint, started)
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff_delay(attempt)
+            else:
+                self._record(endpoint, started, response, stream)
+                if response.status_code not in self.RETRY_STATUS_CODES or attempt >= self.max_retries:
+                    self._observe(response)
+                    if stream:
+                        self._hold_until_closed(response)
+                        held = True
+                    return response
+
+                retry_after = self._parse_retry_after(response)
+                throttled = response.status_code in self.THROTTLE_STATUS_CODES
+                if throttled:
+                    self._throttled(retry_after)
+                delay = self._backoff_delay(attempt, retry_after)
+                response.close()
+            finally:
+                if not held:
+                    self._release()
+
+            attempt += 1
+            self._local.retries = self.task_retries() + 1
+            with self._condition:
+                self.total_retries += 1
+            if self.telemetry is not None:
+                self.telemetry.record_retry(endpoint, throttled)
+            time.sleep(delay)
+
+    def _record(self, endpoint: str, started: float, response: requests.Response = None, stream: bool = False):
+        """Report one attempt to telemetry; streamed bodies are counted by their reader"""
+        if self.telemetry is None:
+            return
+        cache_status = getattr(response, 'cache_status', None)
+        if cache_status == 'hit':
+            self.telemetry.record_cache_hit(endpoint)
+            return
+        if cache_status == 'revalidated':
+            status, size = 304, 0
+        else:
+            size = len(response.content) if response is not None and not stream else 0
+            status = response.status_code if response is not None else None
+        self.telemetry.record_request(endpoint, time.perf_counter() - started, status, size)
+
+    def _acquire(self):
+        """Wait for a free request slot and for any service-requested pause to end"""
+        with self._condition:
+            while True:
+                pause = self._paused_until - time.monotonic()
+                if pause > 0:
+                    self._condition.wait(pause)
+                elif self.in_flight >= self.concurrency_limit:
+                    self._condition.wait()
+                else:
+                    self.in_flight += 1
+                    return
+
+    def _release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def _hold_until_closed(self, response: requests.Response):
+        """Release the request slot of a streamed response when it is closed, or collected unclosed"""
+        released = []
+
+        def release():
+            if not released:
+                released.append(True)
+                self._release()
+
+        close = response.close
+
+        def close_and_release():
+            try:
+                close()
+            finally:
+                release()
+
+        response.close = close_and_release
+        weakref.finalize(response, release)
+
+    def _throttled(self, retry_after: float):
+        """Multiplicative decrease and a shared pause for all workers"""
+        with self._condition:
+            self.total_throttled += 1
+            self._clean_responses = 0
+            self.concurrency_limit = max(1, self.concurrency_limit // 2)
+            if retry_after:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+    def _observe(self, response: requests.Response):
+        """Adjust the concurrency limit from X-RateLimit-* headers of a completed request"""
+        delay = self._parse_float(response.headers.get('X-RateLimit-Delay'))
+        remaining = self._parse_float(response.headers.get('X-RateLimit-Remaining'))
+        limit = self._parse_float(response.headers.get('X-RateLimit-Limit'))
+        retry_after = self._parse_retry_after(response)
+
+        with self._condition:
+            if retry_after:
+                # Budget exhausted but the request was still served: slow down before the 429s start
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                self.concurrency_limit = max(1, self.concurrency_limit // 2)
+                self._clean_responses = 0
+            elif delay or (remaining is not None and limit and remaining < limit * self.low_remaining_ratio):
+                self.concurrency_limit = max(1, self.concurrency_limit - 1)
+                self._clean_responses = 0
+            else:
+                self._clean_responses += 1
+                if self._clean_responses >= self.concurrency_limit and self.concurrency_limit < self.max_concurrency:
+                    self.concurrency_limit += 1
+                    self._clean_responses = 0
+                    self._condition.notify_all()
+
+    def _backoff_delay(self, attempt: int, retry_after: float = None) -> float:
+        """Retry-After plus a little jitter, or full-jitter exponential backoff"""
+        if retry_after:
+            return min(self.max_delay, retry_after) + random.uniform(0, min(1.0, retry_after * 0.1))
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _parse_retry_after(self, response: requests.Response) -> float:
+        """Retry-After as seconds (the header may be a number or an HTTP date)"""
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+        seconds = self._parse_float(value)
+        if seconds is not None:
+            return max(0.0, seconds)
+        try:
+            return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _parse_float(value: str) -> float:
+        try:
+            return float(value) if value is not None else None
+        except ValueError:
+            return None
+
+
+class FairWorkPool:
+    """
+    Bounded worker pool shared by the scans of several organizations
+
+    Each organization submits through its own queue (see queue()).
+    ``workers`` threads take tasks round-robin across the organizations
+    that have queued work, so a large organization cannot hold up the
+    others, and pass over an organization already running as many tasks as
+    its budget allows. The budget is re-read on every pick; with a
+    scheduler's budget() it shrinks while the organization is throttled
+    and drops to zero while the service has asked it to pause, freeing the
+    threads for other organizations.
+    """
+
+    IDLE_POLL = 0.25  # Seconds between budget checks while every organization with work is at its budget
+
+    def __init__(self, workers: int = 16):
+        self.workers = max(1, workers)
+        self._queues = {}  # organization -> deque of (future, fn, args)
+        self._running = {}  # organization -> tasks running
+        self._budgets = {}  # organization -> callable returning how many tasks it may run at once
+        self._turn = 0  # Position in _queues of the organization to consider first
+        self._shutdown = False
+        self._condition = threading.Condition()
+        self._local = threading.local()
+        self._threads = [threading.Thread(target=self._work, daemon=True) for _ in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def queue(self, organization: str, budget=None) -> '_OrganizationQueue':
+        """Executor-like queue for one organization; ``budget`` defaults to the whole pool"""
+        with self._condition:
+            self._queues.setdefault(organization, deque())
+            self._running.setdefault(organization, 0)
+            self._budgets[organization] = budget or (lambda: self.workers)
+        return _OrganizationQueue(self, organization)
+
+    def submit(self, organization: str, fn, *args) -> Future:
+        future = Future()
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("cannot submit to a pool that was shut down")
+            self._queues[organization].append((future, fn, args))
+            self._condition.notify()
+        return future
+
+    def cancel(self, organization: str):
+        """Cancel the organization's tasks that have not started"""
+        with self._condition:
+            tasks = self._queues[organization]
+            self._queues[organization] = deque()
+        for future, _, _ in tasks:
+            future.cancel()
+
+    def current_organization(self) -> str:
+        """Organization of the task running on the calling thread, or None"""
+        return getattr(self._local, 'organization', None)
+
+    def shutdown(self, wait: bool = True):
+        """Stop the workers once every queued task has run"""
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _next_task(self) -> tuple:
+        """Wait for the next task whose organization is under budget; None once shut down and drained"""
+        with self._condition:
+            while True:
+                organizations = list(self._queues)
+                waiting = False
+                for offset in range(len(organizations)):
+                    organization = organizations[(self._turn + offset) % len(organizations)]
+                    if not self._queues[organization]:
+                        continue
+                    waiting = True
+                    if self._running[organization] >= self._budgets[organization]():
+                        continue
+                    self._turn = (self._turn + offset + 1) % len(organizations)
+                    self._running[organization] += 1
+                    return organization, self._queues[organization].popleft()
+                if self._shutdown and not waiting:
+                    return None
+                # Budgets change without notice (throttling ends), so re-check them periodically
+                self._condition.wait(self.IDLE_POLL if waiting else None)
+
+    def _work(self):
+        while True:
+            next_task = self._next_task()
+            if next_task is None:
+                return
+            organization, (future, fn, args) = next_task
+            if future.set_running_or_notify_cancel():
+                self._local.organization = organization
+                try:
+                    result = fn(*args)
+                except BaseException as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+                finally:
+                    self._local.organization = None
+            with self._condition:
+                self._running[organization] -= 1
+                self._condition.notify_all()
+
+
+class _OrganizationQueue:
+    """One organization's side of a FairWorkPool, used like an executor"""
+
+    def __init__(self, pool: FairWorkPool, organization: str):
+        self.pool = pool
+        self.organization = organization
+
+    def submit(self, fn, *args) -> Future:
+        return self.pool.submit(self.organization, fn, *args)
+
+    def __enter__(self) -> '_OrganizationQueue':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # The pool outlives the scan: drop what an aborted scan left queued
+        if exc_type is not None:
+            self.pool.cancel(self.organization)
+
+
+def _is_bare_repository(path: str) -> bool:
+    return all(os.path.exists(os.path.join(path, name)) for name in ('HEAD', 'objects', 'refs'))
+
+
+def discover_mirrors(root: str) -> List[Tuple[str, str, str]]:
+    """
+    Find bare mirrors under ``root`` as (project, repository, path)
+
+    Accepts a single bare repository, a directory of mirrors (project =
+    the directory's name) or a directory of project directories of mirrors,
+    e.g. as made by ``git clone --mirror <url> <root>/<project>/<repo>.git``.
+    A ``.git`` suffix is dropped from repository names.
+    """
+    root = os.path.abspath(root)
+
+    def repo_name(path: str) -> str:
+        name = os.path.basename(path)
+        return name[:-len('.git')] if name.endswith('.git') else name
+
+    if _is_bare_repository(root):
+        return [(os.path.basename(os.path.dirname(root)), repo_name(root), root)]
+
+    mirrors = []
+    for entry in sorted(os.scandir(root), key=lambda entry: entry.name):
+        if not entry.is_dir():
+            continue
+        if _is_bare_repository(entry.path):
+            mirrors.append((os.path.basename(root), repo_name(entry.path), entry.path))
+            continue
+        for child in sorted(os.scandir(entry.path), key=lambda child: child.name):
+            if child.is_dir() and _is_bare_repository(child.path):
+                mirrors.append((entry.name, repo_name(child.path), child.path))
+    return mirrors
+
+
+def iter_mirror_blobs(path: str) -> Iterator[Tuple[str, int, str]]:
+    """
+    Stream every blob reachable from any ref of a local repository
+
+    Pipes ``git rev-list --objects --all`` (each object once, with the
+    first path it was reached by) into one ``git cat-file --batch-check``
+    process, so sizes come from the object database without reading blob
+    contents. Yields (object ID, size, path with a leading '/').
+
+    Raises:
+        subprocess.CalledProcessError: if either git command fails
+    """
+    with tempfile.TemporaryFile() as rev_list_errors:
+        rev_list = subprocess.Popen(
+            ['git', '-C', path, 'rev-list', '--objects', '--all'],
+            stdout=subprocess.PIPE, stderr=rev_list_errors,
+        )
+        batch_check = subprocess.Popen(
+            ['git', '-C', path, 'cat-file', '--batch-check=%(objectname) %(objecttype) %(objectsize) %(rest)'],
+            stdin=rev_list.stdout, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        )
+        rev_list.stdout.close()  # cat-file owns the pipe now; rev-list sees SIGPIPE if cat-file exits
+
+        try:
+            for line in batch_check.stdout:
+                object_id, object_type, size, *rest = line.rstrip(b'\n').split(b' ', 3)
+                if object_type != b'blob':
+                    continue
+                file_path = rest[0].decode('utf-8', errors='replace') if rest else ''
+                yield object_id.decode('ascii'), int(size), '/' + file_path
+        finally:
+            batch_check.stdout.close()
+            batch_check.wait()
+            rev_list.wait()
+
+        if rev_list.returncode:
+            rev_list_errors.seek(0)
+            raise subprocess.CalledProcessError(
+                rev_list.returncode, rev_list.args, stderr=rev_list_errors.read().decode('utf-8', errors='replace')
+            )
+        if batch_check.returncode:
+            raise subprocess.CalledProcessError(batch_check.returncode, batch_check.args)
+
 
 class AzureDevOpsOrgScanner:
-    def __init__(self, organization: str, bearer_token: str):
+    STREAM_CHUNK_SIZE = 64 * 1024  # Bytes read at a time from streamed item listings
+    EXCEL_MAX_ROWS = 1048576  # Rows per worksheet allowed by Excel
+    EXCEL_STREAMING_THRESHOLD = 50000  # Large files above which export_to_excel streams by default
+    FOLDER_WALK_MIN_REPO_SIZE = 2 * 1024 ** 3  # Repository size from which items are listed folder by folder
+    FOLDER_WALK_WORKERS = 4  # Folders of one repository listed concurrently during a folder walk
+    PROJECTS_PAGE_SIZE = 100  # Projects requested per page ($top)
+    REFS_PAGE_SIZE = 1000  # Refs requested per page ($top; the API's maximum)
+    LISTING_WORKERS = 4  # Projects whose repositories are listed concurrently while scanning runs
+
+    def __init__(self, organization: str, bearer_token: str, max_workers: int = 8,
+                 transport: AzureDevOpsTransport = None, base_url: str = None, cache_path: str = None,
+                 checkpoint_path: str = None, http_cache: HttpResponseCache = None, branches: List[str] = None,
+                 pool: FairWorkPool = None, min_size_mb: float = 100):
         """
         Initialize scanner for entire Azure DevOps organization
         
         Args:
             organization: Azure DevOps organization name
             bearer_token: Bearer token for authentication
+            max_workers: Maximum number of repositories scanned concurrently
+            transport: Shared HTTP transport (default: a pool sized to max_workers)
+                       All API calls go through a RateLimitScheduler wrapping it.
+            base_url: Override the organization URL, e.g. for a local stand-in server
+            cache_path: JSON file for incremental re-scans; unchanged repositories
+                        (same default-branch head commit) are served from it
+            checkpoint_path: Journal of completed repositories, written as the scan
+                             runs so an interrupted scan can be resumed
+            http_cache: Conditional-request cache for the project and repository
+                        listings, used by the default transport
+            branches: Name patterns (fnmatch, e.g. 'release/*') of branches scanned
+                      besides the default branch; None scans the default branch only
+            pool: Worker pool shared with other organizations' scanners; repositories
+                  are scanned on it within this scanner's rate-limit budget instead
+                  of on a pool of max_workers threads of its own
+            min_size_mb: Size in MB from which a file is reported as large
         """
         self.organization = organization
-        self.base_url = f"https://dev.azure.com/{organization}"
+        self.base_url = base_url or f"https://dev.azure.com/{organization}"
         
         # Setup authentication with Bearer token
         self.headers = {
@@ -28,189 +2624,1044 @@ class AzureDevOpsOrgScanner:
             "Content-Type": "application/json"
         }
         
-        self.min_size_mb = 100  # Only files >= 100MB
-        self.min_size_bytes = self.min_size_mb * 1024 * 1024
+        self.min_size_bytes = round(min_size_mb * 1024 * 1024)
+        min_size_mb = float(round(min_size_mb, 3))  # As reports show it: 100, 0.5, 0.3 (from 314573 bytes)
+        self.min_size_mb = int(min_size_mb) if min_size_mb.is_integer() else min_size_mb
+        self.max_workers = max(1, max_workers)
+        self.transport = transport or AzureDevOpsTransport(pool_size=self.max_workers, cache=http_cache)
+        self.telemetry = ScanTelemetry()
+        self.scheduler = RateLimitScheduler(self.transport, max_concurrency=self.max_workers, telemetry=self.telemetry)
+        self.cache = ScanCache(cache_path, self.min_size_bytes) if cache_path else None
+        self.checkpoint = (
+            ScanCheckpoint(checkpoint_path, organization, self.min_size_bytes, branches=branches)
+            if checkpoint_path else None
+        )
+        self.branches = branches
+        self.blob_index = BlobIndex()
+        self.pool = pool.queue(organization, self.scheduler.budget) if pool is not None else None
     
     def get_all_projects(self) -> List[Dict]:
         """Get all projects in the organization"""
-        url = f"{self.base_url}/_apis/projects?api-version=7.0"
-        
-        try:
-            response = requests.get(url, headers=self.headers)
-            response.raise_for_status()
-            projects = response.json()['value']
-            print(f"📁 Found {len(projects)} projects in organization")
-            return projects
-        except requests.exceptions.HTTPError as e:
-            print(f"❌ Error fetching projects: {e}")
-            print(f"Response: {e.response.text}")
-            raise
+        projects = list(self.iter_projects())
+        print(f"📁 Found {len(projects)} projects in organization")
+        return projects
+
+    def iter_projects(self) -> Iterator[Dict]:
+        """
+        Yield the projects in the organization as their pages arrive
+
+        The projects API returns at most $top projects per response and an
+        x-ms-continuationtoken header while more remain; pages are followed
+        until it is absent, so large organizations are not cut off at the
+        first page.
+        """
+        url = f"{self.base_url}/_apis/projects"
+        continuation_token = None
+        while True:
+            params = {
+                "$top": self.PROJECTS_PAGE_SIZE,
+                "api-version": "7.0"
+            }
+            if continuation_token:
+                params["continuationToken"] = continuation_token
+
+            try:
+                response = self.scheduler.get(url, headers=self.headers, params=params)
+                response.raise_for_status()
+            except requests.exceptions.HTTPError as e:
+                print(f"❌ Error fetching projects: {e}")
+                print(f"Response: {e.response.text}")
+                raise
+
+            yield from response.json()['value']
+            continuation_token = response.headers.get('x-ms-continuationtoken')
+            if not continuation_token:
+                return
     
     def get_repositories_in_project(self, project_name: str) -> List[Dict]:
-        """Get all repositories in a project"""
+        """
+        Get all repositories in a project
+
+        Raises once the scheduler has given up retrying, so a failed listing
+        is never mistaken for a project without repositories.
+        """
         url = f"{self.base_url}/{project_name}/_apis/git/repositories?api-version=7.0"
         
         try:
-            response = requests.get(url, headers=self.headers)
+            response = self.scheduler.get(url, headers=self.headers)
             response.raise_for_status()
             return response.json()['value']
-        except requests.exceptions.HTTPError as e:
+        except requests.exceptions.RequestException as e:
             print(f"  ⚠️  Error fetching repos in {project_name}: {e}")
-            return []
+            raise
     
-    def get_repository_items(self, project_name: str, repo_id: str) -> List[Dict]:
-        """Get all items in a repository recursively"""
+    def get_default_branch_head(self, project_name: str, repo: Dict) -> str:
+        """
+        Get the commit ID at the head of a repository's default branch
+
+        A single filtered refs lookup, far cheaper than listing the tree.
+        Returns None for an empty repository (no default branch).
+        """
+        default_branch = repo.get('defaultBranch')
+        if not default_branch:
+            return None
+
+        for ref in self.iter_refs(project_name, repo['id'], default_branch[len('refs/'):]):
+            if ref['name'] == default_branch:
+                return ref['objectId']
+        return None
+
+    def iter_refs(self, project_name: str, repo_id: str, ref_filter: str) -> Iterator[Dict]:
+        """
+        Yield the refs of a repository starting with ``'refs/' + ref_filter``
+
+        Follows x-ms-continuationtoken like iter_projects(), so repositories
+        with more refs than a page are not cut off.
+        """
+        url = f"{self.base_url}/{project_name}/_apis/git/repositories/{repo_id}/refs"
+        continuation_token = None
+        while True:
+            params = {
+                "filter": ref_filter,
+                "$top": self.REFS_PAGE_SIZE,
+                "api-version": "7.0"
+            }
+            if continuation_token:
+                params["continuationToken"] = continuation_token
+
+            response = self.scheduler.get(url, headers=self.headers, params=params)
+            response.raise_for_status()
+            yield from response.json()['value']
+            continuation_token = response.headers.get('x-ms-continuationtoken')
+            if not continuation_token:
+                return
+
+    def get_branches(self, project_name: str, repo: Dict) -> List[Tuple[str, str]]:
+        """
+        List the branches of a repository to scan, as (name, head commit ID)
+
+        The default branch comes first, then the branches matching any of
+        the ``branches`` patterns. Returns an empty list for an empty
+        repository (no default branch).
+        """
+        default_branch = repo.get('defaultBranch')
+        if not default_branch:
+            return []
+
+        branches = []
+        for ref in self.iter_refs(project_name, repo['id'], "heads/"):
+            name = ref['name'][len('refs/heads/'):]
+            if ref['name'] == default_branch:
+                branches.insert(0, (name, ref['objectId']))
+            elif any(fnmatchcase(name, pattern) for pattern in self.branches or ()):
+                branches.append((name, ref['objectId']))
+        return branches
+
+    def get_repository_items(self, project_name: str, repo_id: str, commit_id: str = None,
+                             include_trees: bool = False) -> Iterator[Dict]:
+        """
+        Stream all blob items in a repository recursively
+
+        The recursionLevel=Full listing is parsed while it downloads and only
+        blobs are yielded, so memory stays flat however large the repository.
+        Yields nothing for an empty repository (404). Any other failure,
+        including a truncated body, is raised after the scheduler's retries so
+        the repository is reported as failed.
+
+        Lists the default branch, or the tree at ``commit_id`` when given.
+        With ``include_trees`` folders are yielded too (the root folder first).
+        """
         url = f"{self.base_url}/{project_name}/_apis/git/repositories/{repo_id}/items"
         params = {
             "recursionLevel": "Full",
             "api-version": "7.0"
         }
+        if commit_id:
+            params["versionDescriptor.version"] = commit_id
+            params["versionDescriptor.versionType"] = "commit"
         
         try:
-            response = requests.get(url, headers=self.headers, params=params)
+            response = self.scheduler.get(url, headers=self.headers, params=params, stream=True)
             response.raise_for_status()
-            return response.json()['value']
         except requests.exceptions.HTTPError as e:
+            e.response.close()  # Frees its request slot
             if e.response.status_code == 404:
                 # Empty repository
-                return []
-            print(f"    ⚠️  Error fetching items: {e}")
-            return []
+                return
+            raise
+
+        received = 0
+        download_seconds = 0.0
+        parse_seconds = 0.0  # Decoding, including the downloads it waits for
+        end = object()
+
+        def chunks():
+            nonlocal received, download_seconds
+            body = response.iter_content(chunk_size=self.STREAM_CHUNK_SIZE)
+            while True:
+                started = time.perf_counter()
+                chunk = next(body, end)
+                download_seconds += time.perf_counter() - started
+                if chunk is end:
+                    return
+                received += len(chunk)
+                yield chunk
+
+        try:
+            with response:
+                items = iter_json_array_items(chunks())
+                while True:
+                    started = time.perf_counter()
+                    item = next(items, end)
+                    parse_seconds += time.perf_counter() - started
+                    if item is end:
+                        break
+                    # Only files (blobs), not folders
+                    if item.get('gitObjectType') == 'blob' or include_trees:
+                        yield item
+        finally:
+            self.telemetry.record_stream('items', download_seconds, received, max(0.0, parse_seconds - download_seconds))
     
-    def scan_organization(self) -> Dict:
+    def get_commit_changes(self, project_name: str, repo_id: str, base_commit: str, target_commit: str,
+                           page_size: int = 1000) -> List[Dict]:
+        """
+        List the items changed between two commits (diffs/commits)
+
+        Each change has the item (path, objectId, gitObjectType) and its
+        changeType. Pages of ``page_size`` changes are followed with $skip.
+        Failures are raised after the scheduler's retries.
+        """
+        url = f"{self.base_url}/{project_name}/_apis/git/repositories/{repo_id}/diffs/commits"
+        changes = []
+        while True:
+            params = {
+                "baseVersion": base_commit,
+                "baseVersionType": "commit",
+                "targetVersion": target_commit,
+                "targetVersionType": "commit",
+                "$top": page_size,
+                "$skip": len(changes),
+                "api-version": "7.0"
+            }
+            response = self.scheduler.get(url, headers=self.headers, params=params)
+            response.raise_for_status()
+            page = response.json().get('changes', [])
+            changes.extend(page)
+            if len(page) < page_size:
+                return changes
+
+    def get_folder_items(self, project_name: str, repo_id: str, scope_path: str,
+                         commit_id: str = None) -> List[Dict]:
+        """
+        List one folder and its direct children (recursionLevel=OneLevel)
+
+        Returns an empty list for a missing folder or empty repository (404);
+        other failures are raised after the scheduler's retries.
+        """
+        url = f"{self.base_url}/{project_name}/_apis/git/repositories/{repo_id}/items"
+        params = {
+            "scopePath": scope_path,
+            "recursionLevel": "OneLevel",
+            "api-version": "7.0"
+        }
+        if commit_id:
+            params["versionDescriptor.version"] = commit_id
+            params["versionDescriptor.versionType"] = "commit"
+
+        try:
+            response = self.scheduler.get(url, headers=self.headers, params=params)
+            response.raise_for_status()
+        except requests.exceptions.HTTPError as e:
+            if e.response.status_code == 404:
+                return []
+            raise
+
+        return response.json()['value']
+
+    def iter_repository_items_by_folder(self, project_name: str, repo_id: str, commit_id: str = None,
+                                        include_trees: bool = False, skip_trees: set = None) -> Iterator[Dict]:
+        """
+        Stream all blob items in a repository, listing it one folder at a time
+
+        Fallback for trees too large for a single recursionLevel=Full
+        listing: each request covers one folder level, so no response grows
+        with the repository, and up to FOLDER_WALK_WORKERS folders are listed
+        concurrently. Yields the same items as get_repository_items(),
+        folder by folder in breadth-first order. Failures are raised.
+
+        Folders whose tree objectId is in ``skip_trees`` are yielded but not
+        listed; every folder listed is added to it, so a tree that repeats
+        within the walk is listed once.
+        """
+        folders = deque(['/'])
+        pending = deque()  # (folder, future) in the order folders were found
+        with ThreadPoolExecutor(max_workers=self.FOLDER_WALK_WORKERS) as executor:
+            try:
+                while folders or pending:
+                    # Keep a few listings queued ahead so the workers never idle
+                    while folders and len(pending) < 2 * self.FOLDER_WALK_WORKERS:
+                        folder = folders.popleft()
+                        pending.append((folder, executor.submit(
+                            self.get_folder_items, project_name, repo_id, folder, commit_id
+                        )))
+
+                    folder, future = pending.popleft()
+                    for item in future.result():
+                        if item.get('path') == folder:
+                            # The listed folder itself; only the root is reported
+                            if folder == '/' and include_trees:
+                                yield item
+                            continue
+                        if item.get('isFolder') or item.get('gitObjectType') == 'tree':
+                            if skip_trees is None:
+                                folders.append(item['path'])
+                            elif item.get('objectId') not in skip_trees:
+                                skip_trees.add(item.get('objectId'))
+                                folders.append(item['path'])
+                            if include_trees:
+                                yield item
+                        elif item.get('gitObjectType') == 'blob':
+                            yield item
+            finally:
+                # Stopped early (shared tree or failure): drop listings not yet started
+                for _, future in pending:
+                    future.cancel()
+
+    def scan_organization(self, exporters: List[ResultExporter] = None, retain_files: bool = True,
+                          resume: bool = False, shard: Tuple[int, int] = None) -> Dict:
         """
-        Scan entire organization for files >= 100MB
+        Scan entire organization for files >= min_size_mb
+
+        Enumeration and scanning form a pipeline: projects are read page by
+        page on a thread of their own, each project's repositories are listed
+        on a small pool as soon as it arrives, and its repositories are
+        queued for scanning as soon as the listing (and those of earlier
+        projects) are in, so the first results come in while enumeration is
+        still running. Repositories are scanned concurrently on a pool of
+        ``max_workers`` threads. Results are merged in project/repository
+        order, so totals and ordering do not depend on which repository
+        finishes first.
+
+        Args:
+            exporters: Incremental exporters that receive records as they are
+                       merged; opened here and closed when the scan ends, even on error
+            retain_files: Keep file records in results['large_files']; pass False
+                          together with exporters to scan huge orgs in bounded memory
+            resume: Take repositories completed by an interrupted run from the
+                    checkpoint journal instead of scanning them again
+            shard: (i, N) to scan only the repositories whose ID hashes to shard i
+                   of N; results['shard'] then holds what save_partial() writes
         """
         print("=" * 80)
         print(f"🔍 Scanning Azure DevOps Organization: {self.organization}")
         print(f"📊 Looking for files >= {self.min_size_mb} MB")
+        print(f"⚙️  Concurrency: {self.max_workers} workers")
+        if shard is not None:
+            print(f"🧩 Shard: {shard[0]}/{shard[1]}")
         print("=" * 80)
-        print()        
-        # Get all projects
-        projects = self.get_all_projects()
-        print()        
-        all_large_files = []
-        repo_stats = []
-        project_stats = []
-        
-        total_repos = 0
-        total_files_scanned = 0
-        total_large_files = 0
-        total_size_all_large_files = 0;
-        
-        # Scan each project
-        for project_idx, project in enumerate(projects, 1):
-            project_name = project['name']
-            
-            print(f"[{project_idx}/{len(projects)}] 📂 Project: {project_name}")
-            
-            # Get repositories in this project
-            repos = self.get_repositories_in_project(project_name)
-            
-            if not repos:
-                print(f"  ℹ️  No repositories found")
+        print()
+
+        failed_projects = []
+        self.blob_index = BlobIndex()
+
+        exporters = exporters or []
+        builder = ScanResultBuilder(self.blob_index, exporters, retain_files)
+        live_repo_ids = set()
+
+        resumed = {}
+        if self.checkpoint is not None:
+            resumed = self.checkpoint.start(resume)
+            if resumed:
+                print(f"⏯️  Resuming: {len(resumed)} repositories in "
+                      f"{len(self.checkpoint.completed_projects)} completed projects taken from {self.checkpoint.path}")
                 print()
-                continue;
-            
-            print(f"  📚 Found {len(repos)} repositories")
-            
-            project_large_files = 0;
-            project_total_size = 0;
-            
-            # Scan each repository
-            for repo_idx, repo in enumerate(repos, 1):
-                repo_name = repo['name']
-                repo_id = repo['id']
-                total_repos += 1;
-                
-                print(f"  [{repo_idx}/{len(repos)}] 📦 {repo_name}...", end=" ", flush=True)
-                
-                # Get all items in repository
-                items = self.get_repository_items(project_name, repo_id);
-                
-                repo_large_files = [];
-                repo_total_files = 0;
-                repo_large_files_size = 0;
-                
-                for item in items:
-                    # Only process files (blobs), not folders
-                    if item.get('gitObjectType') == 'blob':
-                        repo_total_files += 1;
-                        total_files_scanned += 1;
-                        
-                        file_size = item.get('size', 0);
-                        
-                        # Only include files >= 100MB
-                        if file_size >= self.min_size_bytes:
-                            file_path = item.get('path', '');
-                            file_name = file_path.split('/')[-1] if '/' in file_path else file_path;
-                            
-                            file_size_mb = file_size / (1024 * 1024);
-                            file_size_gb = file_size / (1024 ** 3);
-                            
-                            file_info = {
-                                'project': project_name,
-                                'repository': repo_name,
-                                'file_path': file_path,
-                                'file_name': file_name,
-                                'size_bytes': file_size,
-                                'size_mb': round(file_size_mb, 2),
-                                'size_gb': round(file_size_gb, 3),
-                                'extension': '.' + file_name.split('.')[-1] if '.' in file_name else 'no extension',
-                                'repo_url': repo.get('webUrl', ''),
-                            }
-                            
-                            all_large_files.append(file_info);
-                            repo_large_files.append(file_info);
-                            repo_large_files_size += file_size;
-                            
-                            total_large_files += 1;
-                            total_size_all_large_files += file_size;
-                            project_large_files += 1;
-                            project_total_size += file_size;
-                
-                # Repository statistics
-                if repo_large_files:
-                    repo_stat = {
-                        'project': project_name,
-                        'repository': repo_name,
-                        'total_files_scanned': repo_total_files,
-                        'large_files_count': len(repo_large_files),
-                        'large_files_total_size_mb': round(repo_large_files_size / (1024 * 1024), 2),
-                        'large_files_total_size_gb': round(repo_large_files_size / (1024 ** 3), 3),
-                        'largest_file_mb': max(f['size_mb'] for f in repo_large_files),
-                        'repo_url': repo.get('webUrl', ''),
-                    }
-                    repo_stats.append(repo_stat);
-                    
-                    print(f"⚠️  {len(repo_large_files)} large files ({repo_stat['large_files_total_size_mb']} MB)");
-                else:
-                    print(f"✅ No large files");
-            
-            # Project statistics
-            if project_large_files > 0:
-                project_stat = {
+
+        # Events of both pipeline stages, consumed by this thread in arrival order
+        events = queue.Queue()
+        stop_enumeration = threading.Event()
+        total_projects = None
+
+        # Close every exporter opened so far, also when a later one fails to open or the scan aborts
+        opened = ExitStack()
+        finished = False
+        try:
+            for exporter in exporters:
+                exporter.open()
+                opened.callback(exporter.close)
+            with self.pool or ThreadPoolExecutor(max_workers=self.max_workers) as executor, \
+                    ThreadPoolExecutor(max_workers=self.LISTING_WORKERS) as listing_executor:
+                # Projects and their repository listings stream in while repositories are scanned
+                threading.Thread(
+                    target=self._enumerate_projects, args=(listing_executor, events, stop_enumeration), daemon=True
+                ).start()
+
+                with self.telemetry.phase('scan_repositories'):
+                    # Projects whose repositories are being listed: (project number, project, listing future)
+                    listings = deque()
+                    # Repository tasks in enumeration order: (project, index in project, repos in project, future)
+                    tasks = []
+                    shard_projects = []
+                    shard_results = []
+                    done_count = 0
+                    next_to_merge = 0
+                    while total_projects is None or listings or done_count < len(tasks):
+                        event = events.get()
+                        if event[0] == 'failed':
+                            raise event[1]
+                        if event[0] == 'projects':
+                            total_projects = event[1]
+                            print(f"📁 Found {total_projects} projects in organization")
+                        elif event[0] == 'project':
+                            listings.append(event[1:])
+                        elif event[0] == 'scanned':
+                            # Report progress as repositories finish, in completion order
+                            done_count += 1
+                            repo_result = event[1].result()
+                            self._print_repo_progress(done_count, len(tasks), repo_result)
+                            if self.checkpoint is not None and repo_result['status'] != 'failed' and not repo_result.get('resumed'):
+                                self.checkpoint.record_repository(repo_result)
+                            repo_result.pop('blobs', None)  # Stored where needed; the BlobIndex has them
+
+                        # Queue the repositories of every listed project whose predecessors are queued
+                        while listings and listings[0][2].done():
+                            project_idx, project, listing_future = listings.popleft()
+                            project_name = project['name']
+                            project_label = f"{project_idx}/{total_projects}" if total_projects else f"{project_idx}"
+                            try:
+                                repos = listing_future.result()
+                            except requests.exceptions.RequestException as e:
+                                failed_projects.append({'project': project_name, 'error': str(e)})
+                                repos = None
+
+                            if shard is not None:
+                                # The full listing, so merge_partials() can rebuild the enumeration order
+                                shard_projects.append({
+                                    'name': project_name,
+                                    'repositories': None if repos is None else [
+                                        {'id': repo['id'], 'name': repo['name'], 'webUrl': repo.get('webUrl', '')}
+                                        for repo in repos
+                                    ],
+                                })
+
+                            if repos is None:
+                                print(f"[{project_label}] 📂 Project: {project_name} - ❌ Repository listing failed")
+                                continue
+
+                            if not repos:
+                                print(f"[{project_label}] 📂 Project: {project_name} - ℹ️  No repositories found")
+                                continue
+
+                            # Every listed repository stays in the cache, including those of other shards
+                            live_repo_ids.update(repo['id'] for repo in repos)
+
+                            if shard is not None:
+                                listed = len(repos)
+                                repos = [repo for repo in repos if _shard_of(repo['id'], shard[1]) == shard[0]]
+                                print(f"[{project_label}] 📂 Project: {project_name} - 📚 {listed} repositories, "
+                                      f"{len(repos)} in this shard")
+                                if not repos:
+                                    continue
+                            else:
+                                print(f"[{project_label}] 📂 Project: {project_name} - 📚 {len(repos)} repositories")
+
+                            for repo_idx, repo in enumerate(repos, 1):
+                                if repo['id'] in resumed:
+                                    if resumed[repo['id']].get('blobs') is not None:
+                                        self.blob_index.add_digests(resumed[repo['id']]['blobs'])
+                                    future = Future()
+                                    future.set_result(dict(resumed[repo['id']], resumed=True))
+                                else:
+                                    future = executor.submit(self._scan_repository_timed, project_name, repo)
+                                future.add_done_callback(lambda done: events.put(('scanned', done)))
+                                tasks.append((project_name, repo_idx, len(repos), future))
+
+                        # Merge every finished repository whose predecessors are merged, in enumeration order,
+                        # so exporters see records as early as possible and the report stays deterministic
+                        while next_to_merge < len(tasks) and tasks[next_to_merge][3].done():
+                            project_name, repo_idx, repo_count, future = tasks[next_to_merge]
+                            tasks[next_to_merge] = None  # Let merged results be freed
+                            repo_result = future.result()
+                            if shard is not None:
+                                shard_results.append(repo_result)
+                            builder.add_repository(project_name, repo_result)
+                            if repo_idx == repo_count:
+                                builder.finish_project(project_name, repo_count)
+                                if self.checkpoint is not None and project_name not in self.checkpoint.completed_projects:
+                                    self.checkpoint.record_project(project_name)
+                            next_to_merge += 1
+            finished = True
+        finally:
+            stop_enumeration.set()
+            opened.close()
+            if self.checkpoint is not None:
+                self.checkpoint.close(finished)
+
+        print()
+
+        results = builder.build(total_projects=total_projects)
+        results['failed_projects'] = failed_projects
+        results['exported_files'] = [path for exporter in exporters for path in (exporter.files_path, exporter.repos_path)]
+        if shard is not None:
+            results['shard'] = {
+                'index': shard[0],
+                'count': shard[1],
+                'projects': shard_projects,
+                'repositories': shard_results,
+            }
+
+        if self.transport.cache is not None:
+            http_cache = self.transport.cache
+            results['http_cache'] = {
+                'hits': http_cache.hits,
+                'revalidated': http_cache.revalidated,
+                'misses': http_cache.misses,
+            }
+
+        if self.cache is not None:
+            results['cache_evicted'] = self.cache.evict(
+                live_repo_ids,
+                {failed['project'] for failed in failed_projects},
+            )
+            self.cache.save()
+
+        return results
+
+    def _enumerate_projects(self, listing_executor: ThreadPoolExecutor, events: queue.Queue,
+                            stop: threading.Event):
+        """
+        Enumeration stage of scan_organization(), run on a thread of its own
+
+        Follows the project pages and submits each project's repository
+        listing to ``listing_executor`` as soon as the project arrives. Posts
+        ('project', number, project, listing future) in project order, then
+        ('projects', count) once every page is read, or ('failed', error).
+        A finished listing posts ('listed',) so the consumer wakes up.
+        """
+        try:
+            with self.telemetry.phase('list_projects'):
+                count = 0
+                for project in self.iter_projects():
+                    if stop.is_set():
+                        return
+                    count += 1
+                    listing_future = listing_executor.submit(self.get_repositories_in_project, project['name'])
+                    events.put(('project', count, project, listing_future))
+                    listing_future.add_done_callback(lambda _: events.put(('listed',)))
+            events.put(('projects', count))
+        except Exception as e:
+            events.put(('failed', e))
+
+    def _print_repo_progress(self, done_idx: int, total: int, repo_result: Dict):
+        """Print the one-line outcome of a finished repository"""
+        print(f"  [{done_idx}/{total}] 📦 {repo_result['project']}/{repo_result['repository']}...", end=" ")
+
+        if repo_result['status'] == 'failed':
+            print(f"❌ Failed after {repo_result['retries']} retries: {repo_result['error']}")
+            return
+        if repo_result['status'] == 'cached':
+            print("♻️  (unchanged)", end=" ")
+        if repo_result.get('resumed'):
+            print("⏯️  (from checkpoint)", end=" ")
+        if repo_result.get('listed_by_folder'):
+            print("🌲 (listed by folder)", end=" ")
+        if repo_result.get('branches_scanned', 0) > 1:
+            print(f"🌿 ({repo_result['branches_scanned']} branches, {repo_result['distinct_trees']} distinct trees)", end=" ")
+        if repo_result.get('shared_tree_with'):
+            print(f"🔗 (same tree as {repo_result['shared_tree_with']})", end=" ")
+        if repo_result['large_files']:
+            size_mb = round(sum(f['size_bytes'] for f in repo_result['large_files']) / (1024 * 1024), 2)
+            print(f"⚠️  {len(repo_result['large_files'])} large files ({size_mb} MB)")
+        else:
+            print(f"✅ No large files")
+
+    def _scan_repository_timed(self, project_name: str, repo: Dict, head_commit: str = None) -> Dict:
+        """_scan_repository, reporting its duration to telemetry"""
+        started = time.perf_counter()
+        repo_result = self._scan_repository(project_name, repo, head_commit)
+        self.telemetry.record_repository(repo_result, time.perf_counter() - started)
+        return repo_result
+
+    def _scan_repository(self, project_name: str, repo: Dict, head_commit: str = None) -> Dict:
+        """
+        Scan a single repository for large files
+
+        Runs on a worker thread; only touches local state and returns a
+        per-repository result for ScanResultBuilder to merge. Lists the
+        default branch at ``head_commit`` when given, else at its current head.
+
+        The listing stops at the root tree when another repository has
+        listed, or is listing, the same tree; the repository then waits for
+        that listing and takes its summary, so each distinct tree is
+        downloaded once whatever the number of workers.
+        """
+        repo_name = repo['name']
+        repo_id = repo['id']
+
+        self.scheduler.begin_task()
+        if self.branches is not None:
+            return self._scan_repository_branches(project_name, repo)
+
+        if self.cache is not None and head_commit is None:
+            try:
+                head_commit = self.get_default_branch_head(project_name, repo)
+            except requests.exceptions.RequestException:
+                head_commit = None  # Fall back to a full listing of the default branch
+
+            cached = self.cache.get(repo_id, head_commit) if head_commit else None
+            if cached is not None:
+                blobs = BlobDigests.from_dict(cached['blobs'])
+                self.blob_index.add_digests(blobs)
+                # Names and URL come from the current listing in case the repository was renamed
+                repo_url = repo.get('webUrl', '')
+                return {
                     'project': project_name,
-                    'repositories': len(repos),
-                    'large_files_count': project_large_files,
-                    'total_size_mb': round(project_total_size / (1024 * 1024), 2),
-                    'total_size_gb': round(project_total_size / (1024 ** 3), 3),
+                    'repository': repo_name,
+                    'repo_id': repo_id,
+                    'repo_url': repo_url,
+                    'total_files_scanned': cached['total_files_scanned'],
+                    'large_files': [
+                        dict(f, project=project_name, repository=repo_name, repo_url=repo_url)
+                        for f in cached['large_files']
+                    ],
+                    'histogram': SizeHistogram.from_dict(cached['histogram']),
+                    'extension_histograms': {
+                        ext: SizeHistogram.from_dict(histogram)
+                        for ext, histogram in cached['extension_histograms'].items()
+                    },
+                    'blobs': blobs,
+                    'status': 'cached',
+                    'error': None,
+                    'retries': self.scheduler.task_retries(),
                 }
-                project_stats.append(project_stat);
-            
-            print();
-        
+
+        # Blobs are kept per repository only where the scan cache or the checkpoint journal stores them
+        collect_blobs = self.cache is not None or self.checkpoint is not None
+
+        # Huge repositories are walked folder by folder, and so is any repository whose
+        # Full listing times out or comes back truncated
+        by_folder = repo.get('size', 0) >= self.FOLDER_WALK_MIN_REPO_SIZE
+        claimed_tree = None  # Root tree this repository is listing for the others
+        try:
+            while True:
+                repo_large_files = []
+                repo_total_files = 0
+                repo_blobs = BlobDigests() if collect_blobs else None
+
+                # Every blob, not only large ones, so other thresholds can be answered offline
+                repo_histogram = SizeHistogram()
+                extension_histograms = {}
+
+                root_tree_id = None
+                shared_tree = None
+                tree_listing = None
+                try:
+                    if by_folder:
+                        items = self.iter_repository_items_by_folder(project_name, repo_id, head_commit, include_trees=True)
+                    else:
+                        # Stream items in the repository; filtering overlaps with the download
+                        items = self.get_repository_items(project_name, repo_id, head_commit, include_trees=True)
+                    with closing(items):
+                        for item in items:
+                            if item.get('gitObjectType') != 'blob':
+                                if item.get('path') == '/' and claimed_tree is None:
+                                    root_tree_id = item.get('objectId')
+                                    shared_tree, tree_listing = self.blob_index.claim_tree(root_tree_id)
+                                    if shared_tree is not None or tree_listing is not None:
+                                        # Same tree as a repository already scanned or being scanned (fork or
+                                        # copy): stop downloading
+                                        break
+                                    claimed_tree = root_tree_id
+                                continue
+
+                            repo_total_files += 1
+
+                            file_size = item.get('size', 0)
+                            self.blob_index.add_blob(item.get('objectId'), file_size)
+                            if repo_blobs is not None:
+                                repo_blobs.add(item.get('objectId'), file_size)
+
+                            self._tally_blob(repo_histogram, extension_histograms, item.get('path', ''), file_size)
+
+                            # Only include files >= min_size_mb
+                            if file_size >= self.min_size_bytes:
+                                repo_large_files.append(self._file_info(
+                                    project_name, repo_name, repo.get('webUrl', ''), item.get('path', ''), file_size,
+                                    item.get('objectId')
+                                ))
+                except (requests.exceptions.RequestException, ValueError) as e:
+                    response = getattr(e, 'response', None)
+                    if not by_folder and (response is None or response.status_code >= 500):
+                        # Timed out, cut off or a server error, not e.g. an authorization failure
+                        by_folder = True
+                        continue
+                    # Reported explicitly instead of being counted as an empty repository
+                    return self._failed_result(project_name, repo, e)
+
+                if tree_listing is not None:
+                    # Wait with the download closed; start over if that listing failed
+                    tree_listing.wait()
+                    shared_tree = self.blob_index.get_tree(root_tree_id)
+                    if shared_tree is None:
+                        continue
+                break
+
+            if shared_tree is not None:
+                repo_total_files = shared_tree['total_files_scanned']
+                repo_large_files = [
+                    self._file_info(project_name, repo_name, repo.get('webUrl', ''), path, size, object_id)
+                    for path, size, object_id in shared_tree['large_files']
+                ]
+                repo_histogram = SizeHistogram().merge(shared_tree['histogram'])
+                extension_histograms = {
+                    ext: SizeHistogram().merge(histogram) for ext, histogram in shared_tree['extension_histograms'].items()
+                }
+                repo_blobs = shared_tree['blobs'] if collect_blobs else None
+            elif claimed_tree:
+                self.blob_index.put_tree(claimed_tree, {
+                    'source': f"{project_name}/{repo_name}",
+                    'total_files_scanned': repo_total_files,
+                    'large_files': [(f['file_path'], f['size_bytes'], f['object_id']) for f in repo_large_files],
+                    'histogram': repo_histogram,
+                    'extension_histograms': extension_histograms,
+                    'blobs': repo_blobs,
+                })
+                claimed_tree = None
+        finally:
+            if claimed_tree:
+                # Not listed after all; a repository waiting for it lists it itself
+                self.blob_index.release_tree(claimed_tree)
+
+        repo_result = {
+            'project': project_name,
+            'repository': repo_name,
+            'repo_id': repo_id,
+            'repo_url': repo.get('webUrl', ''),
+            'total_files_scanned': repo_total_files,
+            'large_files': repo_large_files,
+            'histogram': repo_histogram,
+            'extension_histograms': extension_histograms,
+            'blobs': repo_blobs,
+            'status': 'ok',
+            'error': None,
+            'retries': self.scheduler.task_retries(),
+            'shared_tree_with': shared_tree['source'] if shared_tree is not None else None,
+            'listed_by_folder': by_folder,
+        }
+
+        if self.cache is not None and head_commit:
+            self.cache.put(repo_id, head_commit, repo_result)
+
+        return repo_result
+
+    def _scan_repository_branches(self, project_name: str, repo: Dict) -> Dict:
+        """
+        Scan the default branch and the matching other branches of a repository
+
+        The first branch is listed like a single-branch scan and seeds a
+        graph of tree objectId -> (large blobs directly in it, child trees).
+        Later branches are walked folder by folder, descending only into
+        trees not in the graph yet, so requests grow with the number of
+        distinct trees rather than with branches x files. Each large blob is
+        reported once, at the path it was first found, with the branches
+        containing it in 'branches'. Histograms and the file count cover the
+        blobs of each distinct tree once. The scan cache and the shared-tree
+        shortcut are not used, as both are keyed by a single head.
+        """
+        repo_name = repo['name']
+        repo_id = repo['id']
+        repo_url = repo.get('webUrl', '')
+
+        try:
+            branches = self.get_branches(project_name, repo)
+        except requests.exceptions.RequestException as e:
+            return self._failed_result(project_name, repo, e)
+
+        by_folder = repo.get('size', 0) >= self.FOLDER_WALK_MIN_REPO_SIZE
+        while True:
+            trees = {}  # Tree objectId -> (keys of large blobs directly in it, child tree objectIds)
+            listed_trees = set()  # Trees listed, or queued for listing, by folder walks
+            large_blobs = {}  # Blob objectId (path if it has none) -> (path, size) where first found
+            branch_roots = []  # (branch, root tree objectId)
+            repo_total_files = 0
+            repo_blobs = BlobDigests() if self.checkpoint is not None else None
+            repo_histogram = SizeHistogram()
+            extension_histograms = {}
+
+            try:
+                for branch_idx, (branch, commit_id) in enumerate(branches):
+                    if branch_idx == 0 and not by_folder:
+                        items = self.get_repository_items(project_name, repo_id, commit_id, include_trees=True)
+                    else:
+                        items = self.iter_repository_items_by_folder(
+                            project_name, repo_id, commit_id, include_trees=True, skip_trees=listed_trees
+                        )
+
+                    root_tree_id = None
+                    folder_trees = {}  # Folder path -> its tree objectId, None inside a tree already in the graph
+                    with closing(items):
+                        for item in items:
+                            item_path = item.get('path', '')
+                            object_id = item.get('objectId')
+                            object_type = item.get('gitObjectType')
+                            if item_path == '/':
+                                root_tree_id = object_id
+                                folder_trees['/'] = None if object_id in trees else object_id
+                                trees.setdefault(object_id, ([], []))
+                                continue
+
+                            parent_tree_id = folder_trees.get(item_path.rsplit('/', 1)[0] or '/')
+                            if parent_tree_id is None:
+                                # Content of a tree already processed; only a Full listing gets here
+                                if object_type == 'tree':
+                                    folder_trees[item_path] = None
+                                continue
+
+                            large_blob_keys, child_tree_ids = trees[parent_tree_id]
+                            if object_type == 'tree':
+                                child_tree_ids.append(object_id)
+                                folder_trees[item_path] = None if object_id in trees else object_id
+                                trees.setdefault(object_id, ([], []))
+                                continue
+                            if object_type != 'blob':
+                                continue
+
+                            repo_total_files += 1
+                            file_size = item.get('size', 0)
+                            self.blob_index.add_blob(object_id, file_size)
+                            if repo_blobs is not None:
+                                repo_blobs.add(object_id, file_size)
+                            self._tally_blob(repo_histogram, extension_histograms, item_path, file_size)
+                            if file_size >= self.min_size_bytes:
+                                key = object_id or item_path
+                                large_blob_keys.append(key)
+                                large_blobs.setdefault(key, (item_path, file_size))
+
+                    listed_trees.update(trees)
+                    branch_roots.append((branch, root_tree_id))
+                break
+            except (requests.exceptions.RequestException, ValueError) as e:
+                response = getattr(e, 'response', None)
+                if not by_folder and (response is None or response.status_code >= 500):
+                    # The first branch's Full listing failed: start over, listing folder by folder
+                    by_folder = True
+                    continue
+                return self._failed_result(project_name, repo, e)
+
+        # Large blobs beneath each tree, resolved once per tree however many branches share it
+        below = {}
+        blob_branches = {}
+        for branch, root_tree_id in branch_roots:
+            if root_tree_id is None:
+                continue
+            stack = [root_tree_id]
+            while stack:
+                tree_id = stack[-1]
+                if tree_id in below:
+                    stack.pop()
+                    continue
+                large_blob_keys, child_tree_ids = trees[tree_id]
+                unresolved = [child for child in child_tree_ids if child not in below]
+                if unresolved:
+                    stack.extend(unresolved)
+                    continue
+                stack.pop()
+                keys = set(large_blob_keys)
+                for child in child_tree_ids:
+                    keys |= below[child]
+                below[tree_id] = frozenset(keys)
+            for key in below[root_tree_id]:
+                blob_branches.setdefault(key, []).append(branch)
+
+        repo_large_files = [
+            self._file_info(project_name, repo_name, repo_url, path, size,
+                            None if key == path else key, ', '.join(blob_branches.get(key, ())))
+            for key, (path, size) in large_blobs.items()
+        ]
+
         return {
-            'large_files': all_large_files,
-            'repo_stats': repo_stats,
-            'project_stats': project_stats,
-            'total_projects': len(projects),
-            'total_repos': total_repos,
-            'total_files_scanned': total_files_scanned,
-            'total_large_files': total_large_files,
-            'total_size': total_size_all_large_files,
+            'project': project_name,
+            'repository': repo_name,
+            'repo_id': repo_id,
+            'repo_url': repo_url,
+            'total_files_scanned': repo_total_files,
+            'large_files': repo_large_files,
+            'histogram': repo_histogram,
+            'extension_histograms': extension_histograms,
+            'blobs': repo_blobs,
+            'status': 'ok',
+            'error': None,
+            'retries': self.scheduler.task_retries(),
+            'listed_by_folder': by_folder,
+            'branches_scanned': len(branches),
+            'distinct_trees': len(trees),
         }
-    
+
+    def _failed_result(self, project_name: str, repo: Dict, error: Exception) -> Dict:
+        """Result of a repository that could not be scanned"""
+        return {
+            'project': project_name,
+            'repository': repo['name'],
+            'repo_id': repo['id'],
+            'repo_url': repo.get('webUrl', ''),
+            'total_files_scanned': 0,
+            'large_files': [],
+            'histogram': None,
+            'extension_histograms': {},
+            'status': 'failed',
+            'error': str(error),
+            'retries': self.scheduler.task_retries(),
+        }
+
+    @staticmethod
+    def _tally_blob(histogram: SizeHistogram, extension_histograms: Dict[str, SizeHistogram], file_path: str,
+                    file_size: int):
+        """Add a blob of any size to the repository's histograms"""
+        histogram.add(file_size)
+        extension = _file_extension(file_path.rsplit('/', 1)[-1])
+        extension_histogram = extension_histograms.get(extension)
+        if extension_histogram is None:
+            extension_histogram = extension_histograms[extension] = SizeHistogram()
+        extension_histogram.add(file_size)
+
+    def scan_mirrors(self, mirrors: List[Tuple[str, str, str]], exporters: List[ResultExporter] = None,
+                     retain_files: bool = True) -> Dict:
+        """
+        Scan the full history of local bare mirrors for large blobs
+
+        Every blob reachable from any ref counts, since that is what a push
+        to GitHub is checked against, not only the tip of the default branch.
+        Mirrors are scanned concurrently on ``max_workers`` threads (each
+        drives its own git processes) and merged in the given order into the
+        same results dict as scan_organization(), so print_summary() and
+        export_to_excel() work unchanged. A large blob is reported once per
+        repository, at the first path it was reached by from the newest
+        commits.
+
+        Args:
+            mirrors: (project, repository, path) tuples, e.g. from discover_mirrors()
+            exporters: Incremental exporters, as for scan_organization()
+            retain_files: Keep file records in results['large_files']
+        """
+        print("=" * 80)
+        print(f"🔍 Scanning full history of {len(mirrors)} local mirrors: {self.organization}")
+        print(f"📊 Looking for blobs >= {self.min_size_mb} MB")
+        print(f"⚙️  Concurrency: {self.max_workers} workers")
+        print("=" * 80)
+        print()
+
+        # Keep the repositories of a project together, in order of first appearance
+        projects = {}
+        for project_name, repo_name, path in mirrors:
+            projects.setdefault(project_name, []).append((repo_name, path))
+
+        self.blob_index = BlobIndex()
+        exporters = exporters or []
+        builder = ScanResultBuilder(self.blob_index, exporters, retain_files)
+
+        with ExitStack() as opened:
+            for exporter in exporters:
+                exporter.open()
+                opened.callback(exporter.close)
+            with self.telemetry.phase('scan_mirrors'), ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                tasks = [
+                    (project_name, len(repos), executor.submit(self._scan_mirror, project_name, repo_name, path))
+                    for project_name, repos in projects.items() for repo_name, path in repos
+                ]
+                merged_in_project = 0
+                for done_idx, (project_name, repo_count, future) in enumerate(tasks, 1):
+                    repo_result = future.result()
+                    self._print_repo_progress(done_idx, len(tasks), repo_result)
+                    builder.add_repository(project_name, repo_result)
+                    merged_in_project += 1
+                    if merged_in_project == repo_count:
+                        builder.finish_project(project_name, repo_count)
+                        merged_in_project = 0
+
+        print()
+
+        results = builder.build(total_projects=len(projects))
+        results['failed_projects'] = []
+        results['exported_files'] = [path for exporter in exporters for path in (exporter.files_path, exporter.repos_path)]
+        return results
+
+    @staticmethod
+    def _mirror_url(path: str) -> str:
+        """Origin URL of a mirror without any credentials in it, or its path"""
+        try:
+            completed = subprocess.run(
+                ['git', '-C', path, 'config', '--get', 'remote.origin.url'],
+                capture_output=True, text=True, check=True,
+            )
+        except (subprocess.CalledProcessError, OSError):
+            return path
+        url = urlsplit(completed.stdout.strip())
+        if url.password or url.username:
+            url = url._replace(netloc=url.hostname + (f":{url.port}" if url.port else ''))
+        return urlunsplit(url) or path
+
+    def _scan_mirror(self, project_name: str, repo_name: str, path: str) -> Dict:
+        """Scan one bare mirror's history; runs on a worker thread like _scan_repository"""
+        started = time.perf_counter()
+        repo_url = self._mirror_url(path)
+        repo_large_files = []
+        repo_total_files = 0
+        repo_histogram = SizeHistogram()
+        extension_histograms = {}
+
+        try:
+            for object_id, file_size, file_path in iter_mirror_blobs(path):
+                repo_total_files += 1
+                self.blob_index.add_blob(object_id, file_size)
+                self._tally_blob(repo_histogram, extension_histograms, file_path, file_size)
+                if file_size >= self.min_size_bytes:
+                    repo_large_files.append(self._file_info(
+                        project_name, repo_name, repo_url, file_path, file_size, object_id
+                    ))
+            status, error = 'ok', None
+        except (subprocess.CalledProcessError, OSError) as e:
+            # Reported explicitly instead of being counted as an empty repository
+            status, error = 'failed', str(getattr(e, 'stderr', None) or e).strip()
+            repo_large_files, repo_total_files, repo_histogram, extension_histograms = [], 0, None, {}
+
+        repo_result = {
+            'project': project_name,
+            'repository': repo_name,
+            'repo_id': path,
+            'repo_url': repo_url,
+            'total_files_scanned': repo_total_files,
+            'large_files': repo_large_files,
+            'histogram': repo_histogram,
+            'extension_histograms': extension_histograms,
+            'status': status,
+            'error': error,
+            'retries': 0,
+        }
+        self.telemetry.record_repository(repo_result, time.perf_counter() - started)
+        return repo_result
+
+    @staticmethod
+    def _file_info(project_name: str, repo_name: str, repo_url: str, file_path: str, file_size: int,
+                   object_id: str = None, branches: str = '') -> Dict:
+        """Build the record reported for one large file"""
+        file_name = file_path.split('/')[-1] if '/' in file_path else file_path
+
+        file_size_mb = file_size / (1024 * 1024)
+        file_size_gb = file_size / (1024 ** 3)
+
+        return {
+            'project': project_name,
+            'repository': repo_name,
+            'file_path': file_path,
+            'file_name': file_name,
+            'size_bytes': file_size,
+            'size_mb': round(file_size_mb, 2),
+            'size_gb': round(file_size_gb, 3),
+            'extension': _file_extension(file_name),
+            'repo_url': repo_url,
+            'object_id': object_id,
+            'branches': branches,
+        }
+
     def print_summary(self, results: Dict):
         """Print summary of scan results"""
         print("=" * 80)
@@ -224,14 +3675,42 @@ class AzureDevOpsOrgScanner:
         print(f"Total Repositories: {results['total_repos']}")
         print(f"Total Files Scanned: {results['total_files_scanned']:,}")
         print()        
+        if results.get('repos_from_cache'):
+            print(f"♻️  Repositories Listed: {results['repos_fetched']:,}, Served From Cache: {results['repos_from_cache']:,}"
+                  f" (evicted {results.get('cache_evicted', 0)} stale entries)")
+        if results.get('http_cache'):
+            http_cache = results['http_cache']
+            print(f"🗄️  Listing Cache: {http_cache['hits']:,} fresh, {http_cache['revalidated']:,} unchanged (304),"
+                  f" {http_cache['misses']:,} fetched")
+            print()
+        failed_repos = results.get('failed_repos', [])
+        failed_projects = results.get('failed_projects', [])
+        if results.get('retried_repos'):
+            print(f"🔁 Repositories Retried (throttling/transient errors): {len(results['retried_repos'])}")
+        if failed_projects or failed_repos:
+            print(f"❌ Failed Projects: {len(failed_projects)}, Failed Repositories: {len(failed_repos)} (their files are not in the totals)")
+            for failed in failed_projects:
+                print(f"    Project: {failed['project']} - {failed['error']}")
+            for failed in failed_repos:
+                print(f"    Project: {failed['project']}, Repo: {failed['repository']} - {failed['error']}")
+        if results.get('retried_repos') or failed_projects or failed_repos:
+            print()
         print(f"🚨 Large Files Found (>= {self.min_size_mb} MB): {results['total_large_files']}")
         print(f"📦 Total Size of Large Files: {round(results['total_size'] / (1024 ** 3), 2)} GB")
+        if 'unique_size' in results:
+            print(f"🧬 Unique Large Files (deduplicated by object ID): {results['unique_large_files']}"
+                  f" ({round(results['unique_size'] / (1024 ** 3), 2)} GB)")
+            print(f"🧬 Unique Bytes Across All Listed Blobs: {round(results['unique_blob_bytes'] / (1024 ** 3), 2)} GB"
+                  f" in {results['unique_blob_count']:,} blobs")
+        if results.get('repos_deduplicated'):
+            print(f"🔗 Repositories Sharing An Already Scanned Tree: {results['repos_deduplicated']}")
         print()        
-        if results['large_files']:
+        aggregator = self._aggregator(results)
+        if results['total_large_files']:
             # Top 10 largest files
             print("🏆 TOP 10 LARGEST FILES:")
             print("-" * 80)
-            sorted_files = sorted(results['large_files'], key=lambda x: x['size_bytes'], reverse=True)[:10]
+            sorted_files = aggregator.top_files(10)
             
             for i, file in enumerate(sorted_files, 1):
                 print(f"{i:2}. {file['file_name'][:50]:<50} {file['size_mb']:>10.2f} MB");
@@ -240,28 +3719,112 @@ class AzureDevOpsOrgScanner:
             # Files by extension
             print("📊 LARGE FILES BY EXTENSION:")
             print("-" * 80)
-            ext_stats = defaultdict(lambda: {'count': 0, 'total_size': 0})
-            
-            for file in results['large_files']:
-                ext = file['extension']
-                ext_stats[ext]['count'] += 1
-                ext_stats[ext]['total_size'] += file['size_bytes']
-            
-            sorted_exts = sorted(ext_stats.items(), key=lambda x: x[1]['total_size'], reverse=True)
+            sorted_exts = aggregator.sorted_extensions()
             
             for ext, stats in sorted_exts:
                 size_gb = stats['total_size'] / (1024 ** 3)
                 print(f"{ext:<20} {stats['count']:>5} files    {size_gb:>10.2f} GB");
             print()    
-    def export_to_excel(self, results: Dict, filename: str = None):
+
+    def save_scan(self, results: Dict, filename: str = None) -> str:
+        """
+        Save the scan's totals and size histograms for offline queries
+
+        The file is small (histograms, not file lists) and lets query_scan()
+        or the ``query`` command answer other size thresholds without
+        rescanning the organization.
+        """
+        if filename is None:
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            filename = f"AzureDevOps_LargeFiles_{self.organization}_{timestamp}.scan.json"
+
+        histograms = results['histograms']
+        _atomic_write_json(filename, {
+            'version': 1,
+            'organization': self.organization,
+            'scanned_at': datetime.now().isoformat(timespec='seconds'),
+            'min_size_bytes': self.min_size_bytes,
+            'totals': {key: results[key] for key in (
+                'total_projects', 'total_repos', 'total_files_scanned', 'total_large_files', 'total_size'
+            )},
+            'histograms': {
+                'organization': histograms['organization'].to_dict(),
+                **{
+                    group: {name: histogram.to_dict() for name, histogram in histograms[group].items()}
+                    for group in ('projects', 'repositories', 'extensions')
+                },
+            },
+        })
+        print(f"💾 Scan histograms saved: {filename}")
+
+        return filename
+
+    def save_partial(self, results: Dict, filename: str = None) -> str:
+        """
+        Save the result of a sharded scan for merge_partials()
+
+        Holds every repository result of the shard, the full project and
+        repository listing and the shard's blob index, so the merged report
+        is the one a single-process scan would have produced.
+        """
+        shard = results['shard']
+        if filename is None:
+            filename = f"AzureDevOps_LargeFiles_{self.organization}.shard-{shard['index']}-of-{shard['count']}.partial.json"
+
+        _atomic_write_json(filename, {
+            'version': 1,
+            'organization': self.organization,
+            'scanned_at': datetime.now().isoformat(timespec='seconds'),
+            'min_size_bytes': self.min_size_bytes,
+            'shard': [shard['index'], shard['count']],
+            'total_projects': results['total_projects'],
+            'projects': shard['projects'],
+            'failed_projects': results['failed_projects'],
+            'repositories': [_repo_result_to_json(dict(repo_result, blobs=None)) for repo_result in shard['repositories']],
+            'blobs': self.blob_index.to_dict(),
+        })
+        print(f"🧩 Shard result saved: {filename}")
+
+        return filename
+
+    @staticmethod
+    def _aggregator(results: Dict) -> ScanAggregator:
+        """Aggregates for a results dict, rebuilt from large_files if it does not carry them"""
+        if results.get('aggregator') is None:
+            results['aggregator'] = ScanAggregator.from_files(results['large_files'])
+        return results['aggregator']
+
+    def export_to_excel(self, results: Dict, filename: str = None, streaming: bool = None):
         """
         Export results to formatted Excel file
+
+        Args:
+            results: Results returned by scan_organization
+            filename: Output path (default: timestamped file in the current directory)
+            streaming: Use write-only worksheets with shared named styles; None picks
+                       streaming automatically above EXCEL_STREAMING_THRESHOLD files
         """
+        try:
+            from openpyxl import Workbook
+            from openpyxl.styles import Font, PatternFill, Border, Side
+        except ImportError as e:
+            raise ImportError("Excel export requires openpyxl: pip install openpyxl") from e
+        _require_file_records(results, "The Excel report")
+
         if filename is None:
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             filename = f"AzureDevOps_LargeFiles_{self.organization}_{timestamp}.xlsx"
         
-        print(f"📝 Creating Excel file: {filename}")
+        if streaming is None:
+            streaming = len(results['large_files']) > self.EXCEL_STREAMING_THRESHOLD
+
+        print(f"📝 Creating Excel file: {filename}{' (streaming)' if streaming else ''}")
+
+        if streaming:
+            return self._export_to_excel_streaming(results, filename)
+
+        # The large files sheet is the only view that needs a full ordering; sort once here
+        sorted_files = sorted(results['large_files'], key=lambda x: x['size_bytes'], reverse=True)
         
         # Create workbook
         wb = Workbook()
@@ -289,8 +3852,9 @@ class AzureDevOpsOrgScanner:
         self._create_summary_sheet(ws_summary, results, header_fill, header_font)
         
         # Sheet 2: All Large Files
-        ws_files = wb.create_sheet("Large Files (≥100MB)", 1)
-        self._create_files_sheet(ws_files, results['large_files'], header_fill, header_font, border, warning_fill, critical_fill, critical_font)
+        ws_files = wb.create_sheet(self._files_sheet_title(), 1)
+        self._create_files_sheet(ws_files, sorted_files, header_fill, header_font, border, warning_fill, critical_fill, critical_font,
+                                 self._has_branches(sorted_files))
         
         # Sheet 3: Repository Statistics
         ws_repos = wb.create_sheet("Repository Stats", 2)
@@ -302,15 +3866,279 @@ class AzureDevOpsOrgScanner:
         
         # Sheet 5: Files by Extension
         ws_extensions = wb.create_sheet("By Extension", 4)
-        self._create_extension_sheet(ws_extensions, results['large_files'], header_fill, header_font, border)
+        self._create_extension_sheet(ws_extensions, self._aggregator(results), header_fill, header_font, border)
         
         # Save workbook
         wb.save(filename)
         print(f"✅ Excel file created successfully: {filename}")
         
         return filename;
+    def _export_to_excel_streaming(self, results: Dict, filename: str):
+        """
+        Export results with openpyxl's write-only worksheets
+
+        Same workbook layout as the regular export, but rows are streamed to
+        disk as they are produced and every cell refers to a shared named
+        style instead of carrying its own style objects. The large files sheet
+        spills into numbered continuation sheets past Excel's row limit and is
+        written straight from the store's size order (LargeFileStore.iter_by_size),
+        never from a sorted copy of the records.
+        """
+        large_files = results['large_files']
+        if isinstance(large_files, LargeFileStore):
+            sorted_files = large_files.iter_by_size()
+        else:
+            sorted_files = sorted(large_files, key=lambda x: x['size_bytes'], reverse=True)
+
+        from openpyxl import Workbook
+        wb = Workbook(write_only=True)
+        self._register_streaming_styles(wb)
+
+        # Sheet 1: Summary
+        self._stream_summary_sheet(wb.create_sheet("Summary"), results)
+
+        # Sheet 2: All Large Files (plus continuation sheets)
+        self._stream_files_sheets(wb, self._files_sheet_title(), sorted_files, self._has_branches(large_files))
+
+        # Sheet 3: Repository Statistics
+        self._stream_repo_stats_sheet(wb.create_sheet("Repository Stats"), results['repo_stats'])
+
+        # Sheet 4: Project Statistics
+        self._stream_project_stats_sheet(wb.create_sheet("Project Stats"), results['project_stats'])
+
+        # Sheet 5: Files by Extension
+        self._stream_extension_sheet(wb.create_sheet("By Extension"), self._aggregator(results))
+
+        wb.save(filename)
+        print(f"✅ Excel file created successfully: {filename}")
+
+        return filename
+
+    def _files_sheet_title(self) -> str:
+        return f"Large Files (≥{self.min_size_mb}MB)"
+
+    def _register_streaming_styles(self, wb):
+        """Register the named styles shared by every cell of a streamed workbook"""
+        from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
+        border = Border(
+            left=Side(style='thin'),
+            right=Side(style='thin'),
+            top=Side(style='thin'),
+            bottom=Side(style='thin')
+        )
+        fills = {
+            '': None,
+            '_warning': PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid"),
+            '_critical': PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid"),
+        }
+        formats = {
+            'lfs_text': 'General',
+            'lfs_mb': '#,##0.00',
+            'lfs_gb': '#,##0.000',
+            'lfs_link': 'General',
+        }
+
+        for base_name, number_format in formats.items():
+            for suffix, fill in fills.items():
+                font = Font(bold=True, color="FFFFFF") if suffix == '_critical' else Font()
+                if base_name == 'lfs_link' and not suffix:
+                    font = Font(underline='single', color="0563C1")
+                style = NamedStyle(name=base_name + suffix, number_format=number_format, border=border, font=font)
+                if fill is not None:
+                    style.fill = fill
+                wb.add_named_style(style)
+
+        wb.add_named_style(NamedStyle(
+            name='lfs_header',
+            fill=PatternFill(start_color="366092", end_color="366092", fill_type="solid"),
+            font=Font(bold=True, color="FFFFFF", size=11),
+            alignment=Alignment(horizontal='center', vertical='center'),
+            border=border,
+        ))
+        wb.add_named_style(NamedStyle(name='lfs_title', font=Font(bold=True, size=16)))
+        wb.add_named_style(NamedStyle(name='lfs_subtitle', font=Font(size=12)))
+        wb.add_named_style(NamedStyle(name='lfs_generated', font=Font(size=10, italic=True)))
+        wb.add_named_style(NamedStyle(name='lfs_section', font=Font(bold=True, size=14)))
+        wb.add_named_style(NamedStyle(name='lfs_bold', font=Font(bold=True)))
+
+    @staticmethod
+    def _styled(ws, value, style: str):
+        from openpyxl.cell import WriteOnlyCell
+        cell = WriteOnlyCell(ws, value=value)
+        cell.style = style
+        return cell
+
+    def _stream_header(self, ws, headers: List[str]):
+        ws.append([self._styled(ws, header, 'lfs_header') for header in headers])
+
+    def _stream_summary_sheet(self, ws, results: Dict):
+        """Streamed counterpart of _create_summary_sheet"""
+        ws.column_dimensions['A'].width = 30
+        ws.column_dimensions['B'].width = 30
+        ws.column_dimensions['C'].width = 25
+        ws.column_dimensions['D'].width = 25
+
+        ws.append([self._styled(ws, "Azure DevOps Large Files Report", 'lfs_title')])
+        ws.append([self._styled(ws, f"Organization: {self.organization}", 'lfs_subtitle')])
+        ws.append([self._styled(ws, f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", 'lfs_generated')])
+        ws.append([])
+        ws.append([self._styled(ws, "Scan Statistics", 'lfs_section')])
+
+        for label, value in self._summary_stats(results):
+            if "🚨" in label or "📦" in label or "🧬" in label:
+                ws.append([self._styled(ws, label, 'lfs_bold'), self._styled(ws, value, 'lfs_bold')])
+            else:
+                ws.append([label, value])
+
+        ws.append([])
+        ws.append([])
+        ws.append([self._styled(ws, "Top 5 Largest Files", 'lfs_section')])
+        self._stream_header(ws, ["File Name", "Size (GB)", "Project", "Repository"])
+
+        for file in self._aggregator(results).top_files(5):
+            ws.append([file['file_name'], file['size_gb'], file['project'], file['repository']])
+
+    def _stream_files_sheets(self, wb, title: str, sorted_files: Iterable[Dict], with_branches: bool = False):
+        """Write file rows from an iterator, starting a new sheet whenever one is full"""
+        from openpyxl.utils import get_column_letter
+        headers = ["Project", "Repository", "File Name", "File Path", "Size (MB)", "Size (GB)", "Extension", "Repository URL"]
+        if with_branches:
+            headers.append("Branches")
+        last_column = get_column_letter(len(headers))
+        rows_per_sheet = self.EXCEL_MAX_ROWS - 1
+
+        ws = None
+        sheet_number = 0
+        rows_in_sheet = 0
+
+        for file in sorted_files:
+            if ws is None or rows_in_sheet == rows_per_sheet:
+                if ws is not None:
+                    ws.auto_filter.ref = f"A1:{last_column}{rows_in_sheet + 1}"
+                sheet_number += 1
+                ws = self._new_files_sheet(wb, title if sheet_number == 1 else f"{title} {sheet_number}", headers)
+                rows_in_sheet = 0
+
+            # Conditional formatting
+            if file['size_mb'] >= 1000:  # >= 1GB
+                suffix = '_critical'
+            elif file['size_mb'] >= 500:  # >= 500MB
+                suffix = '_warning'
+            else:
+                suffix = ''
+
+            text = 'lfs_text' + suffix
+            row = [
+                self._styled(ws, file['project'], text),
+                self._styled(ws, file['repository'], text),
+                self._styled(ws, file['file_name'], text),
+                self._styled(ws, file['file_path'], text),
+                self._styled(ws, file['size_mb'], 'lfs_mb' + suffix),
+                self._styled(ws, file['size_gb'], 'lfs_gb' + suffix),
+                self._styled(ws, file['extension'], text),
+                self._styled(ws, file['repo_url'], 'lfs_link' + suffix),
+            ]
+            if with_branches:
+                row.append(self._styled(ws, file.get('branches', ''), text))
+            ws.append(row)
+            rows_in_sheet += 1
+
+        if ws is None:
+            ws = self._new_files_sheet(wb, title, headers)
+        ws.auto_filter.ref = f"A1:{last_column}{rows_in_sheet + 1}"
+
+    def _new_files_sheet(self, wb, title: str, headers: List[str]):
+        ws = wb.create_sheet(title)
+        for column, width in zip('ABCDEFGHI'[:len(headers)], (20, 25, 40, 50, 15, 15, 15, 50, 40)):
+            ws.column_dimensions[column].width = width
+        ws.freeze_panes = 'A2'
+        self._stream_header(ws, headers)
+        return ws
+
+    def _stream_repo_stats_sheet(self, ws, repo_stats: List[Dict]):
+        """Streamed counterpart of _create_repo_stats_sheet"""
+        from openpyxl.utils import get_column_letter
+        headers = ["Project", "Repository", "Files Scanned", "Large Files Count", "Total Size (MB)", "Total Size (GB)", "Unique Size (MB)", "Largest File (MB)", "Repository URL"]
+        for col in range(1, 10):
+            ws.column_dimensions[get_column_letter(col)].width = 20
+        ws.column_dimensions['I'].width = 50
+        ws.freeze_panes = 'A2'
+        ws.auto_filter.ref = f"A1:I{len(repo_stats) + 1}"
+        self._stream_header(ws, headers)
+
+        for repo in sorted(repo_stats, key=lambda x: x['large_files_total_size_mb'], reverse=True):
+            ws.append([
+                self._styled(ws, repo['project'], 'lfs_text'),
+                self._styled(ws, repo['repository'], 'lfs_text'),
+                self._styled(ws, repo['total_files_scanned'], 'lfs_text'),
+                self._styled(ws, repo['large_files_count'], 'lfs_text'),
+                self._styled(ws, repo['large_files_total_size_mb'], 'lfs_mb'),
+                self._styled(ws, repo['large_files_total_size_gb'], 'lfs_gb'),
+                self._styled(ws, repo.get('large_files_unique_size_mb', repo['large_files_total_size_mb']), 'lfs_mb'),
+                self._styled(ws, repo['largest_file_mb'], 'lfs_mb'),
+                self._styled(ws, repo['repo_url'], 'lfs_link'),
+            ])
+
+    def _stream_project_stats_sheet(self, ws, project_stats: List[Dict]):
+        """Streamed counterpart of _create_project_stats_sheet"""
+        headers = ["Project", "Repositories", "Large Files Count", "Total Size (MB)", "Total Size (GB)"]
+        for column, width in zip('ABCDE', (30, 15, 20, 20, 20)):
+            ws.column_dimensions[column].width = width
+        ws.freeze_panes = 'A2'
+        self._stream_header(ws, headers)
+
+        for project in sorted(project_stats, key=lambda x: x['total_size_mb'], reverse=True):
+            ws.append([
+                self._styled(ws, project['project'], 'lfs_text'),
+                self._styled(ws, project['repositories'], 'lfs_text'),
+                self._styled(ws, project['large_files_count'], 'lfs_text'),
+                self._styled(ws, project['total_size_mb'], 'lfs_mb'),
+                self._styled(ws, project['total_size_gb'], 'lfs_gb'),
+            ])
+
+    def _stream_extension_sheet(self, ws, aggregator: ScanAggregator):
+        """Streamed counterpart of _create_extension_sheet"""
+        from openpyxl.utils import get_column_letter
+        headers = ["Extension", "File Count", "Total Size (MB)", "Total Size (GB)", "Average Size (MB)"]
+        for col in range(1, 6):
+            ws.column_dimensions[get_column_letter(col)].width = 20
+        ws.freeze_panes = 'A2'
+        self._stream_header(ws, headers)
+
+        for ext, stats in aggregator.sorted_extensions():
+            ws.append([
+                self._styled(ws, ext, 'lfs_text'),
+                self._styled(ws, stats['count'], 'lfs_text'),
+                self._styled(ws, round(stats['total_size'] / (1024 * 1024), 2), 'lfs_mb'),
+                self._styled(ws, round(stats['total_size'] / (1024 ** 3), 3), 'lfs_gb'),
+                self._styled(ws, round(stats['total_size'] / stats['count'] / (1024 * 1024), 2), 'lfs_mb'),
+            ])
+
+    def _summary_stats(self, results: Dict) -> List[tuple]:
+        """Label/value rows of the summary sheet's Scan Statistics block"""
+        return [
+            ("Minimum File Size", f"{self.min_size_mb} MB"),
+            ("", ""),
+            ("Total Projects Scanned", f"{results['total_projects']:,}"),
+            ("Total Repositories Scanned", f"{results['total_repos']:,}"),
+            ("Total Files Scanned", f"{results['total_files_scanned']:,}"),
+            ("", ""),
+            ("🚨 Large Files Found", f"{results['total_large_files']:,}"),
+            ("📦 Total Size of Large Files", f"{round(results['total_size'] / (1024 ** 3), 2)} GB"),
+            ("🧬 Unique Large Files", f"{results.get('unique_large_files', results['total_large_files']):,}"),
+            ("🧬 Unique Size of Large Files", f"{round(results.get('unique_size', results['total_size']) / (1024 ** 3), 2)} GB"),
+            ("Unique Bytes (All Listed Blobs)", f"{round(results.get('unique_blob_bytes', 0) / (1024 ** 3), 2)} GB"),
+            ("", ""),
+            ("Repositories Listed", f"{results.get('repos_fetched', results['total_repos']):,}"),
+            ("Repositories Served From Cache", f"{results.get('repos_from_cache', 0):,}"),
+            ("Repositories Retried", f"{len(results.get('retried_repos', [])):,}"),
+            ("Failed Projects", f"{len(results.get('failed_projects', [])):,}"),
+            ("Failed Repositories", f"{len(results.get('failed_repos', [])):,}"),
+        ]
+
     def _create_summary_sheet(self, ws, results, header_fill, header_font):
         """Create summary sheet"""
+        from openpyxl.styles import Font
         ws.column_dimensions['A'].width = 30
         ws.column_dimensions['B'].width = 30;
         
@@ -330,21 +4158,12 @@ class AzureDevOpsOrgScanner:
         ws[f'A{row}'].font = Font(bold=True, size=14);
         row += 1;
         
-        stats = [
-            ("Minimum File Size", f"{self.min_size_mb} MB"),
-            ("", ""),
-            ("Total Projects Scanned", f"{results['total_projects']:,}"),
-            ("Total Repositories Scanned", f"{results['total_repos']:,}"),
-            ("Total Files Scanned", f"{results['total_files_scanned']:,}"),
-            ("", ""),
-            ("🚨 Large Files Found", f"{results['total_large_files']:,}"),
-            ("📦 Total Size of Large Files", f"{round(results['total_size'] / (1024 ** 3), 2)} GB"),
-        ];
+        stats = self._summary_stats(results);
         
         for label, value in stats:
             ws[f'A{row}'] = label;
             ws[f'B{row}'] = value;
-            if "🚨" in label or "📦" in label:
+            if "🚨" in label or "📦" in label or "🧬" in label:
                 ws[f'A{row}'].font = Font(bold=True);
                 ws[f'B{row}'].font = Font(bold=True);
             row += 1;
@@ -366,7 +4185,7 @@ class AzureDevOpsOrgScanner:
         
         row += 1;
         
-        sorted_files = sorted(results['large_files'], key=lambda x: x['size_bytes'], reverse=True)[:5];
+        sorted_files = self._aggregator(results).top_files(5);
         for file in sorted_files:
             ws[f'A{row}'] = file['file_name'];
             ws[f'B{row}'] = file['size_gb'];
@@ -377,9 +4196,19 @@ class AzureDevOpsOrgScanner:
         ws.column_dimensions['C'].width = 25;
         ws.column_dimensions['D'].width = 25;
     
-    def _create_files_sheet(self, ws, files, header_fill, header_font, border, warning_fill, critical_fill, critical_font):
-        """Create large files sheet"""
+    @staticmethod
+    def _has_branches(files: Iterable[Dict]) -> bool:
+        """Whether the files come from a multi-branch scan, so their sheet gets a Branches column"""
+        return any(file.get('branches') for file in files)
+
+    def _create_files_sheet(self, ws, sorted_files, header_fill, header_font, border, warning_fill, critical_fill, critical_font,
+                            with_branches=False):
+        """Create large files sheet from files already sorted largest first"""
+        from openpyxl.styles import Alignment
+        from openpyxl.utils import get_column_letter
         headers = ["Project", "Repository", "File Name", "File Path", "Size (MB)", "Size (GB)", "Extension", "Repository URL"];
+        if with_branches:
+            headers.append("Branches");
         
         # Write headers
         for col_num, header in enumerate(headers, 1):
@@ -389,9 +4218,6 @@ class AzureDevOpsOrgScanner:
             cell.alignment = Alignment(horizontal='center', vertical='center');
             cell.border = border;
         
-        # Sort files by size (largest first)
-        sorted_files = sorted(files, key=lambda x: x['size_bytes'], reverse=True);
-        
         # Write data
         for row_num, file in enumerate(sorted_files, 2):
             ws.cell(row=row_num, column=1, value=file['project']).border = border;
@@ -413,13 +4239,16 @@ class AzureDevOpsOrgScanner:
             url_cell.border = border;
             url_cell.style = 'Hyperlink';
             
+            if with_branches:
+                ws.cell(row=row_num, column=9, value=file.get('branches', '')).border = border;
+            
             # Conditional formatting
             if file['size_mb'] >= 1000:  # >= 1GB
-                for col in range(1, 9):
+                for col in range(1, len(headers) + 1):
                     ws.cell(row=row_num, column=col).fill = critical_fill;
                     ws.cell(row=row_num, column=col).font = critical_font;
             elif file['size_mb'] >= 500:  # >= 500MB
-                for col in range(1, 9):
+                for col in range(1, len(headers) + 1):
                     ws.cell(row=row_num, column=col).fill = warning_fill;
         
         # Adjust column widths
@@ -431,16 +4260,20 @@ class AzureDevOpsOrgScanner:
         ws.column_dimensions['F'].width = 15;
         ws.column_dimensions['G'].width = 15;
         ws.column_dimensions['H'].width = 50;
+        if with_branches:
+            ws.column_dimensions['I'].width = 40;
         
         # Freeze first row
         ws.freeze_panes = 'A2';
         
         # Add autofilter
-        ws.auto_filter.ref = f"A1:H{len(files) + 1}";
+        ws.auto_filter.ref = f"A1:{get_column_letter(len(headers))}{len(sorted_files) + 1}";
     
     def _create_repo_stats_sheet(self, ws, repo_stats, header_fill, header_font, border):
         """Create repository statistics sheet"""
-        headers = ["Project", "Repository", "Files Scanned", "Large Files Count", "Total Size (MB)", "Total Size (GB)", "Largest File (MB)", "Repository URL"];
+        from openpyxl.styles import Alignment
+        from openpyxl.utils import get_column_letter
+        headers = ["Project", "Repository", "Files Scanned", "Large Files Count", "Total Size (MB)", "Total Size (GB)", "Unique Size (MB)", "Largest File (MB)", "Repository URL"];
         
         # Write headers
         for col_num, header in enumerate(headers, 1):
@@ -468,28 +4301,33 @@ class AzureDevOpsOrgScanner:
             size_gb.border = border;
             size_gb.number_format = '#,##0.000';
             
-            largest = ws.cell(row=row_num, column=7, value=repo['largest_file_mb']);
+            unique_mb = ws.cell(row=row_num, column=7, value=repo.get('large_files_unique_size_mb', repo['large_files_total_size_mb']));
+            unique_mb.border = border;
+            unique_mb.number_format = '#,##0.00';
+            
+            largest = ws.cell(row=row_num, column=8, value=repo['largest_file_mb']);
             largest.border = border;
             largest.number_format = '#,##0.00';
             
-            url_cell = ws.cell(row=row_num, column=8, value=repo['repo_url']);
+            url_cell = ws.cell(row=row_num, column=9, value=repo['repo_url']);
             url_cell.border = border;
             url_cell.style = 'Hyperlink';
         
         # Adjust column widths
-        for col in range(1, 9):
+        for col in range(1, 10):
             ws.column_dimensions[get_column_letter(col)].width = 20;
         
-        ws.column_dimensions['H'].width = 50;
+        ws.column_dimensions['I'].width = 50;
         
         # Freeze first row
         ws.freeze_panes = 'A2';
         
         # Add autofilter
-        ws.auto_filter.ref = f"A1:H{len(repo_stats) + 1}";
+        ws.auto_filter.ref = f"A1:I{len(repo_stats) + 1}";
     
     def _create_project_stats_sheet(self, ws, project_stats, header_fill, header_font, border):
         """Create project statistics sheet"""
+        from openpyxl.styles import Alignment
         headers = ["Project", "Repositories", "Large Files Count", "Total Size (MB)", "Total Size (GB)"];
         
         # Write headers
@@ -527,8 +4365,10 @@ class AzureDevOpsOrgScanner:
         # Freeze first row
         ws.freeze_panes = 'A2';
     
-    def _create_extension_sheet(self, ws, files, header_fill, header_font, border):
+    def _create_extension_sheet(self, ws, aggregator, header_fill, header_font, border):
         """Create files by extension sheet"""
+        from openpyxl.styles import Alignment
+        from openpyxl.utils import get_column_letter
         headers = ["Extension", "File Count", "Total Size (MB)", "Total Size (GB)", "Average Size (MB)"];
         
         # Write headers
@@ -539,16 +4379,8 @@ class AzureDevOpsOrgScanner:
             cell.alignment = Alignment(horizontal='center', vertical='center');
             cell.border = border;
         
-        # Calculate statistics by extension
-        ext_stats = defaultdict(lambda: {'count': 0, 'total_size': 0});
-        
-        for file in files:
-            ext = file['extension'];
-            ext_stats[ext]['count'] += 1;
-            ext_stats[ext]['total_size'] += file['size_bytes'];
-        
-        # Sort by total size (largest first)
-        sorted_exts = sorted(ext_stats.items(), key=lambda x: x[1]['total_size'], reverse=True);
+        # Statistics by extension, largest total first
+        sorted_exts = aggregator.sorted_extensions();
         
         # Write data
         for row_num, (ext, stats) in enumerate(sorted_exts, 2):
@@ -575,48 +4407,1239 @@ class AzureDevOpsOrgScanner:
         ws.freeze_panes = 'A2';
 
 
-def main():
+class PushWatcher:
+    """
+    Keeps scan results current from Azure DevOps ``git.push`` service-hook events
+
+    seed() scans every repository once and records the default-branch
+    commit each result reflects. After that a push only re-evaluates its
+    own repository: when the push starts at the recorded commit, the
+    changed paths are taken from diffs/commits and only their folders are
+    listed (OneLevel) before and after the push, to patch the repository's
+    large files, file count and histograms. A repository is scanned again
+    instead when its recorded commit is unknown or was force-pushed over,
+    when more than MAX_INCREMENTAL_FOLDERS folders changed, or in
+    multi-branch mode.
+
+    Pushes to one repository within ``debounce`` seconds of the first are
+    handled together. At most ``max_pending`` repositories wait at a time;
+    events beyond that are refused so the service hook delivers them again
+    later. ``workers`` threads process waiting repositories, never the
+    same one twice at once. results() merges the live per-repository
+    results, in enumeration order, into the dict print_summary() and
+    export_to_excel() take; its unique blob totals count every blob seen
+    since the watch started.
+    """
+
+    MAX_INCREMENTAL_FOLDERS = 50  # Changed folders above which a push rescans the repository
+
+    def __init__(self, scanner: 'AzureDevOpsOrgScanner', debounce: float = 5.0, max_pending: int = 1000,
+                 workers: int = 2):
+        self.scanner = scanner
+        self.debounce = debounce
+        self.max_pending = max_pending
+        self.workers = max(1, workers)
+
+        self.repos = {}  # repo ID -> (project name, repository listing entry)
+        self.repo_results = {}  # repo ID -> latest result, in enumeration order
+        self.heads = {}  # repo ID -> default-branch commit of the result (None if unknown)
+        self.total_projects = 0
+        self.failed_projects = []
+        self.stats = {'events': 0, 'ignored': 0, 'rejected': 0, 'coalesced': 0,
+                      'incremental': 0, 'rescanned': 0, 'unchanged': 0, 'failed': 0}
+
+        self._pending = {}  # repo ID -> pushes waiting to be processed
+        self._in_progress = set()
+        self._condition = threading.Condition()  # guards _pending, _in_progress and stats
+        self._lock = threading.Lock()  # guards repos, repo_results and heads
+        self._threads = []
+        self._stop = False
+
+    def seed(self):
+        """Scan every repository once, recording the commit each result reflects"""
+        scanner = self.scanner
+        scanner.blob_index = BlobIndex()
+        with scanner.telemetry.phase('list_projects'):
+            projects = scanner.get_all_projects()
+        self.total_projects = len(projects)
+
+        with ThreadPoolExecutor(max_workers=scanner.max_workers) as executor:
+            listing_futures = [
+                executor.submit(scanner.get_repositories_in_project, project['name']) for project in projects
+            ]
+            tasks = []
+            for project, listing_future in zip(projects, listing_futures):
+                try:
+                    repos = listing_future.result()
+                except requests.exceptions.RequestException as e:
+                    self.failed_projects.append({'project': project['name'], 'error': str(e)})
+                    continue
+                for repo in repos:
+                    tasks.append((project['name'], repo, executor.submit(self._scan, project['name'], repo)))
+
+            with scanner.telemetry.phase('scan_repositories'):
+                for done_idx, (project_name, repo, future) in enumerate(tasks, 1):
+                    repo_result, head = future.result()
+                    scanner._print_repo_progress(done_idx, len(tasks), repo_result)
+                    with self._lock:
+                        self.repos[repo['id']] = (project_name, repo)
+                        self.repo_results[repo['id']] = repo_result
+                        self.heads[repo['id']] = head
+
+    def _scan(self, project_name: str, repo: Dict, head: str = None) -> Tuple[Dict, str]:
+        """Scan one repository at ``head`` (default: its current head); returns (result, commit listed)"""
+        scanner = self.scanner
+        if scanner.branches is not None:
+            repo_result = scanner._scan_repository_timed(project_name, repo)
+            repo_result.pop('blobs', None)
+            return repo_result, None
+        if head is None:
+            try:
+                head = scanner.get_default_branch_head(project_name, repo)
+            except requests.exceptions.RequestException:
+                head = None  # Listed at the current head; the next push rescans it
+        repo_result = scanner._scan_repository_timed(project_name, repo, head)
+        repo_result.pop('blobs', None)  # Already in the BlobIndex; nothing journals them here
+        return repo_result, head if repo_result['status'] != 'failed' else None
+
+    def start(self):
+        """Start the worker threads that process queued pushes"""
+        self._stop = False
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._work, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Stop the workers once the repositories they are processing are done"""
+        with self._condition:
+            self._stop = True
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def submit(self, event: Dict) -> str:
+        """
+        Queue a service-hook event; returns 'queued', 'ignored' or 'rejected'
+
+        Only pushes that move the default branch (any branch in multi-branch
+        mode) are queued. 'rejected' means max_pending repositories are
+        already waiting and the event should be delivered again later.
+        """
+        resource = event.get('resource') or {}
+        repository = resource.get('repository') or {}
+        repo_id = repository.get('id')
+        project_name = (repository.get('project') or {}).get('name')
+        default_branch = repository.get('defaultBranch')
+        if not default_branch:
+            with self._lock:
+                known = self.repos.get(repo_id)
+            if known is not None:
+                default_branch = known[1].get('defaultBranch')
+        updates = [
+            update for update in resource.get('refUpdates') or []
+            if self.scanner.branches is not None or update.get('name') == default_branch
+        ]
+
+        with self._condition:
+            if event.get('eventType') != 'git.push' or not repo_id or not project_name or not updates:
+                self.stats['ignored'] += 1
+                return 'ignored'
+
+            pending = self._pending.get(repo_id)
+            if pending is None:
+                if len(self._pending) >= self.max_pending:
+                    self.stats['rejected'] += 1
+                    return 'rejected'
+                pending = self._pending[repo_id] = {
+                    'project': project_name,
+                    'repository': repository,
+                    'old': updates[0].get('oldObjectId'),
+                    'new': None,
+                    'chained': True,
+                    'events': 0,
+                    'due': time.monotonic() + self.debounce,
+                }
+            else:
+                self.stats['coalesced'] += 1
+                pending['repository'] = repository
+
+            for update in updates:
+                if pending['new'] is not None and update.get('oldObjectId') != pending['new']:
+                    pending['chained'] = False  # Not a continuation of the pushes already queued
+                pending['new'] = update.get('newObjectId')
+            pending['events'] += 1
+            self.stats['events'] += 1
+            self._condition.notify()
+        return 'queued'
+
+    def _next_due(self) -> Tuple[str, Dict]:
+        """Wait for a queued repository whose debounce window has passed; (None, None) once stopped"""
+        with self._condition:
+            while not self._stop:
+                now = time.monotonic()
+                waiting = [
+                    (pending['due'], repo_id) for repo_id, pending in self._pending.items()
+                    if repo_id not in self._in_progress
+                ]
+                due, repo_id = min(waiting) if waiting else (None, None)
+                if due is not None and due <= now:
+                    self._in_progress.add(repo_id)
+                    return repo_id, self._pending.pop(repo_id)
+                self._condition.wait(due - now if due is not None else None)
+            return None, None
+
+    def _work(self):
+        """Worker thread: process queued repositories until stopped"""
+        while True:
+            repo_id, pending = self._next_due()
+            if repo_id is None:
+                return
+            try:
+                outcome = self._process(repo_id, pending)
+            except Exception as e:
+                outcome = 'failed'
+                print(f"  ❌ {pending['project']}/{pending['repository'].get('name')}: {e}")
+            with self._condition:
+                self.stats[outcome] += 1
+                self._in_progress.discard(repo_id)
+                self._condition.notify_all()
+
+    def _process(self, repo_id: str, pending: Dict) -> str:
+        """Bring one repository's result up to date with its queued pushes; returns the outcome"""
+        scanner = self.scanner
+        project_name = pending['project']
+        repository = pending['repository']
+        with self._lock:
+            known = self.repos.get(repo_id)
+            previous = self.repo_results.get(repo_id)
+            head = self.heads.get(repo_id)
+
+        if known is not None:
+            repo = dict(known[1])
+        else:
+            # Created since the watch started; remoteUrl is the clone URL, not the page reports link to
+            web_url = repository.get('webUrl') or (
+                f"{scanner.base_url}/{quote(project_name)}/_git/{quote(repository.get('name', ''))}")
+            repo = {'id': repo_id, 'webUrl': web_url, 'size': 0}
+        repo['name'] = repository.get('name') or repo.get('name')
+        repo['defaultBranch'] = repository.get('defaultBranch') or repo.get('defaultBranch')
+
+        single_branch = scanner.branches is None
+        if single_branch and head is not None and head == pending['new']:
+            return 'unchanged'
+
+        repo_result = None
+        if (single_branch and pending['chained'] and head is not None and head == pending['old']
+                and previous is not None and previous['status'] != 'failed'):
+            scanner.scheduler.begin_task()
+            started = time.perf_counter()
+            repo_result = self._apply_push(project_name, repo, previous, pending['old'], pending['new'])
+            if repo_result is not None:
+                scanner.telemetry.record_repository(repo_result, time.perf_counter() - started)
+                head = pending['new']
+                outcome = 'incremental'
+        if repo_result is None:
+            repo_result, head = self._scan(project_name, repo, pending['new'] if single_branch else None)
+            outcome = 'rescanned' if repo_result['status'] != 'failed' else 'failed'
+
+        with self._lock:
+            self.repos[repo_id] = (project_name, repo)
+            self.repo_results[repo_id] = repo_result
+            self.heads[repo_id] = head
+
+        detail = f"{repo_result['updated_folders']} folders" if outcome == 'incremental' else outcome
+        print(f"  🔔 {project_name}/{repo['name']}: {pending['events']} pushes, {detail}, "
+              f"{len(repo_result['large_files'])} large files")
+        return outcome
+
+    def _apply_push(self, project_name: str, repo: Dict, previous: Dict, old_commit: str,
+                    new_commit: str) -> Dict:
+        """
+        Patch a repository result from ``old_commit`` to ``new_commit``
+
+        Lists only the folders holding changed blobs, at both commits, and
+        compares their blobs by objectId. Returns None when the repository
+        should be scanned again instead (too many folders or a failure).
+        The previous result is left untouched.
+        """
+        scanner = self.scanner
+        repo_id = repo['id']
+        try:
+            changes = scanner.get_commit_changes(project_name, repo_id, old_commit, new_commit)
+        except (requests.exceptions.RequestException, ValueError):
+            return None
+        folders = {
+            change['item']['path'].rsplit('/', 1)[0] or '/'
+            for change in changes
+            if change.get('item', {}).get('gitObjectType', 'blob') == 'blob' and change['item'].get('path')
+        }
+        if len(folders) > self.MAX_INCREMENTAL_FOLDERS:
+            return None
+
+        histogram = SizeHistogram().merge(previous['histogram'])
+        extension_histograms = {
+            ext: SizeHistogram().merge(ext_histogram) for ext, ext_histogram in previous['extension_histograms'].items()
+        }
+        large_files = {f['file_path']: f for f in previous['large_files']}
+        total_files = previous['total_files_scanned']
+        try:
+            for folder in sorted(folders):
+                before, after = (
+                    {
+                        item['path']: item
+                        for item in scanner.get_folder_items(project_name, repo_id, folder, commit)
+                        if item.get('gitObjectType') == 'blob'
+                    }
+                    for commit in (old_commit, new_commit)
+                )
+                for path in sorted(before.keys() | after.keys()):
+                    old_item, new_item = before.get(path), after.get(path)
+                    if old_item and new_item and old_item.get('objectId') == new_item.get('objectId'):
+                        continue
+                    if old_item:
+                        file_size = old_item.get('size', 0)
+                        histogram.remove(file_size)
+                        extension = _file_extension(path.rsplit('/', 1)[-1])
+                        extension_histograms[extension].remove(file_size)
+                        if not extension_histograms[extension].count:
+                            del extension_histograms[extension]
+                        large_files.pop(path, None)
+                        total_files -= 1
+                    if new_item:
+                        file_size = new_item.get('size', 0)
+                        scanner.blob_index.add_blob(new_item.get('objectId'), file_size)
+                        scanner._tally_blob(histogram, extension_histograms, path, file_size)
+                        if file_size >= scanner.min_size_bytes:
+                            large_files[path] = scanner._file_info(
+                                project_name, repo['name'], repo.get('webUrl', ''), path, file_size,
+                                new_item.get('objectId')
+                            )
+                        total_files += 1
+        except (requests.exceptions.RequestException, ValueError, KeyError):
+            return None
+
+        return dict(
+            previous,
+            repository=repo['name'],
+            total_files_scanned=total_files,
+            large_files=list(large_files.values()),
+            histogram=histogram,
+            extension_histograms=extension_histograms,
+            status='ok',
+            error=None,
+            retries=scanner.scheduler.task_retries(),
+            shared_tree_with=None,
+            updated_folders=len(folders),
+        )
+
+    def results(self) -> Dict:
+        """Merge the live per-repository results into a report, as scan_organization() returns it"""
+        with self._lock:
+            entries = [(self.repos[repo_id][0], repo_result) for repo_id, repo_result in self.repo_results.items()]
+        projects = {}
+        for project_name, repo_result in entries:
+            projects.setdefault(project_name, []).append(repo_result)
+
+        builder = ScanResultBuilder(self.scanner.blob_index)
+        for project_name, repo_results in projects.items():
+            builder.add_project(project_name, repo_results)
+        results = builder.build(total_projects=max(self.total_projects, len(projects)))
+        results['failed_projects'] = list(self.failed_projects)
+        results['exported_files'] = []
+        return results
+
+    def status(self) -> Dict:
+        """Event counters, queue depth and API requests made so far"""
+        with self._condition:
+            status = dict(self.stats, pending=len(self._pending), in_progress=len(self._in_progress))
+        status['repositories'] = len(self.repo_results)
+        status['api_requests'] = sum(
+            endpoint['requests'] for endpoint in list(self.scanner.telemetry.endpoints.values())
+        )
+        return status
+
+    def make_server(self, host: str = '', port: int = 8080, secret: str = None) -> 'ThreadingHTTPServer':
+        """HTTP server receiving the service hook; serve_forever() it on a thread of its own"""
+        server = ThreadingHTTPServer((host, port), _ServiceHookHandler)
+        server.daemon_threads = True
+        server.watcher = self
+        server.secret = secret
+        return server
+
+
+class _ServiceHookHandler(BaseHTTPRequestHandler):
+    """
+    Receiver for PushWatcher
+
+    POST (any path): a service-hook event, answered 202 when queued, 200
+    when ignored, 503 with Retry-After when the queue is full, 400 for a
+    body that is not JSON and 401 when a secret is set and the Basic
+    authentication password does not match it.
+    GET /status: event counters and queue depth. GET /results: totals and
+    the large files. GET /report: writes the Excel report and returns its path.
+    With a secret, GET requests need the same Basic authentication.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status: int, body, headers: Dict = None):
+        payload = json.dumps(body, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _authorized(self) -> bool:
+        secret = self.server.secret
+        if not secret:
+            return True
+        scheme, _, credentials = self.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() != 'basic':
+            return False
+        try:
+            password = base64.b64decode(credentials).decode('utf-8').partition(':')[2]
+        except ValueError:
+            return False
+        return hmac.compare_digest(password.encode('utf-8'), secret.encode('utf-8'))
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if not self._authorized():
+            self._reply(401, {'error': 'unauthorized'}, {'WWW-Authenticate': 'Basic'})
+            return
+        try:
+            event = json.loads(body)
+        except ValueError:
+            self._reply(400, {'error': 'body is not JSON'})
+            return
+        if not isinstance(event, dict):
+            self._reply(400, {'error': 'body is not an event'})
+            return
+
+        watcher = self.server.watcher
+        outcome = watcher.submit(event)
+        if outcome == 'rejected':
+            self._reply(503, {'status': outcome}, {'Retry-After': str(max(1, round(watcher.debounce)))})
+        else:
+            self._reply(202 if outcome == 'queued' else 200, {'status': outcome})
+
+    def do_GET(self):
+        if not self._authorized():
+            self._reply(401, {'error': 'unauthorized'}, {'WWW-Authenticate': 'Basic'})
+            return
+        watcher = self.server.watcher
+        path = urlsplit(self.path).path
+        if path == '/status':
+            self._reply(200, watcher.status())
+        elif path == '/results':
+            results = watcher.results()
+            body = {
+                key: results[key] for key in (
+                    'total_projects', 'total_repos', 'total_files_scanned', 'total_large_files', 'total_size',
+                    'unique_large_files', 'unique_size', 'failed_repos',
+                )
+            }
+            body['large_files'] = [dict(f) for f in results['large_files']]
+            self._reply(200, body)
+        elif path == '/report':
+            self._reply(200, {'file': watcher.scanner.export_to_excel(watcher.results())})
+        else:
+            self._reply(404, {'error': 'not found'})
+
+
+class _PrefixedLines:
+    """
+    stdout stand-in for concurrent scans: writes whole lines, each prefixed
+    with the label ``label_of()`` returns for the thread that printed it
+    """
+
+    def __init__(self, stream, label_of):
+        self.stream = stream
+        self.label_of = label_of
+        self._partial = {}  # thread ident -> text after its last newline
+        self._lock = threading.Lock()
+
+    def write(self, text: str) -> int:
+        ident = threading.get_ident()
+        label = self.label_of()
+        with self._lock:
+            *lines, self._partial[ident] = (self._partial.pop(ident, '') + text).split('\n')
+            for line in lines:
+                self.stream.write(f"[{label}] {line}\n" if label and line else f"{line}\n")
+        return len(text)
+
+    def flush(self):
+        with self._lock:
+            for text in self._partial.values():
+                if text:
+                    self.stream.write(text + '\n')
+            self._partial.clear()
+            self.stream.flush()
+
+
+class MultiOrgScanner:
+    """
+    Scans several organizations in one run on a shared worker pool
+
+    Every organization gets an AzureDevOpsOrgScanner of its own (token,
+    rate-limit scheduler allowing ``per_org_concurrency`` requests,
+    telemetry, blob index), and all of them share one HTTP transport and
+    one FairWorkPool of ``max_workers`` threads that takes repository scans
+    round-robin across organizations within each one's current budget.
+    Organizations are enumerated and merged concurrently, each on a
+    coordinator thread of its own, so a huge organization neither delays
+    the start of the others nor keeps the pool to itself. Console output
+    is prefixed with the organization it belongs to.
+    """
+
+    def __init__(self, organizations: List[Tuple[str, str]], max_workers: int = 16, per_org_concurrency: int = 8,
+                 http_cache: HttpResponseCache = None, branches: List[str] = None, base_urls: Dict[str, str] = None,
+                 min_size_mb: float = 100):
+        """
+        Args:
+            organizations: (organization, bearer token) pairs, in report order
+            max_workers: Repositories scanned at once across all organizations
+            per_org_concurrency: Requests in flight at most per organization; the
+                                 organization's scheduler lowers it while throttled
+            http_cache: Conditional-request cache for the listings, shared by all
+            branches: Branch name patterns scanned besides the default branch
+            base_urls: Organization URL overrides, e.g. for local stand-in servers
+            min_size_mb: Size in MB from which a file is reported as large
+        """
+        self.transport = AzureDevOpsTransport(pool_size=max_workers, cache=http_cache)
+        self.pool = FairWorkPool(max_workers)
+        self.scanners = {
+            organization: AzureDevOpsOrgScanner(
+                organization, token, per_org_concurrency, transport=self.transport,
+                base_url=(base_urls or {}).get(organization), branches=branches, pool=self.pool,
+                min_size_mb=min_size_mb,
+            )
+            for organization, token in organizations
+        }
+        self.errors = {}  # organization -> error that stopped its scan
+        self._coordinators = {}  # thread ident -> organization
+
+    def _label(self) -> str:
+        return self._coordinators.get(threading.get_ident()) or self.pool.current_organization()
+
+    def scan(self, exporters: Dict[str, List[ResultExporter]] = None, retain_files: bool = True) -> Dict[str, Dict]:
+        """
+        Scan every organization; returns their results by organization
+
+        An organization whose scan fails (e.g. a rejected token) is left out
+        of the results and its error is kept in ``errors``; the others carry on.
+
+        Args:
+            exporters: Incremental exporters of each organization, by organization
+            retain_files: Keep file records in each results['large_files']; pass False
+                          when the exporters are the only outputs that need them
+        """
+        results = {}
+
+        def scan_one(organization: str):
+            self._coordinators[threading.get_ident()] = organization
+            try:
+                results[organization] = self.scanners[organization].scan_organization(
+                    (exporters or {}).get(organization), retain_files=retain_files)
+            except Exception as e:
+                self.errors[organization] = str(e)
+                print(f"❌ Error: {e}")
+            finally:
+                del self._coordinators[threading.get_ident()]
+
+        output = _PrefixedLines(sys.stdout, self._label)
+        with redirect_stdout(output):
+            coordinators = [threading.Thread(target=scan_one, args=(organization,)) for organization in self.scanners]
+            for thread in coordinators:
+                thread.start()
+            for thread in coordinators:
+                thread.join()
+        output.flush()
+        return {organization: results[organization] for organization in self.scanners if organization in results}
+
+    def blob_index(self) -> BlobIndex:
+        """The blobs seen in every organization, for combine_org_results()"""
+        blob_index = BlobIndex()
+        for scanner in self.scanners.values():
+            blob_index.merge(scanner.blob_index)
+        return blob_index
+
+    def close(self):
+        self.pool.shutdown()
+        self.transport.close()
+
+
+def load_scan(path: str) -> Dict:
+    """Load a file written by AzureDevOpsOrgScanner.save_scan, rebuilding its histograms"""
+    with open(path, encoding='utf-8') as f:
+        scan = json.load(f)
+
+    histograms = scan['histograms']
+    scan['histograms'] = {
+        'organization': SizeHistogram.from_dict(histograms['organization']),
+        **{
+            group: {name: SizeHistogram.from_dict(histogram) for name, histogram in histograms[group].items()}
+            for group in ('projects', 'repositories', 'extensions')
+        },
+    }
+    return scan
+
+
+def load_partial(path: str) -> Dict:
+    """Load a file written by AzureDevOpsOrgScanner.save_partial"""
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def merge_partials(partials: List[Dict], exporters: List[ResultExporter] = None, retain_files: bool = True) -> Dict:
+    """
+    Combine the partial results of all N shards into one results dict
+
+    Repositories are merged in the enumeration order of the shard scans,
+    so totals, orderings and exports are the same as for a single-process
+    scan. Each shard lists the organization on its own, so the projects and
+    repositories are the union of all listings, in order of first
+    appearance; a repository missing from its shard's partial (listed by
+    another shard only) is reported as failed rather than dropped. Only
+    ``repos_deduplicated`` can be lower, since identical trees are only
+    recognised within a shard.
+
+    Raises:
+        ValueError: if the partials are not shards 1..N of the same scan
+    """
+    first = partials[0]
+    shard_count = first['shard'][1]
+    for partial in partials:
+        if (partial['organization'], partial['min_size_bytes'], partial['shard'][1]) != (
+                first['organization'], first['min_size_bytes'], shard_count):
+            raise ValueError(f"Shard {partial['shard'][0]}/{partial['shard'][1]} of {partial['organization']} "
+                             f"does not belong to the same scan as the first partial")
+    indices = sorted(partial['shard'][0] for partial in partials)
+    if indices != list(range(1, shard_count + 1)):
+        raise ValueError(f"Expected shards 1..{shard_count} exactly once, got {indices}")
+    partials = sorted(partials, key=lambda partial: partial['shard'][0])
+
+    blob_index = BlobIndex()
+    repo_results = {}
+    listings = {}  # project name -> {repo id: repo} or None while no shard could list it, in listing order
+    listing_errors = {}
+    for partial in partials:
+        blob_index.merge(BlobIndex.from_dict(partial['blobs']))
+        for data in partial['repositories']:
+            repo_result = _repo_result_from_json(data)
+            repo_results[repo_result['repo_id']] = repo_result
+        for project in partial['projects']:
+            listing = listings.setdefault(project['name'], None)
+            if project['repositories'] is not None:
+                if listing is None:
+                    listing = listings[project['name']] = {}
+                for repo in project['repositories']:
+                    listing.setdefault(repo['id'], repo)
+        for failed in partial['failed_projects']:
+            listing_errors.setdefault(failed['project'], failed)
+
+    exporters = exporters or []
+    builder = ScanResultBuilder(blob_index, exporters, retain_files)
+    failed_projects = []
+
+    with ExitStack() as opened:
+        for exporter in exporters:
+            exporter.open()
+            opened.callback(exporter.close)
+        for project_name, listing in listings.items():
+            repos = list(listing.values()) if listing is not None else None
+            if repos is None:
+                # No shard could list this project
+                failed_projects.append(listing_errors[project_name])
+                continue
+
+            for repo in repos:
+                repo_result = repo_results.get(repo['id'])
+                if repo_result is None:
+                    repo_result = {
+                        'project': project_name,
+                        'repository': repo['name'],
+                        'repo_id': repo['id'],
+                        'repo_url': repo['webUrl'],
+                        'total_files_scanned': 0,
+                        'large_files': [],
+                        'histogram': None,
+                        'extension_histograms': {},
+                        'status': 'failed',
+                        'error': f"Not in the result of shard {_shard_of(repo['id'], shard_count)}/{shard_count}",
+                        'retries': 0,
+                    }
+                builder.add_repository(project_name, repo_result)
+            if repos:
+                builder.finish_project(project_name, len(repos))
+
+    results = builder.build(total_projects=len(listings))
+    results['failed_projects'] = failed_projects
+    results['exported_files'] = [path for exporter in exporters for path in (exporter.files_path, exporter.repos_path)]
+    return results
+
+
+def combine_org_results(org_results: Dict[str, Dict], blob_index: BlobIndex = None) -> Dict:
+    """
+    Combine the results of several organizations into one report
+
+    Project names become "organization/project", so projects of the same
+    name stay apart. A large blob found in several organizations counts
+    once in the unique totals, as it does across repositories of one
+    organization; ``blob_index`` (MultiOrgScanner.blob_index()) gives the
+    unique blob totals. Needs results scanned with retain_files.
+    """
+    combined = {
+        key: 0 for key in (
+            'total_projects', 'total_repos', 'total_files_scanned', 'total_large_files', 'total_size',
+            'repos_fetched', 'repos_from_cache', 'repos_deduplicated',
+        )
+    }
+    for key in ('repo_stats', 'project_stats', 'failed_repos', 'retried_repos', 'failed_projects', 'exported_files'):
+        combined[key] = []
+    histograms = {'organization': SizeHistogram(), 'projects': {}, 'repositories': {}, 'extensions': {}}
+    large_files = LargeFileStore()
+    seen_large_blobs = set()
+    unique_large_files = 0
+    unique_size = 0
+
+    for organization, results in org_results.items():
+        def scoped(record: Mapping) -> Dict:
+            return dict(record, project=f"{organization}/{record['project']}")
+
+        for key in ('total_projects', 'total_repos', 'total_files_scanned', 'total_large_files', 'total_size',
+                    'repos_fetched', 'repos_from_cache', 'repos_deduplicated'):
+            combined[key] += results.get(key, 0)
+        for key in ('repo_stats', 'project_stats', 'failed_repos', 'retried_repos', 'failed_projects'):
+            combined[key].extend(scoped(record) for record in results.get(key, []))
+        combined['exported_files'].extend(results.get('exported_files', []))
+
+        org_histograms = results['histograms']
+        histograms['organization'].merge(org_histograms['organization'])
+        for name, histogram in org_histograms['projects'].items():
+            histograms['projects'][f"{organization}/{name}"] = histogram
+        for name, histogram in org_histograms['repositories'].items():
+            histograms['repositories'][f"{organization}/{name}"] = histogram
+        for ext, histogram in org_histograms['extensions'].items():
+            histograms['extensions'].setdefault(ext, SizeHistogram()).merge(histogram)
+
+        for f in results['large_files']:
+            record = scoped(f)
+            large_files.append(record)
+            blob_key = record.get('object_id') or (record['project'], record['repository'], record['file_path'])
+            if blob_key not in seen_large_blobs:
+                seen_large_blobs.add(blob_key)
+                unique_large_files += 1
+                unique_size += record['size_bytes']
+
+    combined.update({
+        'large_files': large_files,
+        'aggregator': ScanAggregator.from_files(large_files),
+        'histograms': histograms,
+        'unique_large_files': unique_large_files,
+        'unique_size': unique_size,
+        'unique_blob_count': len(blob_index.blobs) if blob_index else 0,
+        'unique_blob_bytes': blob_index.unique_blob_bytes if blob_index else 0,
+        'organizations': list(org_results),
+    })
+    return combined
+
+
+def query_scan(scan: Dict, min_size: int, max_size: int = None, group_by: str = None) -> List[Dict]:
+    """
+    Re-threshold a saved scan offline
+
+    Counts the files and bytes with ``min_size <= size < max_size``, for the
+    whole organization or per 'projects', 'repositories' or 'extensions'.
+    Returns rows of {'name', 'count', 'total_size'}, largest first.
+    """
+    if group_by is None:
+        groups = {scan['organization']: scan['histograms']['organization']}
+    else:
+        groups = scan['histograms'][group_by]
+
+    rows = []
+    for name, histogram in groups.items():
+        count, total_size = histogram.summarize(min_size, max_size)
+        if count:
+            rows.append({'name': name, 'count': count, 'total_size': total_size})
+
+    rows.sort(key=lambda row: row['total_size'], reverse=True)
+    return rows
+
+
+def run_query(args):
+    """``query`` command: print a re-thresholded summary of a saved scan"""
+    started = time.perf_counter()
+    scan = load_scan(args.scan_file)
+
+    min_size = int(args.min_mb * 1024 * 1024)
+    max_size = int(args.max_mb * 1024 * 1024) if args.max_mb is not None else None
+    group_by = {'extension': 'extensions', 'project': 'projects', 'repository': 'repositories'}.get(args.by)
+    rows = query_scan(scan, min_size, max_size, group_by)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    size_range = f">= {args.min_mb} MB" if max_size is None else f"{args.min_mb}–{args.max_mb} MB"
+    print(f"📊 {scan['organization']} (scanned {scan['scanned_at']}): files {size_range}")
+    print("-" * 80)
+    for row in rows[:args.top]:
+        print(f"{row['name'][:50]:<50} {row['count']:>8,} files    {row['total_size'] / (1024 ** 3):>10.2f} GB")
+    if len(rows) > args.top:
+        print(f"... {len(rows) - args.top} more")
+    print("-" * 80)
+    print(f"Answered from histograms in {elapsed_ms:.1f} ms (approximate within one ~9% size bucket)")
+
+
+def run_merge(args):
+    """``merge`` command: build the organization report from the partial results of a sharded scan"""
+    partials = [load_partial(path) for path in args.partial_files]
+    scanner = AzureDevOpsOrgScanner(partials[0]['organization'], bearer_token='',
+                                    min_size_mb=partials[0]['min_size_bytes'] / (1024 * 1024))
+
+    results = merge_partials(partials)
+    scanner.print_summary(results)
+    excel_file = scanner.export_to_excel(results, args.output)
+    scan_file = scanner.save_scan(results, os.path.splitext(excel_file)[0] + '.scan.json')
+
+    print()
+    print("=" * 80)
+    print(f"✅ Merged {len(partials)} shards!")
+    print(f"📊 Excel report: {excel_file}")
+    print(f"💾 Scan file: {scan_file}")
+    print("=" * 80)
+
+
+def run_history(args):
+    """``history`` command: report large blobs in the full history of local bare mirrors"""
+    mirrors = discover_mirrors(args.mirror_root)
+    if not mirrors:
+        print(f"❌ No bare mirrors found under {args.mirror_root}")
+        return
+
+    organization = os.path.basename(os.path.abspath(args.mirror_root))
+    scanner = AzureDevOpsOrgScanner(organization, bearer_token='', max_workers=args.workers, min_size_mb=args.min_mb)
+
+    results = scanner.scan_mirrors(mirrors)
+    scanner.print_summary(results)
+    excel_file = scanner.export_to_excel(results, args.output)
+    scan_file = scanner.save_scan(results, os.path.splitext(excel_file)[0] + '.scan.json')
+
+    print()
+    print("=" * 80)
+    print("✅ History Scan Complete!")
+    print(f"📊 Excel report: {excel_file}")
+    print(f"💾 Scan file: {scan_file}")
+    print("=" * 80)
+
+
+def run_db(args):
+    """``db`` command: query the scans stored in a SQLite database, or build a report from one"""
+    with closing(ScanDatabase(args.database)) as database:
+        if args.action == 'scans':
+            print(f"{'ID':>5}  {'Scanned':<19}  {'Organization':<20} {'Repos':>7} {'Large Files':>12} {'Size (GB)':>10}")
+            print("-" * 80)
+            for scan in database.scans(args.organization):
+                print(f"{scan['id']:>5}  {scan['scanned_at']:<19}  {scan['organization'][:20]:<20} {scan['total_repos']:>7,} "
+                      f"{scan['total_large_files']:>12,} {scan['total_size'] / (1024 ** 3):>10.2f}")
+            return
+
+        scan_id = args.scan or database.latest_scan_id(args.organization)
+        if scan_id is None:
+            print(f"❌ No scans stored in {args.database}")
+            return
+        scan = database.scan(scan_id)
+
+        if args.action == 'report':
+            scanner = AzureDevOpsOrgScanner(scan['organization'], bearer_token='',
+                                            min_size_mb=scan['min_size_bytes'] / (1024 * 1024))
+            results = database.load_results(scan_id)
+            scanner.print_summary(results)
+            scanner.export_to_excel(results, args.output)
+            return
+
+        print(f"📊 {scan['organization']}, scan {scan_id} ({scan['scanned_at']})")
+        print("-" * 80)
+        if args.action == 'top':
+            if args.by:
+                for row in database.totals_by(scan_id, args.by)[:args.top]:
+                    print(f"{row['name'][:50]:<50} {row['count']:>8,} files    {row['total_size'] / (1024 ** 3):>10.2f} GB")
+            else:
+                for file in database.top_files(scan_id, args.top, args.extension, args.project):
+                    print(f"{file['size_gb']:>8.2f} GB  {file['project']}/{file['repository']}{file['file_path']}")
+        elif args.action == 'diff':
+            since = args.since or database.previous_scan_id(scan_id)
+            if since is None:
+                print("ℹ️  No earlier scan to compare with")
+                return
+            for label, files in (("➕ Added", database.files_added(scan_id, since)),
+                                 ("➖ Removed", database.files_removed(scan_id, since))):
+                print(f"{label} since scan {since}: {len(files):,} files, "
+                      f"{sum(f['size_bytes'] for f in files) / (1024 ** 3):.2f} GB")
+                for file in files[:args.top]:
+                    print(f"    {file['size_gb']:>8.2f} GB  {file['project']}/{file['repository']}{file['file_path']}")
+        elif args.action == 'growth':
+            rows = database.repository_growth(scan['organization'], args.project)
+            for row in rows[:args.top]:
+                trend = " → ".join(f"{point['size_mb'] / 1024:.1f}" for point in row['series'])
+                print(f"{row['project'] + '/' + row['repository']:<45} {row['change_mb'] / 1024:>+9.2f} GB  ({trend} GB)")
+            if len(rows) > args.top:
+                print(f"... {len(rows) - args.top} more")
+
+
+def run_organizations(organizations: List[Tuple[str, str]], max_workers: int, per_org_concurrency: int,
+                      http_cache: HttpResponseCache = None, branches: List[str] = None, database_file: str = None,
+                      output_prefix: str = None, base_urls: Dict[str, str] = None, formats: List[str] = ('xlsx', 'scan'),
+                      min_size_mb: float = 100):
+    """
+    Scan several organizations in one run; writes outputs per organization and a combined report
+
+    Each organization's outputs are named ``<output_prefix>_<organization>``
+    plus the format's extension; the combined Excel report, written when
+    ``xlsx`` is among ``formats``, is ``<output_prefix>_combined.xlsx``.
+    File records are only kept in memory for the Excel reports and the
+    database; otherwise they are just streamed to the exporters and the
+    combined summary is left out.
+    """
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    bases = {
+        organization: f"{output_prefix}_{organization}" if output_prefix
+        else f"AzureDevOps_LargeFiles_{organization}_{timestamp}"
+        for organization, _ in organizations
+    }
+    multi = MultiOrgScanner(organizations, max_workers, per_org_concurrency, http_cache, branches, base_urls, min_size_mb)
+    exporters = {
+        organization: [EXPORTERS[fmt](bases[organization]) for fmt in formats if fmt in EXPORTERS]
+        for organization in bases
+    }
+    retain_files = bool(database_file) or any(fmt in RECORD_FORMATS for fmt in formats)
+    started = time.perf_counter()
+    try:
+        org_results = multi.scan(exporters, retain_files)
+    finally:
+        multi.close()
+    elapsed = time.perf_counter() - started
+
+    print()
+    reports = {}
+    for organization, results in org_results.items():
+        scanner = multi.scanners[organization]
+        written = [REPORT_WRITERS[fmt](scanner, results, bases[organization]) for fmt in formats if fmt in REPORT_WRITERS]
+        reports[organization] = (written + results['exported_files'] + ['-'])[0]
+        if database_file:
+            with closing(ScanDatabase(database_file)) as database:
+                database.add_scan(results, organization, scanner.min_size_bytes)
+
+    print()
+    print("=" * 80)
+    print(f"{'Organization':<24} {'Repos':>7} {'Large Files':>12} {'Size (GB)':>10} {'Requests':>9}  Report")
+    print("-" * 80)
+    for organization, scanner in multi.scanners.items():
+        if organization not in org_results:
+            print(f"{organization[:24]:<24} ❌ {multi.errors.get(organization)}")
+            continue
+        results = org_results[organization]
+        requests_made = sum(endpoint['requests'] for endpoint in scanner.telemetry.endpoints.values())
+        print(f"{organization[:24]:<24} {results['total_repos']:>7,} {results['total_large_files']:>12,} "
+              f"{results['total_size'] / (1024 ** 3):>10.2f} {requests_made:>9,}  {reports[organization]}")
+    print()
+
+    if len(org_results) > 1 and retain_files:
+        combined = combine_org_results(org_results, multi.blob_index())
+        reporter = AzureDevOpsOrgScanner(", ".join(org_results), bearer_token='', min_size_mb=min_size_mb)
+        reporter.print_summary(combined)
+        if 'xlsx' in formats:
+            excel_file = reporter.export_to_excel(
+                combined, f"{output_prefix}_combined.xlsx" if output_prefix
+                else f"AzureDevOps_LargeFiles_combined_{timestamp}.xlsx"
+            )
+            print(f"📊 Combined report: {excel_file}")
+    print(f"⏱️  {len(org_results)}/{len(organizations)} organizations scanned in {elapsed:.1f}s")
+    if database_file:
+        print(f"🗃️  Stored in {database_file}, one scan per organization")
+
+
+def run_watch(scanner: AzureDevOpsOrgScanner, args):
+    """Scan once, then keep the results current from service-hook pushes until interrupted"""
+    watcher = PushWatcher(scanner, args.debounce, args.max_pending, args.workers)
+    server = watcher.make_server(args.host, args.port, args.secret)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"👂 Receiving service hooks on port {server.server_address[1]} (pushes wait until the first scan ends)")
+    print()
+
+    watcher.seed()
+    watcher.start()
+    print()
+    print(f"🔔 Watching {len(watcher.repo_results)} repositories (debounce {args.debounce:g}s, "
+          f"at most {args.max_pending} queued); GET /report writes the Excel report, Ctrl+C stops")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print()
+    finally:
+        server.shutdown()
+        watcher.stop()
+
+    results = watcher.results()
+    scanner.print_summary(results)
+    excel_file = scanner.export_to_excel(results, args.output)
+    status = watcher.status()
+    print(f"🔔 {status['events']} pushes: {status['incremental']} applied incrementally, "
+          f"{status['rescanned']} repositories rescanned, {status['rejected']} refused; "
+          f"{status['api_requests']:,} API requests in total")
+    print(f"📊 Excel report: {excel_file}")
+
+
+def main(argv: List[str] = None):
     """
     Main function
+
+    Without a command, runs ``scan``; every setting is a command-line
+    option with its default in the parser (``--org``, ``--format``,
+    ``--mode``, ...). The token comes from ``--token-file`` or the
+    ``AZURE_DEVOPS_TOKEN`` variable. Only the output formats chosen are
+    imported, so ``--help`` and the offline commands start without openpyxl.
+    The ``query`` command re-thresholds a saved scan without contacting Azure DevOps.
+    ``scan --shard i/N`` scans one Nth of the repositories and saves a
+    partial result; ``merge`` combines the N partials into the full report.
+    ``history`` scans every blob in the history of local bare mirrors.
+    ``db`` queries scans stored in a SQLite database (``scan --database``)
+    and renders the Excel report of a stored scan. ``watch`` scans once
+    and then updates the results from Azure DevOps git.push service hooks.
+    With several ``--org``, the scan covers all of them in one run.
     """
-    # ========================================
-    # CONFIGURATION
-    # ========================================
-    
-    ORGANIZATION = "myorg"  # Your Azure DevOps organization name
-    BEARER_TOKEN = "your-bearer-token-here"  # Your Bearer token
-    
-    # Optional: Custom output filename
-    OUTPUT_FILENAME = None  # None = auto-generate, or specify like "large_files_report.xlsx"
-    
-    # ========================================
-    # EXECUTION
-    # ========================================
-    
+    default_checkpoint = "scan_checkpoint_{org}.jsonl"
+    parser = argparse.ArgumentParser(description="Find large files across an Azure DevOps organization")
+    subparsers = parser.add_subparsers(dest='command')
+
+    # Options of the commands that contact Azure DevOps
+    connection = argparse.ArgumentParser(add_help=False)
+    connection.add_argument('--org', action='append', dest='orgs', metavar='NAME[:TOKEN_VAR]',
+                            help="Organization to scan; repeat to scan several in one run. A variable name after "
+                                 "the colon reads that organization's token from it instead of --token-env")
+    connection.add_argument('--token-env', metavar='VAR', default='AZURE_DEVOPS_TOKEN',
+                            help="Environment variable holding the bearer token (default: %(default)s)")
+    connection.add_argument('--token-file', metavar='PATH', help="Read the token from this file ('-' for stdin)")
+    connection.add_argument('--base-url', help="Organization URL override, e.g. a local mock server; "
+                                               "'{org}' in it stands for the organization name")
+    connection.add_argument('--min-size-mb', type=float, default=100,
+                            help="Report files of at least this size (default: %(default)g)")
+    connection.add_argument('--concurrency', type=int, default=8,
+                            help="Repositories scanned at once, also the HTTP connection pool size (default: %(default)s)")
+    connection.add_argument('--per-org-concurrency', type=int, default=8,
+                            help="Requests in flight per organization when scanning several (default: %(default)s)")
+    connection.add_argument('--branch', action='append', metavar='PATTERN', dest='branches',
+                            help="Also scan branches matching this name pattern (e.g. 'release/*', or '*' for all); "
+                                 "repeatable")
+    connection.add_argument('--http-cache', metavar='DIR',
+                            help="Revalidate project/repository listings from this directory instead of refetching")
+    connection.add_argument('--http-cache-ttl', type=float, metavar='SECONDS',
+                            help="Use a cached listing this long without asking the server at all")
+
+    scan_parser = subparsers.add_parser('scan', parents=[connection], help="Scan the configured organization (default)")
+    scan_parser.add_argument('--mode', choices=['full', 'incremental'], default='full',
+                             help="incremental re-lists only repositories whose default branch moved since the "
+                                  "run that wrote --cache (default: %(default)s)")
+    scan_parser.add_argument('--cache', metavar='FILE', help="Head-commit cache of incremental mode "
+                                                             "(default: scan_cache_<org>.json)")
+    scan_parser.add_argument('--format', type=parse_formats, metavar='FMT[,FMT]', dest='formats',
+                             default=['xlsx', 'scan'],
+                             help=f"Outputs besides the console summary, from: {', '.join(OUTPUT_FORMATS)}; "
+                                  f"csv, jsonl and parquet are written while the scan runs; "
+                                  f"'none' for the summary only (default: xlsx,scan)")
+    scan_parser.add_argument('-o', '--output', metavar='PREFIX',
+                             help="Path and name of the outputs without extension (default: auto-generated)")
+    scan_parser.add_argument('--database', metavar='FILE',
+                             help="Also store the scan in this SQLite database for trend queries (db FILE diff)")
+    scan_parser.add_argument('--checkpoint', nargs='?', const=default_checkpoint, metavar='FILE',
+                             help="Journal completed repositories so an interrupted scan can be resumed "
+                                  "(FILE default: scan_checkpoint_<org>.jsonl). Off unless given: the journal "
+                                  "holds the digest of every listed blob, which the scan collects per repository, "
+                                  "and is fsynced every 30 seconds")
+    scan_parser.add_argument('--no-telemetry', action='store_true', help="Do not write <output>.telemetry.json")
+    scan_parser.add_argument('--prometheus', metavar='FILE', help="Write metrics for the node_exporter textfile collector")
+    scan_parser.add_argument('--resume', action='store_true',
+                             help="Continue an interrupted scan from its checkpoint instead of starting over; "
+                                  "implies --checkpoint")
+    scan_parser.add_argument('--shard', type=parse_shard, metavar='i/N',
+                             help="Scan only shard i of N (by repository ID) and save a partial result for merge")
+
+    merge_parser = subparsers.add_parser('merge', help="Combine the partial results of a sharded scan")
+    merge_parser.add_argument('partial_files', nargs='+', help="*.partial.json files of shards 1..N")
+    merge_parser.add_argument('-o', '--output', help="Excel report filename (default: auto-generated)")
+
+    history_parser = subparsers.add_parser('history', help="Scan the full history of local bare mirrors")
+    history_parser.add_argument('mirror_root', help="A bare mirror, a directory of mirrors, or of project directories")
+    history_parser.add_argument('--min-mb', type=float, default=100, help="Report blobs of at least this size")
+    history_parser.add_argument('--workers', type=int, default=os.cpu_count() or 4, help="Mirrors scanned concurrently")
+    history_parser.add_argument('-o', '--output', help="Excel report filename (default: auto-generated)")
+
+    db_parser = subparsers.add_parser('db', help="Query scans stored in a SQLite database or report one of them")
+    db_parser.add_argument('database', help="SQLite file the scan command writes to (scan --database)")
+    db_parser.add_argument('action', choices=['scans', 'top', 'diff', 'growth', 'report'],
+                           help="List scans, largest files or totals (--by), files added/removed since an "
+                                "earlier scan, growth per repository, or the Excel report of a scan")
+    db_parser.add_argument('--scan', type=int, help="Scan ID (default: the latest)")
+    db_parser.add_argument('--since', type=int, help="diff: earlier scan ID (default: the scan before --scan)")
+    db_parser.add_argument('--organization', help="Only scans of this organization")
+    db_parser.add_argument('--by', choices=['extension', 'project', 'repository'], help="top: group the totals")
+    db_parser.add_argument('--extension', help="top: only files with this extension, e.g. .zip")
+    db_parser.add_argument('--project', help="top, growth: only this project")
+    db_parser.add_argument('--top', type=int, default=20, help="Rows to print")
+    db_parser.add_argument('-o', '--output', help="report: Excel filename (default: auto-generated)")
+
+    watch_parser = subparsers.add_parser('watch', parents=[connection],
+                                         help="Scan once, then update the results from git.push service hooks")
+    watch_parser.add_argument('--host', default='', help="Address to receive service hooks on (default: all)")
+    watch_parser.add_argument('--port', type=int, default=8080, help="Port to receive service hooks on")
+    watch_parser.add_argument('--debounce', type=float, default=5.0,
+                              help="Seconds to gather further pushes to a repository before processing it")
+    watch_parser.add_argument('--max-pending', type=int, default=1000,
+                              help="Repositories queued at most; further pushes are refused for redelivery")
+    watch_parser.add_argument('--workers', type=int, default=2, help="Repositories processed concurrently")
+    watch_parser.add_argument('--secret', help="Require this Basic authentication password on service-hook "
+                                               "requests and on /status, /results and /report")
+    watch_parser.add_argument('-o', '--output', help="Excel report written on exit (default: auto-generated)")
+    # Scan options the watch does not offer: one full scan kept in memory, reported to Excel
+    watch_parser.set_defaults(mode='full', cache=None, formats=['xlsx'], database=None, checkpoint=None,
+                              no_telemetry=True, prometheus=None, resume=False, shard=None)
+
+    query_parser = subparsers.add_parser('query', help="Re-threshold or re-summarize a saved scan offline")
+    query_parser.add_argument('scan_file', help="*.scan.json file written by a previous scan")
+    query_parser.add_argument('--min-mb', type=float, default=0, help="Lower size bound in MB (inclusive)")
+    query_parser.add_argument('--max-mb', type=float, default=None, help="Upper size bound in MB (exclusive)")
+    query_parser.add_argument('--by', choices=['extension', 'project', 'repository'], help="Group the totals")
+    query_parser.add_argument('--top', type=int, default=20, help="Rows to print")
+
+    args = parser.parse_args(argv)
+    if args.command is None:
+        args = parser.parse_args(['scan'])  # scan is the default command
+    if args.command == 'query':
+        run_query(args)
+        return
+    if args.command == 'merge':
+        run_merge(args)
+        return
+    if args.command == 'history':
+        run_history(args)
+        return
+    if args.command == 'db':
+        run_db(args)
+        return
+    shard = args.shard
+    checkpoint_file = args.checkpoint or (default_checkpoint if args.resume else None)
+
     try:
-        # Create scanner
-        scanner = AzureDevOpsOrgScanner(ORGANIZATION, BEARER_TOKEN);
-        
+        token = read_token(args.token_env, args.token_file)
+        if not args.orgs:
+            parser.error("no organization: pass --org NAME")
+        organizations = [parse_organization(spec, token) for spec in args.orgs]
+        missing = [organization for organization, organization_token in organizations if not organization_token]
+        if missing:
+            parser.error(f"no token for {', '.join(missing)}: set ${args.token_env}, pass --token-file, "
+                         f"or name a variable with --org NAME:VAR")
+        load_format_dependencies(args.formats)
+    except (OSError, ValueError, ImportError) as e:
+        print(f"❌ {e}")
+        return 1
+    base_urls = {organization: args.base_url.replace('{org}', organization)
+                 for organization, _ in organizations} if args.base_url else {}
+
+    try:
+        http_cache = HttpResponseCache(args.http_cache, ttl=args.http_cache_ttl) if args.http_cache else None
+
+        if len(organizations) > 1:
+            # Per-organization outputs plus a combined report; caches, checkpoints, shards and watch are single-organization
+            if shard is not None or args.command == 'watch' or args.mode == 'incremental' or args.resume:
+                print("❌ --shard, --resume, --mode incremental and watch scan a single organization; pass one --org")
+                return 1
+            run_organizations(organizations, args.concurrency, args.per_org_concurrency, http_cache, args.branches,
+                              args.database, args.output, base_urls, args.formats, args.min_size_mb)
+            return
+
+        (organization, bearer_token), = organizations
+        cache_file = (args.cache or f"scan_cache_{organization}.json") if args.mode == 'incremental' else None
+        if checkpoint_file:
+            checkpoint_file = checkpoint_file.format(org=organization)
+            if shard is not None:
+                checkpoint_file = checkpoint_file.replace('.jsonl', f".shard-{shard[0]}-of-{shard[1]}.jsonl")
+
+        scanner = AzureDevOpsOrgScanner(organization, bearer_token, args.concurrency,
+                                        base_url=base_urls.get(organization), cache_path=cache_file,
+                                        checkpoint_path=checkpoint_file, http_cache=http_cache,
+                                        branches=args.branches, min_size_mb=args.min_size_mb)
+
+        if args.command == 'watch':
+            run_watch(scanner, args)
+            return
+
         # Scan entire organization
-        results = scanner.scan_organization();
-        
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        report_base = args.output or f"AzureDevOps_LargeFiles_{organization}_{timestamp}"
+        exporters = [EXPORTERS[fmt](report_base) for fmt in args.formats if fmt in EXPORTERS]
+        # Only the Excel report and the database need the records in memory; the exporters stream them to disk
+        retain_files = shard is None and (bool(args.database) or any(fmt in RECORD_FORMATS for fmt in args.formats))
+        results = scanner.scan_organization(exporters, retain_files=retain_files, resume=args.resume, shard=shard)
+
         # Print summary to console
-        scanner.print_summary(results);
-        
-        # Export to Excel
-        excel_file = scanner.export_to_excel(results, OUTPUT_FILENAME);
-        
-        print();
-        print("=" * 80);
-        print(f"✅ Scan Complete!");
-        print(f"📊 Excel report: {excel_file}");
-        print("=" * 80);
-        
-    except Exception as e:
-        print(f"\n❌ Error: {e}");
-        import traceback;
-        traceback.print_exc();
+        with scanner.telemetry.phase('summary'):
+            scanner.print_summary(results)
+
+        if shard is not None:
+            # The report is built by the merge command once every shard has finished
+            with scanner.telemetry.phase('save_partial'):
+                partial_file = scanner.save_partial(results)
+            report_base = partial_file[:-len('.partial.json')]
+        else:
+            # Excel report, and histograms for offline re-thresholding (query command)
+            outputs = {}
+            for fmt in args.formats:
+                if fmt in REPORT_WRITERS:
+                    with scanner.telemetry.phase(f"write_{fmt}"):
+                        outputs[fmt] = REPORT_WRITERS[fmt](scanner, results, report_base)
+
+            if args.database:
+                with scanner.telemetry.phase('save_database'), closing(ScanDatabase(args.database)) as database:
+                    scan_id = database.add_scan(results, organization, scanner.min_size_bytes)
+
+        telemetry_file = None if args.no_telemetry else scanner.telemetry.save_json(report_base + '.telemetry.json')
+        if args.prometheus:
+            scanner.telemetry.save_prometheus(args.prometheus)
 
+        print()
+        print("=" * 80)
+        if shard is not None:
+            print(f"✅ Shard {shard[0]}/{shard[1]} Complete!")
+            print(f"🧩 Partial result: {partial_file} (combine with: merge <all {shard[1]} partial files>)")
+        else:
+            print("✅ Scan Complete!")
+            if 'xlsx' in outputs:
+                print(f"📊 Excel report: {outputs['xlsx']}")
+            if 'scan' in outputs:
+                print(f"💾 Scan file: {outputs['scan']} (re-threshold with: query {outputs['scan']} --min-mb 50)")
+            if args.database:
+                print(f"🗃️  Stored as scan {scan_id} in {args.database} (compare with: db {args.database} diff)")
+        for path in results['exported_files']:
+            print(f"📄 Streamed export: {path}")
+        if telemetry_file:
+            print(f"⏱️  Telemetry: {telemetry_file}")
+        if args.prometheus:
+            print(f"📈 Prometheus metrics: {args.prometheus}")
+        print("=" * 80)
+
+    except Exception as e:
+        print(f"\n❌ Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
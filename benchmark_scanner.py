@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# benchmark_scanner.py
+"""
+Throughput benchmarks for AzureDevOpsOrgScanner against the local mock server
+
+Each scenario starts mock_azure_devops_server.py with a given org shape and
+runs scan, summary and Excel export in a fresh Python process, so peak RSS
+and timings are those of one scan. Reports repos/sec, items/sec, peak RSS
+and the time of each phase.
+
+``--startup`` instead times fresh interpreters importing the scanner and
+running its CLI without scanning, and lists the optional exporter packages
+they loaded; ``--max-startup-ms`` makes it fail above a budget, e.g. in CI.
+
+Usage:
+    python benchmark_scanner.py                          # all scenarios
+    python benchmark_scanner.py --scenarios small,monorepo --repeat 3
+    python benchmark_scanner.py --json after.json --compare before.json
+    python benchmark_scanner.py --startup --startup-runs 20 --max-startup-ms 300
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCANNER = os.path.join(HERE, 'azure_devops_large_files_scanner.py')
+
+# name -> (mock server options, scanner max_workers)
+SCENARIOS = {
+    'small': ({'projects': 5, 'repos': 10, 'items': 2000}, 8),
+    'many-repos': ({'projects': 40, 'repos': 25, 'items': 200}, 16),
+    'paged': ({'projects': 400, 'repos': 2, 'items': 200, 'latency-ms': 10}, 16),
+    'monorepo': ({'projects': 1, 'repos': 2, 'items': 200000}, 8),
+    'large-files': ({'projects': 5, 'repos': 10, 'items': 2000, 'large-file-ratio': 0.2}, 8),
+    'forks': ({'projects': 5, 'repos': 20, 'items': 5000, 'fork-ratio': 0.5}, 8),
+    'throttled': ({'projects': 5, 'repos': 10, 'items': 1000, 'latency-ms': 20, 'latency-jitter-ms': 20,
+                   'throttle-rate': 0.05, 'throttle-retry-after': 0.2, 'error-rate': 0.01}, 8),
+}
+
+# name -> interpreter arguments of a startup that does not scan
+STARTUP_COMMANDS = {
+    'import': ['-c', 'import azure_devops_large_files_scanner'],
+    'help': [SCANNER, '--help'],
+    'scan --help': [SCANNER, 'scan', '--help'],
+}
+
+# Packages only some output formats need; a startup should not load them
+HEAVY_MODULES = ['openpyxl', 'pyarrow', 'pandas', 'numpy']
+
+# metric -> (column title, format, True if higher is better)
+METRICS = {
+    'repos_per_sec': ("repos/s", "{:>10.2f}", True),
+    'items_per_sec': ("items/s", "{:>10,.0f}", True),
+    'scan_s': ("scan s", "{:>8.2f}", False),
+    'scan_cpu_s': ("scan CPU s", "{:>10.2f}", False),
+    'summary_s': ("summary s", "{:>9.3f}", False),
+    'export_s': ("export s", "{:>8.2f}", False),
+    'peak_rss_scan_mb': ("RSS scan MB", "{:>11.1f}", False),
+    'peak_rss_mb': ("RSS peak MB", "{:>11.1f}", False),
+}
+
+
+def _peak_rss_mb() -> float:
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024  # bytes on macOS, KB on Linux
+
+
+def run_scenario_in_process(base_url: str, max_workers: int) -> Dict:
+    """Scan, summarize and export the org at ``base_url``; runs inside the measured child process"""
+    sys.path.insert(0, HERE)
+    from azure_devops_large_files_scanner import AzureDevOpsOrgScanner
+
+    scanner = AzureDevOpsOrgScanner('mockorg', 'benchmark', max_workers, base_url=base_url)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), \
+            tempfile.TemporaryDirectory() as out_dir:
+        started, started_cpu = time.perf_counter(), time.process_time()
+        results = scanner.scan_organization()
+        scan_s, scan_cpu_s = time.perf_counter() - started, time.process_time() - started_cpu
+        peak_rss_scan_mb = _peak_rss_mb()
+
+        started = time.perf_counter()
+        scanner.print_summary(results)
+        summary_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        scanner.export_to_excel(results, os.path.join(out_dir, 'benchmark.xlsx'))
+        export_s = time.perf_counter() - started
+
+    return {
+        'repos': results['total_repos'],
+        'items': results['total_files_scanned'],
+        'large_files': results['total_large_files'],
+        'failed_repos': len(results['failed_repos']),
+        'repos_per_sec': results['total_repos'] / scan_s,
+        'items_per_sec': results['total_files_scanned'] / scan_s,
+        'scan_s': scan_s,
+        'scan_cpu_s': scan_cpu_s,
+        'summary_s': summary_s,
+        'export_s': export_s,
+        'peak_rss_scan_mb': peak_rss_scan_mb,
+        'peak_rss_mb': _peak_rss_mb(),
+    }
+
+
+def run_scenario(name: str) -> Dict:
+    """Start a mock server for the scenario and measure one run in a child process"""
+    server_options, max_workers = SCENARIOS[name]
+    server_args = [sys.executable, os.path.join(HERE, 'mock_azure_devops_server.py'), '--port', '0']
+    for option, value in server_options.items():
+        server_args += [f"--{option}", str(value)]
+
+    server = subprocess.Popen(server_args, stdout=subprocess.PIPE, text=True)
+    try:
+        base_url = server.stdout.readline().strip()
+        child = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', base_url, '--workers', str(max_workers)],
+            capture_output=True, text=True, check=True,
+        )
+        return json.loads(child.stdout.strip().splitlines()[-1])
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def run_startup(args: List[str], runs: int) -> Dict:
+    """Median wall time of ``runs`` fresh interpreters running ``args``, and the heavy modules they import"""
+    command = [sys.executable] + args
+    times_ms = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(command, cwd=HERE, stdout=subprocess.DEVNULL, check=True)
+        times_ms.append((time.perf_counter() - started) * 1000)
+
+    # -X importtime lists every module imported, one "import time: self | cumulative | name" line each
+    trace = subprocess.run([sys.executable, '-X', 'importtime'] + args, cwd=HERE,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+    imported = {line.rsplit('|', 1)[-1].strip().split('.')[0] for line in trace.stderr.splitlines()
+                if line.startswith('import time:')}
+    return {
+        'median_ms': statistics.median(times_ms),
+        'min_ms': min(times_ms),
+        'heavy_modules': [name for name in HEAVY_MODULES if name in imported],
+    }
+
+
+def print_startup_table(results: Dict[str, Dict], baseline: Dict[str, Dict] = None):
+    header = f"{'command':<14} {'median ms':>10} {'min ms':>8}  heavy modules loaded"
+    print(header)
+    print("-" * len(header))
+    for name, result in results.items():
+        change = ""
+        if baseline and baseline.get(name):
+            change = f" ({(result['median_ms'] - baseline[name]['median_ms']) / baseline[name]['median_ms'] * 100:+.0f}%)"
+        print(f"{name:<14} {result['median_ms']:>10.1f} {result['min_ms']:>8.1f}  "
+              f"{', '.join(result['heavy_modules']) or 'none'}{change}")
+
+
+def print_table(results: Dict[str, Dict], baseline: Dict[str, Dict] = None):
+    header = f"{'scenario':<12} {'repos':>6} {'items':>10} " + " ".join(title.rjust(len(fmt.format(0))) for title, fmt, _ in METRICS.values())
+    print(header)
+    print("-" * len(header))
+    for name, result in results.items():
+        row = f"{name:<12} {result['repos']:>6} {result['items']:>10,} "
+        row += " ".join(fmt.format(result[metric]) for metric, (_, fmt, _) in METRICS.items())
+        print(row)
+
+        if baseline and name in baseline:
+            deltas = []
+            for metric, (_, fmt, higher_is_better) in METRICS.items():
+                before = baseline[name].get(metric)
+                if not before:
+                    deltas.append(" " * len(fmt.format(0)))
+                    continue
+                change = (result[metric] - before) / before * 100
+                better = change > 0 if higher_is_better else change < 0
+                mark = ('+' if better else '-') if abs(change) >= 5 else ' '  # Flag changes beyond noise
+                deltas.append(f"{change:+.0f}%{mark}".rjust(len(fmt.format(0))))
+            print(f"{'  vs base':<12} {'':>6} {'':>10} " + " ".join(deltas))
+        if result['failed_repos']:
+            print(f"{'':<12} ⚠️  {result['failed_repos']} repositories failed")
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Benchmark the scanner against a local mock Azure DevOps server")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help=f"Comma-separated, from: {', '.join(SCENARIOS)}")
+    parser.add_argument('--repeat', type=int, default=1, help="Runs per scenario; the fastest scan is kept")
+    parser.add_argument('--json', help="Write the results to this file")
+    parser.add_argument('--compare', help="Results file of an earlier run to show changes against")
+    parser.add_argument('--startup', action='store_true', help="Time the scanner's startup instead of scanning")
+    parser.add_argument('--startup-runs', type=int, default=10, help="Interpreters started per command; the median is kept")
+    parser.add_argument('--max-startup-ms', type=float,
+                        help="Exit with status 1 if a startup median exceeds this many milliseconds")
+    parser.add_argument('--child', metavar='BASE_URL', help=argparse.SUPPRESS)
+    parser.add_argument('--workers', type=int, default=8, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(run_scenario_in_process(args.child, args.workers)))
+        return
+
+    if args.startup:
+        return run_startup_benchmark(args)
+
+    names = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    results = {}
+    for name in names:
+        runs = []
+        for run in range(1, args.repeat + 1):
+            print(f"⏱️  {name} (run {run}/{args.repeat})...", flush=True)
+            runs.append(run_scenario(name))
+        results[name] = min(runs, key=lambda result: result['scan_s'])
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)['scenarios']
+
+    print()
+    print_table(results, baseline)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'python': sys.version.split()[0], 'scenarios': results}, f, indent=2)
+        print(f"\n💾 Results saved: {args.json}")
+
+
+def run_startup_benchmark(args) -> int:
+    results = {}
+    for name, command in STARTUP_COMMANDS.items():
+        print(f"⏱️  {name} ({args.startup_runs} runs)...", flush=True)
+        results[name] = run_startup(command, args.startup_runs)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f).get('startup')
+
+    print()
+    print_startup_table(results, baseline)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'python': sys.version.split()[0], 'startup': results}, f, indent=2)
+        print(f"\n💾 Results saved: {args.json}")
+
+    slow = [name for name, result in results.items()
+            if args.max_startup_ms is not None and result['median_ms'] > args.max_startup_ms]
+    if slow:
+        print(f"\n❌ Slower than {args.max_startup_ms:g} ms: {', '.join(slow)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
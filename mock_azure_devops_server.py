@@ -0,0 +1,642 @@
+#!/usr/bin/env python3
+# mock_azure_devops_server.py
+"""
+Local stand-in for the Azure DevOps REST endpoints used by the scanner
+
+Serves a synthetic organization of configurable shape (projects x
+repositories x items, with a size distribution) so the scanner can be run
+and measured without a real tenant. Latency, throttling (429 with
+Retry-After) and server errors (503) can be injected, and full listings cut
+off or failed. Repositories can have several branches that differ from the
+default one in a few folders. JSON responses carry an ETag and answer a
+matching If-None-Match with 304.
+
+With ``--hook-url`` the server also plays the service hook: it pushes to
+random repositories (changing a few folders of main each time) and posts
+git.push events there, as Azure DevOps would to a webhook subscription.
+
+Usage:
+    python mock_azure_devops_server.py --projects 20 --repos 10 --items 5000 --port 8080
+
+then point AzureDevOpsOrgScanner at the printed URL with ``base_url``.
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from urllib.parse import parse_qs, unquote, urlparse
+
+MB = 1024 * 1024
+
+
+@dataclass
+class OrgShape:
+    """Shape and behaviour of the synthetic organization"""
+    projects: int = 5
+    repos_per_project: int = 10
+    items_per_repo: int = 2000
+    files_per_folder: int = 50
+    median_file_kb: float = 8.0  # Median of the log-normal size of ordinary files
+    size_sigma: float = 2.0  # Spread of the log-normal size of ordinary files
+    large_file_ratio: float = 0.01  # Share of files drawn between 100 MB and 2 GB
+    fork_ratio: float = 0.0  # Share of repositories that are unmodified forks of their project's first one
+    branches_per_repo: int = 1  # main, then feature/branchNN
+    branch_changed_folders: int = 2  # Folders whose files differ on each branch other than main
+    latency_ms: float = 0.0  # Added to every response
+    latency_jitter_ms: float = 0.0  # Uniform extra latency on top of latency_ms
+    throttle_rate: float = 0.0  # Share of requests answered with 429
+    throttle_retry_after: float = 1.0  # Retry-After seconds sent with a 429
+    error_rate: float = 0.0  # Share of requests answered with 503
+    full_listing_fault: str = ''  # recursionLevel=Full listings: 'truncate' cuts them off, a status like '500' fails them
+    project_page_size: int = 100  # Projects per page when the request has no $top, as the real API
+    refs_page_size: int = 1000  # Refs per page at most, as the real API's $top
+    seed: int = 1
+
+
+class SyntheticOrg:
+    """
+    Deterministic synthetic organization
+
+    Repository item lists are generated on demand from the seed and the
+    repository's position, and a few are kept in an LRU cache, so the
+    server's memory does not grow with the size of the organization.
+    """
+
+    EXTENSIONS = ['.cs', '.js', '.py', '.json', '.md', '.png', '.dll', '.zip', '.bin', '.iso', '.mp4', '']
+    ITEM_CACHE_SIZE = 32
+
+    def __init__(self, shape: OrgShape):
+        self.shape = shape
+        self.projects = [
+            {'id': self._guid('project', p), 'name': f"Project{p:03d}", 'state': 'wellFormed'}
+            for p in range(shape.projects)
+        ]
+        self._items = OrderedDict()
+        self._revisions = {}  # (project, source repository) -> pushes to main so far
+        self._pushes = 0
+        self._lock = threading.Lock()
+
+    def _guid(self, *parts) -> str:
+        digest = hashlib.sha1(':'.join(map(str, (self.shape.seed,) + parts)).encode()).hexdigest()
+        return f"{digest[:8]}-{digest[8:12]}-{digest[12:16]}-{digest[16:20]}-{digest[20:32]}"
+
+    def _source_repo(self, project_idx: int, repo_idx: int) -> int:
+        """Index of the repository whose content this one has (itself unless it is a fork)"""
+        rnd = random.Random(f"{self.shape.seed}:fork:{project_idx}:{repo_idx}")
+        if repo_idx > 0 and rnd.random() < self.shape.fork_ratio:
+            return 0
+        return repo_idx
+
+    def project_index(self, project_name: str) -> int:
+        for idx, project in enumerate(self.projects):
+            if project_name in (project['name'], project['id']):
+                return idx
+        return -1
+
+    def repositories(self, project_idx: int, base_url: str) -> List[Dict]:
+        project = self.projects[project_idx]
+        repos = []
+        for r in range(self.shape.repos_per_project):
+            name = f"repo{r:03d}"
+            repos.append({
+                'id': self._guid('repo', project_idx, r),
+                'name': name,
+                'defaultBranch': 'refs/heads/main',
+                'size': self.shape.items_per_repo * 64 * 1024,
+                'project': {'id': project['id'], 'name': project['name']},
+                'webUrl': f"{base_url}/{project['name']}/_git/{name}",
+            })
+        return repos
+
+    def repository_index(self, project_idx: int, repo_id: str) -> int:
+        for r in range(self.shape.repos_per_project):
+            if repo_id in (self._guid('repo', project_idx, r), f"repo{r:03d}"):
+                return r
+        return -1
+
+    def revision(self, project_idx: int, repo_idx: int) -> int:
+        """Number of pushes to the repository's main branch"""
+        with self._lock:
+            return self._revisions.get((project_idx, self._source_repo(project_idx, repo_idx)), 0)
+
+    def head_commit(self, project_idx: int, repo_idx: int, branch_idx: int = 0, revision: int = None) -> str:
+        """Head of a branch; main's head moves with every push unless ``revision`` is given"""
+        source = self._source_repo(project_idx, repo_idx)
+        if branch_idx == 0 and revision is None:
+            revision = self.revision(project_idx, repo_idx)
+        key = f"{self.shape.seed}:head:{project_idx}:{source}" + (f":{branch_idx}" if branch_idx else '')
+        if branch_idx == 0 and revision:
+            key += f":rev{revision}"
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    def main_version(self, project_idx: int, repo_idx: int):
+        """Listing version of main's current head: 0 before any push, then 'rev<n>'"""
+        revision = self.revision(project_idx, repo_idx)
+        return f"rev{revision}" if revision else 0
+
+    def branches(self, project_idx: int, repo_idx: int) -> List[Dict]:
+        """Refs of the repository's branches, main first"""
+        return [
+            {
+                'name': 'refs/heads/main' if b == 0 else f"refs/heads/feature/branch{b:02d}",
+                'objectId': self.head_commit(project_idx, repo_idx, b),
+            }
+            for b in range(max(1, self.shape.branches_per_repo))
+        ]
+
+    def version_of(self, project_idx: int, repo_idx: int, commit_id: str):
+        """Listing version of a commit: a branch index, 'rev<n>' for main after n pushes, or None"""
+        for b in range(1, max(1, self.shape.branches_per_repo)):
+            if self.head_commit(project_idx, repo_idx, b) == commit_id:
+                return b
+        for revision in range(self.revision(project_idx, repo_idx) + 1):
+            if self.head_commit(project_idx, repo_idx, 0, revision) == commit_id:
+                return f"rev{revision}" if revision else 0
+        return None
+
+    def push(self, project_idx: int, repo_idx: int, base_url: str) -> Dict:
+        """Push a commit changing a few folders to main and return the git.push service-hook event"""
+        old_commit = self.head_commit(project_idx, repo_idx)
+        with self._lock:
+            key = (project_idx, self._source_repo(project_idx, repo_idx))
+            self._revisions[key] = self._revisions.get(key, 0) + 1
+            self._pushes += 1
+            push_id = self._pushes
+        new_commit = self.head_commit(project_idx, repo_idx)
+
+        project = self.projects[project_idx]
+        repo = self.repositories(project_idx, base_url)[repo_idx]
+        organization = base_url.rsplit('/', 1)[1]
+        return {
+            'id': self._guid('event', push_id),
+            'eventType': 'git.push',
+            'publisherId': 'tfs',
+            'resource': {
+                'commits': [{'commitId': new_commit, 'comment': f"Synthetic push {push_id}"}],
+                'refUpdates': [{'name': 'refs/heads/main', 'oldObjectId': old_commit, 'newObjectId': new_commit}],
+                'repository': {
+                    'id': repo['id'],
+                    'name': repo['name'],
+                    'url': f"{base_url}/{project['name']}/_apis/git/repositories/{repo['id']}",
+                    'project': repo['project'],
+                    'defaultBranch': repo['defaultBranch'],
+                    # The clone URL, with the organization as user name like the service sends it
+                    'remoteUrl': repo['webUrl'].replace('://', f"://{organization}@", 1),
+                },
+                'pushId': push_id,
+                'date': datetime.now(timezone.utc).isoformat(),
+            },
+            'resourceContainers': {'project': {'id': project['id']}},
+        }
+
+    def items(self, project_idx: int, repo_idx: int, version=0) -> Dict:
+        """
+        {'all': items in Full listing order, 'folders': folder path -> folder item,
+        'children': folder path -> its direct children} of a listing version
+        (see version_of)
+        """
+        source = self._source_repo(project_idx, repo_idx)
+        key = (project_idx, source, version)
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key]
+
+        if version:
+            listing = self._generate_branch(self.items(project_idx, repo_idx), project_idx, source, version)
+        else:
+            listing = self._generate(project_idx, source)
+        with self._lock:
+            self._items[key] = listing
+            while len(self._items) > self.ITEM_CACHE_SIZE:
+                self._items.popitem(last=False)
+        return listing
+
+    def _generate(self, project_idx: int, repo_idx: int) -> Dict:
+        shape = self.shape
+        rnd = random.Random(f"{shape.seed}:items:{project_idx}:{repo_idx}")
+
+        def object_id() -> str:
+            return f"{rnd.getrandbits(160):040x}"
+
+        root = {'objectId': object_id(), 'gitObjectType': 'tree', 'path': '/', 'isFolder': True}
+        folders = {'/': root}
+        children = {'/': []}
+        all_items = [root]
+        folder_count = max(1, math.ceil(shape.items_per_repo / shape.files_per_folder))
+        mu = math.log(shape.median_file_kb * 1024)
+
+        for folder_idx in range(folder_count):
+            # Folder k nests by its decimal digits (/d1/d2 for k=12), giving a tree of bounded fan-out
+            path = '/'
+            for digit in str(folder_idx):
+                parent, path = path, f"{path.rstrip('/')}/d{digit}"
+                if path not in children:
+                    folder = {'objectId': object_id(), 'gitObjectType': 'tree', 'path': path, 'isFolder': True}
+                    folders[path] = folder
+                    children[path] = []
+                    children[parent].append(folder)
+                    all_items.append(folder)
+
+            first = folder_idx * shape.files_per_folder
+            for i in range(first, min(first + shape.files_per_folder, shape.items_per_repo)):
+                size = self._file_size(rnd, mu)
+                blob = {
+                    'objectId': object_id(),
+                    'gitObjectType': 'blob',
+                    'path': f"{path.rstrip('/')}/file{i}{rnd.choice(self.EXTENSIONS)}",
+                    'size': size,
+                }
+                children[path].append(blob)
+                all_items.append(blob)
+
+        return {'all': all_items, 'folders': folders, 'children': children}
+
+    def _file_size(self, rnd: random.Random, mu: float) -> int:
+        if rnd.random() < self.shape.large_file_ratio:
+            return rnd.randint(100 * MB, 2048 * MB)
+        return max(1, int(rnd.lognormvariate(mu, self.shape.size_sigma)))
+
+    def _generate_branch(self, base: Dict, project_idx: int, repo_idx: int, version) -> Dict:
+        """
+        The default branch's listing with the files of a few folders changed
+
+        Every other folder keeps its objectId, so branches (and pushed
+        revisions of main) share most trees like real ones do.
+        """
+        rnd = random.Random(f"{self.shape.seed}:branch:{project_idx}:{repo_idx}:{version}")
+        mu = math.log(self.shape.median_file_kb * 1024)
+        file_folders = [
+            path for path, kids in base['children'].items() if any(kid['gitObjectType'] == 'blob' for kid in kids)
+        ]
+        changed = set(rnd.sample(file_folders, min(self.shape.branch_changed_folders, len(file_folders))))
+
+        # A changed folder changes the trees of all its ancestors too
+        changed_trees = {'/'}
+        for path in changed:
+            while path != '/':
+                changed_trees.add(path)
+                path = path.rsplit('/', 1)[0] or '/'
+
+        replaced = {}
+        for item in base['all']:
+            if item['gitObjectType'] == 'tree':
+                if item['path'] in changed_trees:
+                    replaced[item['path']] = dict(item, objectId=f"{rnd.getrandbits(160):040x}")
+            elif (item['path'].rsplit('/', 1)[0] or '/') in changed:
+                replaced[item['path']] = dict(item, objectId=f"{rnd.getrandbits(160):040x}",
+                                              size=self._file_size(rnd, mu))
+
+        return {
+            'all': [replaced.get(item['path'], item) for item in base['all']],
+            'folders': {path: replaced.get(path, folder) for path, folder in base['folders'].items()},
+            'children': {
+                path: [replaced.get(kid['path'], kid) for kid in kids] for path, kids in base['children'].items()
+            },
+        }
+
+
+class MockAzureDevOpsHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, like the real service
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        parts = [unquote(part) for part in url.path.strip('/').split('/')]
+
+        server.record('requests')
+        shape = server.org.shape
+        delay = shape.latency_ms + random.uniform(0, shape.latency_jitter_ms)
+        if delay:
+            time.sleep(delay / 1000)
+
+        roll = server.roll()
+        if roll < shape.throttle_rate:
+            server.record('throttled')
+            self._send_status(429, {'Retry-After': f"{shape.throttle_retry_after:g}"})
+            return
+        if roll < shape.throttle_rate + shape.error_rate:
+            server.record('errors')
+            self._send_status(503)
+            return
+
+        # {org}/_apis/projects
+        if parts[-2:] == ['_apis', 'projects']:
+            self._send_projects(query)
+            return
+
+        # {org}/{project}/_apis/git/repositories[/{id}/refs|/{id}/items]
+        try:
+            api = parts.index('_apis')
+        except ValueError:
+            self._send_status(404)
+            return
+        project_idx = server.org.project_index(parts[api - 1])
+        if project_idx < 0 or parts[api + 1:api + 3] != ['git', 'repositories']:
+            self._send_status(404)
+            return
+
+        rest = parts[api + 3:]
+        if not rest:
+            repos = server.org.repositories(project_idx, server.base_url)
+            self._send_json({'count': len(repos), 'value': repos})
+            return
+
+        repo_idx = server.org.repository_index(project_idx, rest[0])
+        if repo_idx < 0 or len(rest) < 2:
+            self._send_status(404)
+            return
+        if rest[1:] == ['diffs', 'commits']:
+            self._send_diff(project_idx, repo_idx, query)
+        elif len(rest) != 2:
+            self._send_status(404)
+        elif rest[1] == 'refs':
+            prefix = 'refs/' + query.get('filter', '')
+            refs = [ref for ref in server.org.branches(project_idx, repo_idx) if ref['name'].startswith(prefix)]
+            top = min(int(query.get('$top', server.org.shape.refs_page_size)), server.org.shape.refs_page_size)
+            self._send_page(refs, top, query)
+        elif rest[1] == 'items':
+            version = server.org.main_version(project_idx, repo_idx)
+            if 'versionDescriptor.version' in query:
+                version = server.org.version_of(project_idx, repo_idx, query['versionDescriptor.version'])
+                if version is None:
+                    self._send_status(404)
+                    return
+            self._send_items(server.org.items(project_idx, repo_idx, version), query)
+        else:
+            self._send_status(404)
+
+    def _send_diff(self, project_idx: int, repo_idx: int, query: Dict):
+        """Blob changes between two commits (diffs/commits), paged with $top/$skip"""
+        org = self.server.org
+        base = org.version_of(project_idx, repo_idx, query.get('baseVersion', ''))
+        target = org.version_of(project_idx, repo_idx, query.get('targetVersion', ''))
+        if base is None or target is None:
+            self._send_status(404)
+            return
+
+        def blobs(version) -> Dict:
+            return {item['path']: item for item in org.items(project_idx, repo_idx, version)['all']
+                    if item['gitObjectType'] == 'blob'}
+
+        old, new = blobs(base), blobs(target)
+        changes = []
+        for path in sorted(old.keys() | new.keys()):
+            if path not in old:
+                change_type = 'add'
+            elif path not in new:
+                change_type = 'delete'
+            elif old[path]['objectId'] != new[path]['objectId']:
+                change_type = 'edit'
+            else:
+                continue
+            item = new.get(path) or old[path]
+            changes.append({
+                'item': {'objectId': item['objectId'], 'gitObjectType': 'blob', 'path': path},
+                'changeType': change_type,
+            })
+
+        top = int(query.get('$top', 100))
+        skip = int(query.get('$skip', 0))
+        self._send_json({
+            'changeCounts': {change_type: sum(1 for c in changes if c['changeType'] == change_type)
+                             for change_type in ('add', 'edit', 'delete')},
+            'changes': changes[skip:skip + top],
+            'allChangesIncluded': skip + top >= len(changes),
+            'baseCommit': query['baseVersion'],
+            'targetCommit': query['targetVersion'],
+        })
+
+    def _send_projects(self, query: Dict):
+        self._send_page(self.server.org.projects, int(query.get('$top', self.server.org.shape.project_page_size)), query)
+
+    def _send_page(self, values: List[Dict], top: int, query: Dict):
+        """One page of ``top`` values, with x-ms-continuationtoken while more remain"""
+        skip = int(query.get('continuationToken', query.get('$skip', 0)))
+        page = values[skip:skip + top]
+        headers = {}
+        if skip + top < len(values):
+            headers['x-ms-continuationtoken'] = str(skip + top)
+        self._send_json({'count': len(page), 'value': page}, headers)
+
+    def _send_items(self, listing: Dict, query: Dict):
+        if query.get('recursionLevel') == 'OneLevel':
+            scope = query.get('scopePath', '/')
+            if scope not in listing['folders']:
+                self._send_status(404)
+                return
+            items = [listing['folders'][scope]] + listing['children'][scope]
+            self._send_json({'count': len(items), 'value': items})
+            return
+
+        fault = self.server.org.shape.full_listing_fault
+        if fault and fault != 'truncate':
+            self.server.record('errors')
+            self._send_status(int(fault))
+            return
+
+        # Full listing, streamed in chunks like the real service
+        all_items = listing['all']
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        self._write_chunk(f'{{"count":{len(all_items)},"value":['.encode())
+        for start in range(0, len(all_items), 1000):
+            batch = ','.join(json.dumps(item) for item in all_items[start:start + 1000])
+            self._write_chunk(((',' if start else '') + batch).encode())
+            if fault == 'truncate':
+                # Drop the connection mid-body, like a listing cut off by a gateway timeout
+                self.server.record('errors')
+                self.close_connection = True
+                return
+        self._write_chunk(b']}')
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b'\r\n')
+        self.server.record('bytes_sent', len(data))
+
+    def _send_json(self, body, headers: Dict = None):
+        data = json.dumps(body).encode()
+        etag = f'"{hashlib.sha1(data).hexdigest()[:16]}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.server.record('not_modified')
+            self._send_status(304, {'ETag': etag})
+            return
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+        self.server.record('bytes_sent', len(data))
+
+    def _send_status(self, status: int, headers: Dict = None):
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+
+
+class MockAzureDevOpsServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server for a SyntheticOrg
+
+    ``base_url`` is the organization URL to pass to AzureDevOpsOrgScanner;
+    ``stats`` counts requests, injected failures and bytes sent.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, shape: OrgShape, host: str = '127.0.0.1', port: int = 0, organization: str = 'mockorg'):
+        super().__init__((host, port), MockAzureDevOpsHandler)
+        self.org = SyntheticOrg(shape)
+        self.base_url = f"http://{host}:{self.server_address[1]}/{organization}"
+        self.stats = {'requests': 0, 'throttled': 0, 'errors': 0, 'not_modified': 0, 'bytes_sent': 0,
+                      'pushes_sent': 0}
+        self._random = random.Random(shape.seed)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def handle_error(self, request, client_address):
+        # Clients stop reading a listing early (e.g. a shared tree), which is not an error
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+    def roll(self) -> float:
+        with self._lock:
+            return self._random.random()
+
+    def record(self, counter: str, amount: int = 1):
+        with self._lock:
+            self.stats[counter] += amount
+
+    def start(self) -> 'MockAzureDevOpsServer':
+        """Serve on a background thread"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def push(self, project_idx: int, repo_idx: int, hook_url: str) -> Dict:
+        """Push to main of a repository and post the git.push event to ``hook_url``"""
+        event = self.org.push(project_idx, repo_idx, self.base_url)
+        request = urllib.request.Request(
+            hook_url, data=json.dumps(event).encode(), headers={'Content-Type': 'application/json'}, method='POST'
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=10) as response:
+                response.read()
+        except (urllib.error.URLError, OSError) as e:
+            print(f"Hook delivery failed: {e}", file=sys.stderr)
+        self.record('pushes_sent')
+        return event
+
+    def send_pushes(self, hook_url: str, interval: float, burst: int = 1, stop: threading.Event = None):
+        """
+        Act as the service hook: every ``interval`` seconds push ``burst``
+        times in a row to one random repository, until ``stop`` is set
+        """
+        rnd = random.Random(self.org.shape.seed)
+        stop = stop or threading.Event()
+        while not stop.wait(interval):
+            project_idx = rnd.randrange(self.org.shape.projects)
+            repo_idx = rnd.randrange(self.org.shape.repos_per_project)
+            for _ in range(burst):
+                self.push(project_idx, repo_idx, hook_url)
+
+
+def shape_arguments(parser: argparse.ArgumentParser):
+    """Add the OrgShape options to an argument parser"""
+    defaults = OrgShape()
+    parser.add_argument('--projects', type=int, default=defaults.projects)
+    parser.add_argument('--repos', type=int, default=defaults.repos_per_project, help="Repositories per project")
+    parser.add_argument('--items', type=int, default=defaults.items_per_repo, help="Files per repository")
+    parser.add_argument('--large-file-ratio', type=float, default=defaults.large_file_ratio)
+    parser.add_argument('--fork-ratio', type=float, default=defaults.fork_ratio)
+    parser.add_argument('--branches', type=int, default=defaults.branches_per_repo, help="Branches per repository")
+    parser.add_argument('--branch-changed-folders', type=int, default=defaults.branch_changed_folders)
+    parser.add_argument('--project-page-size', type=int, default=defaults.project_page_size,
+                        help="Projects per page when the request has no $top")
+    parser.add_argument('--refs-page-size', type=int, default=defaults.refs_page_size, help="Refs per page at most")
+    parser.add_argument('--latency-ms', type=float, default=defaults.latency_ms)
+    parser.add_argument('--latency-jitter-ms', type=float, default=defaults.latency_jitter_ms)
+    parser.add_argument('--throttle-rate', type=float, default=defaults.throttle_rate)
+    parser.add_argument('--throttle-retry-after', type=float, default=defaults.throttle_retry_after)
+    parser.add_argument('--error-rate', type=float, default=defaults.error_rate)
+    parser.add_argument('--full-listing-fault', default=defaults.full_listing_fault,
+                        help="'truncate' or an HTTP status answered to every recursionLevel=Full listing")
+    parser.add_argument('--seed', type=int, default=defaults.seed)
+
+
+def shape_from_args(args) -> OrgShape:
+    return OrgShape(
+        projects=args.projects,
+        repos_per_project=args.repos,
+        items_per_repo=args.items,
+        large_file_ratio=args.large_file_ratio,
+        fork_ratio=args.fork_ratio,
+        branches_per_repo=args.branches,
+        branch_changed_folders=args.branch_changed_folders,
+        project_page_size=args.project_page_size,
+        refs_page_size=args.refs_page_size,
+        latency_ms=args.latency_ms,
+        latency_jitter_ms=args.latency_jitter_ms,
+        throttle_rate=args.throttle_rate,
+        throttle_retry_after=args.throttle_retry_after,
+        error_rate=args.error_rate,
+        full_listing_fault=args.full_listing_fault,
+        seed=args.seed,
+    )
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Serve a synthetic Azure DevOps organization for local scans")
+    shape_arguments(parser)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080, help="0 picks a free port")
+    parser.add_argument('--organization', default='mockorg')
+    parser.add_argument('--hook-url', help="Post git.push service-hook events here (e.g. the scanner's watch mode)")
+    parser.add_argument('--push-interval', type=float, default=5.0, help="Seconds between pushes with --hook-url")
+    parser.add_argument('--push-burst', type=int, default=1, help="Pushes in a row to the same repository")
+    args = parser.parse_args(argv)
+
+    server = MockAzureDevOpsServer(shape_from_args(args), args.host, args.port, args.organization)
+    print(server.base_url, flush=True)
+    if args.hook_url:
+        threading.Thread(target=server.send_pushes, args=(args.hook_url, args.push_interval, args.push_burst),
+                         daemon=True).start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Served: {server.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Shared fixtures: synthetic organizations served by mock_azure_devops_server
+
+Every test talks HTTP to a MockAzureDevOpsServer on an ephemeral localhost
+port, so the scanner runs end to end exactly as against a real tenant.
+"""
+
+import pytest
+
+from azure_devops_large_files_scanner import AzureDevOpsOrgScanner
+from mock_azure_devops_server import MockAzureDevOpsServer, OrgShape
+
+# Small, but with large files, forks sharing trees and several projects
+SMALL_ORG = dict(projects=3, repos_per_project=4, items_per_repo=300, large_file_ratio=0.05, fork_ratio=0.5)
+
+# Totals that must not depend on how a scan was run
+SNAPSHOT_KEYS = (
+    'total_projects', 'total_repos', 'total_files_scanned', 'total_large_files', 'total_size',
+    'unique_large_files', 'unique_size', 'unique_blob_count', 'unique_blob_bytes',
+)
+
+
+@pytest.fixture
+def mock_org():
+    """Start a mock organization: ``mock_org(organization='mockorg', **OrgShape fields)``"""
+    servers = []
+
+    def start(organization: str = 'mockorg', **shape) -> MockAzureDevOpsServer:
+        server = MockAzureDevOpsServer(OrgShape(**dict(SMALL_ORG, **shape)), organization=organization).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture
+def make_scanner():
+    """Scanner for a mock organization: ``make_scanner(server, **AzureDevOpsOrgScanner options)``"""
+    def make(server: MockAzureDevOpsServer, **options) -> AzureDevOpsOrgScanner:
+        organization = server.base_url.rsplit('/', 1)[1]
+        return AzureDevOpsOrgScanner(organization, 'test-token', base_url=server.base_url, **options)
+
+    return make
+
+
+@pytest.fixture
+def snapshot():
+    """Everything a report shows, in a form two scans can be compared by"""
+    def take(results, keys=SNAPSHOT_KEYS):
+        files = sorted(
+            (f['project'], f['repository'], f['file_path'], f['size_bytes'], f['object_id'], f.get('branches') or '')
+            for f in results['large_files']
+        )
+        return {
+            'totals': {key: results[key] for key in keys},
+            'files': files,
+            'repo_stats': results['repo_stats'],
+            'project_stats': results['project_stats'],
+            'failed_repos': results['failed_repos'],
+        }
+
+    return take
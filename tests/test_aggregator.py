@@ -0,0 +1,60 @@
+"""ScanAggregator: totals and top files in one pass"""
+
+import random
+
+import pytest
+
+from azure_devops_large_files_scanner import ScanAggregator
+
+
+def record(i, size):
+    return {'project': f"P{i % 3}", 'repository': f"r{i % 5}", 'file_path': f"/f{i}",
+            'extension': ('.bin', '.zip', 'no extension')[i % 3], 'size_bytes': size}
+
+
+def brute_force(files, key):
+    totals = {}
+    for f in files:
+        stats = totals.setdefault(key(f), {'count': 0, 'total_size': 0})
+        stats['count'] += 1
+        stats['total_size'] += f['size_bytes']
+    return totals
+
+
+@pytest.mark.parametrize('top_k', [1, 3, 10, 500])
+def test_top_files_tie_like_a_stable_sort(top_k):
+    rnd = random.Random(top_k)
+    files = [record(i, rnd.choice([1, 2, 3, 5, 8]) << 20) for i in range(300)]
+    aggregator = ScanAggregator.from_files(files, top_k)
+
+    expected = sorted(files, key=lambda f: f['size_bytes'], reverse=True)[:top_k]
+    assert [f['file_path'] for f in aggregator.top_files()] == [f['file_path'] for f in expected]
+    assert [f['file_path'] for f in aggregator.top_files(2)] == [f['file_path'] for f in expected[:2]]
+
+
+def test_totals_match_a_second_pass():
+    rnd = random.Random(5)
+    files = [record(i, rnd.randrange(1, 1 << 30)) for i in range(1000)]
+    aggregator = ScanAggregator.from_files(files)
+
+    assert aggregator.extension_stats == brute_force(files, lambda f: f['extension'])
+    assert aggregator.repo_totals == brute_force(files, lambda f: (f['project'], f['repository']))
+    assert aggregator.project_totals == brute_force(files, lambda f: f['project'])
+    sizes = [stats['total_size'] for _, stats in aggregator.sorted_extensions()]
+    assert sizes == sorted(sizes, reverse=True)
+
+
+def test_aggregator_rebuilt_from_the_large_files_equals_the_scans(mock_org, make_scanner):
+    # Forks repeat their source's large files, so equal sizes tie across repositories
+    server = mock_org(large_file_ratio=0.1, fork_ratio=0.75)
+    results = make_scanner(server, max_workers=4).scan_organization()
+    scanned = results['aggregator']
+    rebuilt = ScanAggregator.from_files(results['large_files'], scanned.top_k)
+
+    sizes = [f['size_bytes'] for f in results['large_files']]
+    assert len(set(sizes)) < len(sizes)
+    assert [dict(f) for f in rebuilt.top_files()] == [dict(f) for f in scanned.top_files()]
+    assert rebuilt.extension_stats == scanned.extension_stats
+    assert rebuilt.repo_totals == scanned.repo_totals
+    assert rebuilt.project_totals == scanned.project_totals
+    assert rebuilt.sorted_extensions() == scanned.sorted_extensions()
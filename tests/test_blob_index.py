@@ -0,0 +1,40 @@
+"""BlobIndex: fork deduplication and its packed JSON form"""
+
+import pytest
+
+from azure_devops_large_files_scanner import BlobDigests, BlobIndex
+
+
+def fork_count(server):
+    org, shape = server.org, server.org.shape
+    return sum(
+        org._source_repo(project_idx, repo_idx) != repo_idx
+        for project_idx in range(shape.projects) for repo_idx in range(shape.repos_per_project)
+    )
+
+
+@pytest.mark.parametrize('workers', [1, 2, 8, 16])
+def test_every_fork_is_deduplicated_whatever_the_worker_count(mock_org, make_scanner, workers):
+    # Latency keeps a fork's listing in flight while its source is still being listed
+    server = mock_org(repos_per_project=8, fork_ratio=0.6, latency_ms=5)
+    forks = fork_count(server)
+    assert forks > 0
+
+    results = make_scanner(server, max_workers=workers).scan_organization()
+
+    assert results['repos_deduplicated'] == forks
+    assert results['total_repos'] == 3 * 8
+
+
+def test_index_and_repository_digests_share_one_json_form():
+    object_ids = [(f"{i:040x}", i * 1000) for i in range(1, 50)] + [('f' * 64, 7), ('not-a-sha', 9)]
+    index, digests = BlobIndex(), BlobDigests()
+    for object_id, size in object_ids:
+        index.add_blob(object_id, size)
+        digests.add(object_id, size)
+    index.add_blob(object_ids[0][0], object_ids[0][1])  # Seen twice, stored once
+
+    assert index.to_dict() == digests.to_dict()
+    restored = BlobIndex.from_dict(index.to_dict())
+    assert restored.blobs == index.blobs
+    assert restored.unique_blob_bytes == index.unique_blob_bytes == sum(size for _, size in object_ids)
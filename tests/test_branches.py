@@ -0,0 +1,63 @@
+"""Multi-branch scans"""
+
+import pytest
+
+BRANCH_ORG = dict(branches_per_repo=3, large_file_ratio=0.2, files_per_folder=20)
+
+
+def expected_branches(server, branch_indices):
+    """(project, repository, blob objectId) -> names of the branches containing the blob"""
+    org = server.org
+    expected = {}
+    for project_idx, project in enumerate(org.projects):
+        for repo_idx, repo in enumerate(org.repositories(project_idx, server.base_url)):
+            for branch_idx in branch_indices:
+                name = org.branches(project_idx, repo_idx)[branch_idx]['name'][len('refs/heads/'):]
+                for item in org.items(project_idx, repo_idx, branch_idx)['all']:
+                    if item['gitObjectType'] == 'blob' and item['size'] >= 100 * 1024 * 1024:
+                        key = (project['name'], repo['name'], item['objectId'])
+                        expected.setdefault(key, set()).add(name)
+    return expected
+
+
+def found_branches(results):
+    return {
+        (f['project'], f['repository'], f['object_id']): set(f['branches'].split(', '))
+        for f in results['large_files']
+    }
+
+
+def test_every_matching_branch_is_scanned(mock_org, make_scanner):
+    server = mock_org(**BRANCH_ORG)
+    results = make_scanner(server, max_workers=4, branches=['*']).scan_organization()
+
+    expected = expected_branches(server, range(3))
+    assert any(len(names) < 3 for names in expected.values())
+    assert found_branches(results) == expected
+
+
+def test_only_branches_matching_a_pattern_are_scanned(mock_org, make_scanner):
+    server = mock_org(**BRANCH_ORG)
+    results = make_scanner(server, max_workers=4, branches=['feature/branch02']).scan_organization()
+
+    assert found_branches(results) == expected_branches(server, (0, 2))
+
+
+def test_branch_results_do_not_depend_on_worker_count(mock_org, make_scanner, snapshot):
+    server = mock_org(**BRANCH_ORG)
+    baseline = make_scanner(server, max_workers=1, branches=['*']).scan_organization()
+    results = make_scanner(server, max_workers=8, branches=['*']).scan_organization()
+
+    assert snapshot(results) == snapshot(baseline)
+
+
+@pytest.mark.parametrize('page_size', [4, 1000])
+def test_refs_are_read_past_the_first_page(mock_org, make_scanner, page_size):
+    server = mock_org(projects=1, repos_per_project=1, branches_per_repo=25, refs_page_size=page_size)
+    scanner = make_scanner(server, branches=['*'])
+    scanner.REFS_PAGE_SIZE = page_size
+    repo = scanner.get_repositories_in_project('Project000')[0]
+
+    branches = scanner.get_branches('Project000', repo)
+    assert [name for name, _ in branches] == ['main'] + [f"feature/branch{b:02d}" for b in range(1, 25)]
+    assert scanner.get_default_branch_head('Project000', repo) == branches[0][1]
@@ -0,0 +1,104 @@
+"""Interrupting a checkpointed scan and resuming it"""
+
+import pytest
+
+import azure_devops_large_files_scanner as scanner_module
+
+
+def interrupt_after(scanner, repositories: int):
+    """Make the scanner fail like Ctrl-C once ``repositories`` repositories were scanned"""
+    scan_repository = scanner._scan_repository
+    calls = []
+
+    def scan(*args, **kwargs):
+        calls.append(args[1]['id'])
+        if len(calls) > repositories:
+            raise KeyboardInterrupt
+        return scan_repository(*args, **kwargs)
+
+    scanner._scan_repository = scan
+    return calls
+
+
+def count_scans(scanner):
+    scan_repository = scanner._scan_repository
+    calls = []
+
+    def scan(*args, **kwargs):
+        calls.append(args[1]['id'])
+        return scan_repository(*args, **kwargs)
+
+    scanner._scan_repository = scan
+    return calls
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_resumed_scan_matches_an_uninterrupted_one(mock_org, make_scanner, snapshot, tmp_path, workers):
+    server = mock_org()
+    journal = str(tmp_path / 'scan.checkpoint.jsonl')
+    fresh = make_scanner(server, max_workers=workers).scan_organization()
+
+    interrupted = make_scanner(server, max_workers=workers, checkpoint_path=journal)
+    interrupt_after(interrupted, 5)
+    with pytest.raises(KeyboardInterrupt):
+        interrupted.scan_organization()
+
+    resumed = make_scanner(server, max_workers=workers, checkpoint_path=journal)
+    scanned = count_scans(resumed)
+    results = resumed.scan_organization(resume=True)
+
+    assert 0 < len(scanned) < results['total_repos']
+    assert snapshot(results) == snapshot(fresh)
+
+
+def test_torn_last_record_is_ignored(mock_org, make_scanner, snapshot, tmp_path):
+    server = mock_org()
+    journal = tmp_path / 'scan.checkpoint.jsonl'
+    fresh = make_scanner(server, max_workers=2).scan_organization()
+
+    interrupted = make_scanner(server, max_workers=2, checkpoint_path=str(journal))
+    interrupt_after(interrupted, 6)
+    with pytest.raises(KeyboardInterrupt):
+        interrupted.scan_organization()
+    with open(journal, 'a', encoding='utf-8') as f:
+        f.write('{"type": "repository", "repo_id": "torn')
+
+    results = make_scanner(server, max_workers=2, checkpoint_path=str(journal)).scan_organization(resume=True)
+    assert snapshot(results) == snapshot(fresh)
+
+
+def test_journal_of_another_threshold_is_not_resumed(mock_org, make_scanner, tmp_path):
+    server = mock_org()
+    journal = str(tmp_path / 'scan.checkpoint.jsonl')
+    interrupted = make_scanner(server, max_workers=2, checkpoint_path=journal)
+    interrupt_after(interrupted, 6)
+    with pytest.raises(KeyboardInterrupt):
+        interrupted.scan_organization()
+
+    rescan = make_scanner(server, max_workers=2, checkpoint_path=journal, min_size_mb=200)
+    scanned = count_scans(rescan)
+    rescan.scan_organization(resume=True)
+    assert len(scanned) == 12
+
+
+@pytest.mark.parametrize('arguments, journal', [
+    ([], None),
+    (['--checkpoint'], 'scan_checkpoint_mockorg.jsonl'),
+    (['--checkpoint', 'progress.jsonl'], 'progress.jsonl'),
+    (['--resume'], 'scan_checkpoint_mockorg.jsonl'),
+])
+def test_command_line_journals_only_when_asked(mock_org, tmp_path, monkeypatch, arguments, journal):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('AZURE_DEVOPS_TOKEN', 'test-token')
+    server = mock_org()
+    scan_organization = scanner_module.AzureDevOpsOrgScanner.scan_organization
+    journals = []
+
+    def recording(self, *args, **kwargs):
+        journals.append(self.checkpoint.path if self.checkpoint is not None else None)
+        return scan_organization(self, *args, **kwargs)
+
+    monkeypatch.setattr(scanner_module.AzureDevOpsOrgScanner, 'scan_organization', recording)
+    scanner_module.main(['scan', *arguments, '--org', 'mockorg', '--base-url', server.base_url, '--format', 'none'])
+
+    assert journals == [journal]
@@ -0,0 +1,75 @@
+"""The command line: scan, merge and db report against a mock organization"""
+
+import pytest
+
+import azure_devops_large_files_scanner as scanner_module
+from azure_devops_large_files_scanner import main
+
+openpyxl = pytest.importorskip('openpyxl')
+
+# Many files of a few hundred KB, so fractional thresholds matter
+SMALL_FILES_ORG = dict(projects=2, repos_per_project=2, items_per_repo=200, median_file_kb=300, large_file_ratio=0.0)
+
+
+@pytest.fixture
+def cli(mock_org, tmp_path, monkeypatch):
+    """Run main() in an empty directory against a mock organization: ``cli(*arguments)``"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('AZURE_DEVOPS_TOKEN', 'test-token')
+    server = mock_org(**SMALL_FILES_ORG)
+
+    def run(*arguments):
+        if arguments[0] == 'scan':
+            arguments += ('--org', 'mockorg', '--base-url', server.base_url)
+        assert main(list(arguments)) in (None, 0)
+
+    return run
+
+
+def files_sheets(path):
+    workbook = openpyxl.load_workbook(path, read_only=True)
+    return {ws.title: [row for row in ws.iter_rows(min_row=2, values_only=True)]
+            for ws in workbook.worksheets if ws.title.startswith('Large Files')}
+
+
+@pytest.mark.parametrize('threshold, title', [('0.3', 'Large Files (≥0.3MB)'), ('2', 'Large Files (≥2MB)')])
+def test_every_report_is_labelled_with_the_threshold(cli, tmp_path, threshold, title):
+    cli('scan', '--min-size-mb', threshold, '-o', 'full', '--format', 'xlsx', '--database', 'scans.db')
+    for shard in ('1/2', '2/2'):
+        cli('scan', '--min-size-mb', threshold, '--shard', shard)
+    cli('merge', *sorted(str(path) for path in tmp_path.glob('*.partial.json')), '-o', 'merged.xlsx')
+    cli('db', 'scans.db', 'report', '-o', 'stored.xlsx')
+
+    scanned = files_sheets('full.xlsx')
+    assert list(scanned) == [title]
+    assert len(scanned[title]) > 0
+    assert files_sheets('merged.xlsx') == scanned
+    assert files_sheets('stored.xlsx') == scanned
+
+
+def test_scan_without_a_token_fails(mock_org, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv('AZURE_DEVOPS_TOKEN', raising=False)
+    server = mock_org(**SMALL_FILES_ORG)
+
+    with pytest.raises(SystemExit) as exit_info:
+        main(['scan', '--org', 'mockorg', '--base-url', server.base_url])
+    assert exit_info.value.code == 2
+    assert server.stats['requests'] == 0
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_watch_runs_without_the_scan_only_options(mock_org, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('AZURE_DEVOPS_TOKEN', 'test-token')
+    server = mock_org(**SMALL_FILES_ORG)
+    watched = []
+    monkeypatch.setattr(scanner_module, 'run_watch', lambda scanner, args: watched.append((scanner, args)))
+
+    assert main(['watch', '--org', 'mockorg', '--base-url', server.base_url, '--min-size-mb', '0.5', '--port', '0']) is None
+
+    (scanner, args), = watched
+    assert (scanner.organization, scanner.min_size_mb, scanner.max_workers) == ('mockorg', 0.5, 8)
+    assert scanner.cache is None and scanner.checkpoint is None
+    assert args.formats == ['xlsx']
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,101 @@
+"""ScanDatabase: storing scans, reading them back and trend queries"""
+
+import pytest
+
+from azure_devops_large_files_scanner import ScanDatabase
+
+LARGE = 100 * 1024 * 1024
+
+
+@pytest.fixture
+def database(tmp_path):
+    database = ScanDatabase(str(tmp_path / 'scans.db'))
+    yield database
+    database.close()
+
+
+def store(database, scanner, results, scanned_at):
+    return database.add_scan(results, scanner.organization, scanner.min_size_bytes, scanned_at)
+
+
+def large_paths(server, project_idx, repo_idx):
+    org = server.org
+    listing = org.items(project_idx, repo_idx, org.main_version(project_idx, repo_idx))
+    return {item['path'] for item in listing['all'] if item['gitObjectType'] == 'blob' and item['size'] >= LARGE}
+
+
+def test_stored_scan_reads_back_unchanged(mock_org, make_scanner, snapshot, database):
+    server = mock_org()
+    scanner = make_scanner(server, max_workers=4)
+    results = scanner.scan_organization()
+    scan_id = store(database, scanner, results, '2026-01-01T00:00:00')
+
+    loaded = database.load_results(scan_id)
+    assert snapshot(loaded) == snapshot(results)
+    assert loaded['scan']['organization'] == 'mockorg'
+    assert loaded['scan']['min_size_bytes'] == scanner.min_size_bytes
+    assert [f['size_bytes'] for f in database.top_files(scan_id, 5)] == sorted(
+        (f['size_bytes'] for f in results['large_files']), reverse=True)[:5]
+    by_project = {row['name']: row['total_size'] for row in database.totals_by(scan_id, 'project')}
+    assert by_project == {
+        stat['project']: sum(f['size_bytes'] for f in results['large_files'] if f['project'] == stat['project'])
+        for stat in results['project_stats']
+    }
+
+
+def test_trend_queries_follow_pushes(mock_org, make_scanner, database):
+    server = mock_org(fork_ratio=0.0, large_file_ratio=0.2, files_per_folder=20)
+    scanner = make_scanner(server, max_workers=4)
+    first = store(database, scanner, scanner.scan_organization(), '2026-01-01T00:00:00')
+    before = {repo_idx: large_paths(server, 0, repo_idx) for repo_idx in range(4)}
+
+    for repo_idx in range(4):
+        server.org.push(0, repo_idx, server.base_url)
+    scanner = make_scanner(server, max_workers=4)
+    second = store(database, scanner, scanner.scan_organization(), '2026-01-02T00:00:00')
+    after = {repo_idx: large_paths(server, 0, repo_idx) for repo_idx in range(4)}
+
+    added = {('Project000', f"repo{r:03d}", path) for r in range(4) for path in after[r] - before[r]}
+    removed = {('Project000', f"repo{r:03d}", path) for r in range(4) for path in before[r] - after[r]}
+    assert added or removed
+    assert {(f['project'], f['repository'], f['file_path']) for f in database.files_added(second, first)} == added
+    assert {(f['project'], f['repository'], f['file_path']) for f in database.files_removed(second, first)} == removed
+
+    assert database.latest_scan_id('mockorg') == second
+    assert database.previous_scan_id(second) == first
+    growth = {(row['project'], row['repository']): row for row in database.repository_growth('mockorg')}
+    for (project, repository), row in growth.items():
+        assert [point['scan_id'] for point in row['series']] == [first, second]
+        if project != 'Project000':
+            assert row['change_mb'] == 0
+    assert {row['repository'] for row in database.repository_growth('mockorg', 'Project001')} == {
+        repository for project, repository in growth if project == 'Project001'}
+
+
+def test_organizations_with_the_same_names_stay_apart(mock_org, make_scanner, snapshot, database):
+    # Same project and repository names, different content
+    alpha_server = mock_org(organization='alpha', seed=1)
+    beta_server = mock_org(organization='beta', seed=2)
+    alpha, beta = make_scanner(alpha_server, max_workers=4), make_scanner(beta_server, max_workers=4)
+    alpha_results, beta_results = alpha.scan_organization(), beta.scan_organization()
+
+    alpha_first = store(database, alpha, alpha_results, '2026-01-01T00:00:00')
+    beta_scan = store(database, beta, beta_results, '2026-01-01T00:00:00')
+    alpha_second = store(database, alpha, alpha_results, '2026-01-02T00:00:00')
+
+    assert snapshot(database.load_results(beta_scan)) == snapshot(beta_results)
+    assert snapshot(database.load_results(alpha_second)) == snapshot(alpha_results)
+    assert all('/alpha/' in f['repo_url'] for f in database.load_results(alpha_second)['large_files'])
+    assert database.files_added(alpha_second, alpha_first) == []
+    assert database.previous_scan_id(alpha_second) == alpha_first
+    assert database.latest_scan_id('beta') == beta_scan
+
+    alpha_project = {(f['repository'], f['file_path']) for f in alpha_results['large_files'] if f['project'] == 'Project000'}
+    assert {(f['repository'], f['file_path']) for f in database.top_files(alpha_second, 1000, project='Project000')} == alpha_project
+
+    growth = database.repository_growth('beta')
+    assert {(row['project'], row['repository']) for row in growth} == {
+        (stat['project'], stat['repository']) for stat in beta_results['repo_stats']}
+    for row in growth:
+        assert len(row['series']) == 1
+
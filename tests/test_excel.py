@@ -0,0 +1,49 @@
+"""Excel export: the streaming workbook against the regular one"""
+
+import random
+
+import pytest
+
+from azure_devops_large_files_scanner import LargeFileStore
+
+openpyxl = pytest.importorskip('openpyxl')
+
+
+def rows_by_sheet(path):
+    workbook = openpyxl.load_workbook(path, read_only=True)
+    return {ws.title: [row for row in ws.iter_rows(values_only=True)] for ws in workbook.worksheets}
+
+
+def test_iter_by_size_matches_a_stable_sort():
+    rnd = random.Random(3)
+    store = LargeFileStore(
+        {'project': 'P', 'repository': f"r{i % 7}", 'repo_url': '', 'file_path': f"/f{i}",
+         'size_bytes': rnd.choice([1, 2, 3, 5]) << 20, 'object_id': f"{i:040x}"}
+        for i in range(5000)
+    )
+    store.SORT_RUN_ROWS = 333  # Several runs, with equal sizes spread across them
+
+    expected = [f['file_path'] for f in sorted(store, key=lambda f: f['size_bytes'], reverse=True)]
+    assert [f['file_path'] for f in store.iter_by_size()] == expected
+    assert list(LargeFileStore().iter_by_size()) == []
+
+
+@pytest.mark.parametrize('branches', [None, ['*']])
+def test_streaming_export_writes_the_regular_workbook(mock_org, make_scanner, tmp_path, branches):
+    server = mock_org(items_per_repo=400, large_file_ratio=0.1, branches_per_repo=2)
+    scanner = make_scanner(server, max_workers=4, branches=branches)
+    results = scanner.scan_organization()
+
+    regular = rows_by_sheet(scanner.export_to_excel(results, str(tmp_path / 'regular.xlsx'), streaming=False))
+    scanner.EXCEL_MAX_ROWS = 50  # Spill the files into continuation sheets
+    streamed = rows_by_sheet(scanner.export_to_excel(results, str(tmp_path / 'streamed.xlsx'), streaming=True))
+
+    title = scanner._files_sheet_title()
+    continuation = [name for name in streamed if name.startswith(title)]
+    assert len(continuation) > 1
+    header = streamed[continuation[0]][0]
+    assert ('Branches' in header) == bool(branches)
+    spilled = [row for name in continuation for row in streamed[name][1:]]
+    assert [header] + spilled == regular[title]
+    for name in ('Repository Stats', 'Project Stats', 'By Extension'):
+        assert streamed[name] == regular[name]
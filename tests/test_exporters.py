@@ -0,0 +1,148 @@
+"""Streaming exporters: CSV, JSON Lines and Parquet outputs of a scan"""
+
+import csv
+import importlib.util
+import json
+
+import pytest
+
+import azure_devops_large_files_scanner as scanner_module
+from azure_devops_large_files_scanner import (
+    FILE_RECORD_FIELDS, REPO_STAT_FIELDS, CsvExporter, JsonLinesExporter, ParquetExporter, ScanDatabase, main,
+)
+
+EXPORTER_ORG = dict(items_per_repo=400, large_file_ratio=0.1)
+
+
+def read_csv(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+
+def read_jsonl(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def file_keys(records):
+    return sorted((r['project'], r['repository'], r['file_path'], int(r['size_bytes'])) for r in records)
+
+
+def test_exporters_write_every_record_without_retaining_them(mock_org, make_scanner, tmp_path):
+    server = mock_org(**EXPORTER_ORG)
+    baseline = make_scanner(server, max_workers=4).scan_organization()
+    exporters = [CsvExporter(str(tmp_path / 'scan')), JsonLinesExporter(str(tmp_path / 'scan'))]
+    results = make_scanner(server, max_workers=4).scan_organization(exporters, retain_files=False)
+
+    assert len(results['large_files']) == 0
+    assert results['total_large_files'] == baseline['total_large_files'] > 0
+    expected = file_keys(baseline['large_files'])
+    for rows, repos in ((read_csv(exporters[0].files_path), read_csv(exporters[0].repos_path)),
+                        (read_jsonl(exporters[1].files_path), read_jsonl(exporters[1].repos_path))):
+        assert len(rows) == results['total_large_files']
+        assert file_keys(rows) == expected
+        assert list(rows[0]) == FILE_RECORD_FIELDS
+        assert len(repos) == len(results['repo_stats'])
+        assert list(repos[0]) == REPO_STAT_FIELDS
+    assert results['exported_files'] == [
+        path for exporter in exporters for path in (exporter.files_path, exporter.repos_path)]
+
+
+def test_parquet_round_trip(mock_org, make_scanner, tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    server = mock_org(**EXPORTER_ORG)
+    exporter = ParquetExporter(str(tmp_path / 'scan'), batch_size=7)  # Several row groups
+    results = make_scanner(server, max_workers=4).scan_organization([exporter])
+
+    files = pq.read_table(exporter.files_path)
+    assert files.column_names == FILE_RECORD_FIELDS
+    assert files.num_rows == results['total_large_files']
+    assert pq.ParquetFile(exporter.files_path).metadata.num_row_groups > 1
+    assert file_keys(files.to_pylist()) == file_keys(results['large_files'])
+    repos = pq.read_table(exporter.repos_path).to_pylist()
+    assert repos == [{field: stat.get(field) for field in REPO_STAT_FIELDS} for stat in results['repo_stats']]
+
+
+def test_exporters_are_closed_when_the_scan_fails(mock_org, make_scanner, tmp_path):
+    server = mock_org(**EXPORTER_ORG)
+    scanner = make_scanner(server, max_workers=2)
+    exporters = [CsvExporter(str(tmp_path / 'scan')), JsonLinesExporter(str(tmp_path / 'scan'))]
+    if importlib.util.find_spec('pyarrow'):
+        exporters.append(ParquetExporter(str(tmp_path / 'scan')))
+
+    scan_repository = scanner._scan_repository
+    calls = []
+
+    def failing(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == 6:
+            raise KeyboardInterrupt
+        return scan_repository(*args, **kwargs)
+
+    scanner._scan_repository = failing
+    with pytest.raises(KeyboardInterrupt):
+        scanner.scan_organization(exporters, retain_files=False)
+
+    assert exporters[0]._files.closed and exporters[0]._repos.closed
+    assert exporters[1]._files.closed and exporters[1]._repos.closed
+    # Whatever was merged before the failure is on disk in whole rows
+    assert all(row['size_bytes'].isdigit() for row in read_csv(exporters[0].files_path))
+    assert len(read_jsonl(exporters[1].repos_path)) == len(read_csv(exporters[0].repos_path))
+    if len(exporters) == 3:
+        import pyarrow.parquet as pq
+        assert pq.read_table(exporters[2].repos_path).num_rows == len(read_csv(exporters[0].repos_path))
+
+
+def test_exporters_opened_before_a_failing_one_are_closed(mock_org, make_scanner, tmp_path):
+    class FailingExporter(JsonLinesExporter):
+        def open(self):
+            raise OSError("disk full")
+
+    server = mock_org(**EXPORTER_ORG)
+    csv_exporter = CsvExporter(str(tmp_path / 'scan'))
+    with pytest.raises(OSError):
+        make_scanner(server).scan_organization([csv_exporter, FailingExporter(str(tmp_path / 'scan'))])
+
+    assert csv_exporter._files.closed and csv_exporter._repos.closed
+    assert server.stats['requests'] == 0
+
+
+def test_reports_refuse_results_without_file_records(mock_org, make_scanner, tmp_path):
+    pytest.importorskip('openpyxl')
+    server = mock_org(**EXPORTER_ORG)
+    scanner = make_scanner(server, max_workers=4)
+    results = scanner.scan_organization(retain_files=False)
+    assert results['total_large_files'] > 0
+
+    with pytest.raises(ValueError, match='retain_files'):
+        scanner.export_to_excel(results, str(tmp_path / 'report.xlsx'))
+    database = ScanDatabase(str(tmp_path / 'scans.db'))
+    try:
+        with pytest.raises(ValueError, match='retain_files'):
+            database.add_scan(results, scanner.organization, scanner.min_size_bytes, '2026-01-01T00:00:00')
+        assert database.latest_scan_id(scanner.organization) is None
+    finally:
+        database.close()
+    assert not (tmp_path / 'report.xlsx').exists()
+
+
+@pytest.mark.parametrize('formats, retained', [('csv,jsonl', False), ('csv,xlsx', True)])
+def test_cli_keeps_records_only_for_outputs_that_need_them(mock_org, tmp_path, monkeypatch, formats, retained):
+    if 'xlsx' in formats:
+        pytest.importorskip('openpyxl')
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('AZURE_DEVOPS_TOKEN', 'test-token')
+    server = mock_org(**EXPORTER_ORG)
+
+    scan_organization = scanner_module.AzureDevOpsOrgScanner.scan_organization
+    seen = []
+
+    def recording(self, *args, **kwargs):
+        seen.append(kwargs['retain_files'])
+        return scan_organization(self, *args, **kwargs)
+
+    monkeypatch.setattr(scanner_module.AzureDevOpsOrgScanner, 'scan_organization', recording)
+    main(['scan', '--org', 'mockorg', '--base-url', server.base_url, '--format', formats, '-o', 'out'])
+
+    assert seen == [retained]
+    assert read_csv('out_files.csv')
@@ -0,0 +1,48 @@
+"""Falling back from a Full items listing to listing a repository folder by folder"""
+
+import pytest
+
+
+def listing_requests(scanner):
+    """(Full listings, OneLevel folder listings) requested, retries included"""
+    endpoints = scanner.telemetry.endpoints
+    return tuple(endpoints[name]['requests'] if name in endpoints else 0 for name in ('items', 'items_folder'))
+
+
+@pytest.mark.parametrize('fault', ['truncate', '500'])
+def test_failed_full_listings_are_walked_by_folder(mock_org, make_scanner, snapshot, fault):
+    server = mock_org(files_per_folder=20)
+    baseline = make_scanner(server, max_workers=4).scan_organization()
+
+    server.org.shape.full_listing_fault = fault
+    scanner = make_scanner(server, max_workers=4)
+    scanner.scheduler.max_retries = 0
+    results = scanner.scan_organization()
+
+    full, by_folder = listing_requests(scanner)
+    assert full > 0 and by_folder > full
+    assert baseline['total_large_files'] > 0
+    assert snapshot(results) == snapshot(baseline)
+
+
+def test_huge_repositories_are_walked_without_a_full_listing(mock_org, make_scanner, snapshot):
+    server = mock_org(files_per_folder=20)
+    baseline = make_scanner(server, max_workers=4).scan_organization()
+
+    scanner = make_scanner(server, max_workers=4)
+    scanner.FOLDER_WALK_MIN_REPO_SIZE = 300 * 64 * 1024  # The size every mock repository reports
+    results = scanner.scan_organization()
+
+    assert listing_requests(scanner)[0] == 0
+    assert listing_requests(scanner)[1] > 0
+    assert snapshot(results) == snapshot(baseline)
+
+
+def test_client_errors_do_not_fall_back(mock_org, make_scanner):
+    server = mock_org(files_per_folder=20, full_listing_fault='403')
+    scanner = make_scanner(server, max_workers=4)
+    results = scanner.scan_organization()
+
+    assert listing_requests(scanner) == (server.stats['errors'], 0)
+    assert len(results['failed_repos']) == results['total_repos'] > 0
+    assert all('403' in failed['error'] for failed in results['failed_repos'])
@@ -0,0 +1,116 @@
+"""Size histograms, saved scans and offline queries"""
+
+import random
+
+import pytest
+
+from azure_devops_large_files_scanner import SizeHistogram, load_scan, main, query_scan
+
+MB = 1024 * 1024
+THRESHOLD_MB = 64  # A bucket boundary (a power of two), so thresholded answers are exact
+
+
+def exact(sizes, min_size, max_size=None):
+    chosen = [size for size in sizes if size >= min_size and (max_size is None or size < max_size)]
+    return len(chosen), sum(chosen)
+
+
+def results_as_scan(results):
+    """The in-memory histograms of a scan, in the form query_scan() takes"""
+    return {'organization': 'mockorg', 'histograms': results['histograms']}
+
+
+def test_answers_on_bucket_boundaries_are_exact():
+    rnd = random.Random(11)
+    sizes = [0, 1, 2, 3] + [int(rnd.lognormvariate(12, 3)) for _ in range(20000)]
+    histogram = SizeHistogram()
+    for size in sizes:
+        histogram.add(size)
+
+    assert (histogram.count, histogram.total_size) == (len(sizes), sum(sizes))
+    boundaries = sorted(SizeHistogram.bucket_bounds(bucket)[0] for bucket in histogram.buckets)
+    for low in boundaries:
+        assert histogram.summarize(low) == exact(sizes, low)
+    for low, high in zip(boundaries, boundaries[3:]):
+        assert histogram.summarize(low, high) == exact(sizes, low, high)
+
+
+def test_bucket_bounds_tile_the_sizes():
+    previous_high = 0
+    for bucket in range(1 + 40 * SizeHistogram.SUB_BUCKETS):
+        low, high = SizeHistogram.bucket_bounds(bucket)
+        if low == high:
+            continue  # Sub-buckets narrower than one byte
+        assert low == previous_high
+        assert SizeHistogram.bucket_of(low) == bucket
+        assert SizeHistogram.bucket_of(high - 1) == bucket
+        previous_high = high
+
+
+def test_removing_a_size_undoes_adding_it():
+    histogram = SizeHistogram()
+    for size in (5, 5 * MB, 70 * MB):
+        histogram.add(size)
+    before = histogram.to_dict()
+    histogram.add(3 * MB)
+    histogram.remove(3 * MB)
+    assert histogram.to_dict() == before
+    assert SizeHistogram.from_dict(before).to_dict() == before
+
+
+@pytest.fixture
+def saved_scan(mock_org, make_scanner, tmp_path):
+    server = mock_org(large_file_ratio=0.1)
+    scanner = make_scanner(server, max_workers=4, min_size_mb=THRESHOLD_MB)
+    results = scanner.scan_organization()
+    path = scanner.save_scan(results, str(tmp_path / 'org.scan.json'))
+    return server, results, path
+
+
+def test_histograms_hold_every_scanned_blob(saved_scan):
+    server, results, _ = saved_scan
+    org = server.org
+    sizes = [
+        item['size']
+        for project_idx in range(org.shape.projects) for repo_idx in range(org.shape.repos_per_project)
+        for item in org.items(project_idx, repo_idx)['all'] if item['gitObjectType'] == 'blob'
+    ]
+    histogram = results['histograms']['organization']
+
+    assert histogram.count == results['total_files_scanned'] == len(sizes)
+    assert histogram.total_size == sum(sizes)
+    assert results['total_large_files'] > 0
+    assert histogram.summarize(THRESHOLD_MB * MB) == (results['total_large_files'], results['total_size'])
+    for group in ('projects', 'repositories', 'extensions'):
+        assert sum(h.count for h in results['histograms'][group].values()) == results['total_files_scanned']
+
+
+@pytest.mark.parametrize('group, field', [('projects', 'project'), ('extensions', 'extension')])
+def test_saved_scan_answers_like_the_scan(saved_scan, group, field):
+    _, results, path = saved_scan
+    scan = load_scan(path)
+
+    assert scan['totals']['total_files_scanned'] == results['total_files_scanned']
+    rows = query_scan(scan, THRESHOLD_MB * MB, group_by=group)
+    assert rows == query_scan(results_as_scan(results), THRESHOLD_MB * MB, group_by=group)
+    expected = {}
+    for f in results['large_files']:
+        count, total = expected.get(f[field], (0, 0))
+        expected[f[field]] = (count + 1, total + f['size_bytes'])
+    assert {row['name']: (row['count'], row['total_size']) for row in rows} == expected
+    assert [row['total_size'] for row in rows] == sorted((row['total_size'] for row in rows), reverse=True)
+
+    # A narrower range, between two boundaries
+    low, high = 8 * MB, 32 * MB
+    assert query_scan(scan, low, high, group) == query_scan(results_as_scan(results), low, high, group)
+
+
+def test_query_command_prints_the_saved_totals(saved_scan, capsys):
+    _, results, path = saved_scan
+    main(['query', path, '--min-mb', str(THRESHOLD_MB), '--by', 'project'])
+    output = capsys.readouterr().out
+
+    for row in query_scan(load_scan(path), THRESHOLD_MB * MB, group_by='projects'):
+        assert f"{row['name']:<50} {row['count']:>8,} files" in output
+    main(['query', path, '--min-mb', str(THRESHOLD_MB)])
+    assert f"{results['total_large_files']:>8,} files" in capsys.readouterr().out
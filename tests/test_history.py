@@ -0,0 +1,80 @@
+"""History scans of local bare mirrors"""
+
+import shutil
+import subprocess
+
+import pytest
+
+from azure_devops_large_files_scanner import AzureDevOpsOrgScanner, discover_mirrors, iter_mirror_blobs, main
+
+pytestmark = pytest.mark.skipif(shutil.which('git') is None, reason="needs git")
+
+LARGE = 2 * 1024 * 1024
+ORIGIN = "https://dev.azure.com/contoso/Project/_git/repo"
+
+
+def git(*arguments, cwd=None):
+    return subprocess.run(
+        ['git', '-c', 'user.name=Test', '-c', 'user.email=test@example.com', '-c', 'init.defaultBranch=main',
+         *arguments],
+        cwd=cwd, capture_output=True, text=True, check=True,
+    ).stdout
+
+
+@pytest.fixture
+def mirror_root(tmp_path):
+    """<root>/Project/repo.git, a bare mirror whose only large blob was deleted in a later commit"""
+    work = tmp_path / 'work'
+    git('init', str(work))
+    (work / 'README.md').write_text("readme\n")
+    (work / 'assets').mkdir()
+    (work / 'assets' / 'video.bin').write_bytes(b'\x01' * LARGE)
+    git('add', '-A', cwd=work)
+    git('commit', '-m', "Add a video", cwd=work)
+    git('rm', '-q', 'assets/video.bin', cwd=work)
+    git('commit', '-m', "Remove the video", cwd=work)
+
+    root = tmp_path / 'mirrors'
+    mirror = root / 'Project' / 'repo.git'
+    git('init', '--bare', str(mirror))
+    git('push', '-q', '--mirror', str(mirror), cwd=work)
+    git('remote', 'add', 'origin', ORIGIN.replace('https://', 'https://user:s3cret@'), cwd=mirror)
+    return root
+
+
+def test_mirrors_are_discovered_in_every_layout(mirror_root):
+    mirror = str(mirror_root / 'Project' / 'repo.git')
+    assert discover_mirrors(str(mirror_root)) == [('Project', 'repo', mirror)]
+    assert discover_mirrors(str(mirror_root / 'Project')) == [('Project', 'repo', mirror)]
+    assert discover_mirrors(mirror) == [('Project', 'repo', mirror)]
+
+
+def test_a_blob_only_in_history_is_found(mirror_root):
+    mirror = str(mirror_root / 'Project' / 'repo.git')
+    assert 'video.bin' not in git('ls-tree', '-r', '--name-only', 'HEAD', cwd=mirror)
+
+    blobs = {path: size for _, size, path in iter_mirror_blobs(mirror)}
+    assert blobs == {'/README.md': len("readme\n"), '/assets/video.bin': LARGE}
+
+    scanner = AzureDevOpsOrgScanner('mirrors', bearer_token='', min_size_mb=1)
+    results = scanner.scan_mirrors(discover_mirrors(str(mirror_root)))
+    assert [(f['project'], f['repository'], f['file_path'], f['size_bytes']) for f in results['large_files']] == [
+        ('Project', 'repo', '/assets/video.bin', LARGE)]
+    assert results['total_files_scanned'] == 2
+    assert not results['failed_repos']
+    # The mirror's origin carries credentials; reports must not
+    assert results['large_files'][0]['repo_url'] == ORIGIN
+    assert [stat['repo_url'] for stat in results['repo_stats']] == [ORIGIN]
+
+
+def test_history_command_writes_the_reports(mirror_root, tmp_path, monkeypatch):
+    openpyxl = pytest.importorskip('openpyxl')
+    monkeypatch.chdir(tmp_path)
+    main(['history', str(mirror_root), '--min-mb', '1', '--workers', '2', '-o', 'history.xlsx'])
+
+    workbook = openpyxl.load_workbook(tmp_path / 'history.xlsx', read_only=True)
+    cells = [cell for ws in workbook.worksheets for row in ws.iter_rows(values_only=True) for cell in row]
+    assert '/assets/video.bin' in cells
+    assert ORIGIN in cells
+    assert not any('s3cret' in str(cell) for cell in cells)
+    assert (tmp_path / 'history.scan.json').exists()
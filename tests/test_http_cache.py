@@ -0,0 +1,35 @@
+"""Conditional-request cache of the project and repository listings"""
+
+from azure_devops_large_files_scanner import AzureDevOpsOrgScanner, HttpResponseCache
+
+
+def test_listings_are_revalidated_with_etags(mock_org, make_scanner, snapshot, tmp_path):
+    server = mock_org()
+    first = make_scanner(server, max_workers=4, http_cache=HttpResponseCache(str(tmp_path))).scan_organization()
+    assert first['http_cache']['misses'] > 0
+    assert first['http_cache']['revalidated'] == 0
+
+    second = make_scanner(server, max_workers=4, http_cache=HttpResponseCache(str(tmp_path))).scan_organization()
+    # One project page and three repository listings, all answered 304
+    assert second['http_cache'] == {'hits': 0, 'revalidated': 4, 'misses': 0}
+    assert server.stats['not_modified'] == 4
+    assert snapshot(second) == snapshot(first)
+
+
+def test_fresh_entries_are_served_without_a_request(mock_org, make_scanner, snapshot, tmp_path):
+    server = mock_org()
+    first = make_scanner(server, max_workers=4, http_cache=HttpResponseCache(str(tmp_path), ttl=3600)).scan_organization()
+    second = make_scanner(server, max_workers=4, http_cache=HttpResponseCache(str(tmp_path), ttl=3600)).scan_organization()
+
+    assert second['http_cache'] == {'hits': 4, 'revalidated': 0, 'misses': 0}
+    assert server.stats['not_modified'] == 0
+    assert snapshot(second) == snapshot(first)
+
+
+def test_entries_are_not_shared_between_identities(mock_org, tmp_path):
+    server = mock_org()
+    for token in ('first-token', 'second-token'):
+        scanner = AzureDevOpsOrgScanner('mockorg', token, base_url=server.base_url,
+                                        http_cache=HttpResponseCache(str(tmp_path), ttl=3600))
+        results = scanner.scan_organization()
+        assert results['http_cache']['hits'] == 0
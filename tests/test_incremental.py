@@ -0,0 +1,38 @@
+"""Incremental re-scans from the per-repository ScanCache"""
+
+
+def test_unchanged_repositories_come_from_the_cache(mock_org, make_scanner, snapshot, tmp_path):
+    server = mock_org()
+    cache_path = str(tmp_path / 'cache.json')
+    first = make_scanner(server, max_workers=4, cache_path=cache_path).scan_organization()
+    second = make_scanner(server, max_workers=4, cache_path=cache_path).scan_organization()
+
+    assert first['repos_from_cache'] == 0
+    assert second['repos_from_cache'] == second['total_repos'] == 12
+    assert second['repos_fetched'] == 0
+    # Cached repositories still count towards the unique blob totals
+    assert snapshot(second) == snapshot(first)
+
+
+def test_pushed_repository_is_scanned_again(mock_org, make_scanner, snapshot, tmp_path):
+    server = mock_org(fork_ratio=0.0)
+    cache_path = str(tmp_path / 'cache.json')
+    make_scanner(server, max_workers=4, cache_path=cache_path).scan_organization()
+
+    server.org.push(1, 2, server.base_url)
+    rescan = make_scanner(server, max_workers=4, cache_path=cache_path).scan_organization()
+    fresh = make_scanner(server, max_workers=4).scan_organization()
+
+    assert rescan['repos_fetched'] == 1
+    assert rescan['repos_from_cache'] == 11
+    assert snapshot(rescan) == snapshot(fresh)
+
+
+def test_cache_for_another_threshold_is_dropped(mock_org, make_scanner, tmp_path):
+    server = mock_org()
+    cache_path = str(tmp_path / 'cache.json')
+    make_scanner(server, max_workers=4, cache_path=cache_path).scan_organization()
+    results = make_scanner(server, max_workers=4, cache_path=cache_path, min_size_mb=200).scan_organization()
+
+    assert results['repos_from_cache'] == 0
+    assert all(f['size_bytes'] >= 200 * 1024 * 1024 for f in results['large_files'])
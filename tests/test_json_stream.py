@@ -0,0 +1,68 @@
+"""iter_json_array_items: decoding a streamed listing from arbitrary chunks"""
+
+import json
+
+import pytest
+
+from azure_devops_large_files_scanner import iter_json_array_items
+
+ITEMS = [
+    {'path': '/src/app.py', 'size': 1234567890123, 'gitObjectType': 'blob', 'isFolder': False},
+    {'path': '/docs/café 日本語 \U0001F600.md', 'size': 0, 'latestProcessedChange': None},
+    {'path': 'quote " backslash \\ slash / controls \b\f\n\r\t \u0001', 'size': -1.5e-7},
+    {'nested': {'list': [1, [2, []], {}], 'flag': True}},
+    [], 'text', 42, 0.5, None, False,
+]
+
+
+def body(items=ITEMS, ensure_ascii=False, indent=None) -> bytes:
+    """A listing with keys before and after the array, as the service sends them"""
+    text = json.dumps({'count': len(items), 'value': items, 'extra': {'value': ['not this one']}},
+                      ensure_ascii=ensure_ascii, indent=indent)
+    return text.encode('utf-8')
+
+
+def chunked(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 5, 7, 64, 1 << 20])
+@pytest.mark.parametrize('ensure_ascii', [False, True])
+def test_every_chunking_yields_the_items(size, ensure_ascii):
+    # Raw multibyte characters, or \uXXXX escapes and surrogate pairs, split anywhere
+    data = body(ensure_ascii=ensure_ascii)
+    assert list(iter_json_array_items(chunked(data, size))) == ITEMS
+
+
+def test_whitespace_and_empty_chunks_are_skipped():
+    data = body(indent=2)
+    chunks = [piece for chunk in chunked(data, 3) for piece in (b'', chunk)]
+    assert list(iter_json_array_items(chunks)) == ITEMS
+
+
+def test_a_number_split_at_a_chunk_boundary_is_read_whole():
+    data = b'{"value": [12345678, 3.25e10]}'
+    for cut in range(len(data)):
+        assert list(iter_json_array_items([data[:cut], data[cut:]])) == [12345678, 3.25e10]
+
+
+def test_other_keys_and_empty_arrays():
+    assert list(iter_json_array_items([b'{"count": 0, "value": []}'])) == []
+    assert list(iter_json_array_items([b'{"count": 0}'])) == []
+    assert list(iter_json_array_items([b'{"items": [1], "value": [2]}'], key='items')) == [1]
+
+
+@pytest.mark.parametrize('size', [1, 4])
+def test_every_truncated_body_raises(size):
+    data = body()
+    for end in range(len(data)):
+        with pytest.raises(ValueError):
+            list(iter_json_array_items(chunked(data[:end], size)))
+
+
+@pytest.mark.parametrize('data', [
+    b'[1, 2]', b'{"value": [1 2]}', b'{"value": [1,]}', b'{"value": [1]]', b'{"value": [1],}', b'{1: [1]}',
+])
+def test_malformed_bodies_raise(data):
+    with pytest.raises(ValueError):
+        list(iter_json_array_items(chunked(data, 2)))
@@ -0,0 +1,140 @@
+"""Several organizations in one run: FairWorkPool, MultiOrgScanner and combine_org_results"""
+
+import threading
+
+import pytest
+
+from azure_devops_large_files_scanner import FairWorkPool, MultiOrgScanner, combine_org_results
+
+
+@pytest.fixture
+def pool():
+    pools = []
+
+    def start(workers: int) -> FairWorkPool:
+        pools.append(FairWorkPool(workers))
+        return pools[-1]
+
+    yield start
+    for started in pools:
+        started.shutdown()
+
+
+def queue_tasks(pool, organization, count, ran, gate=None):
+    """Queue ``count`` tasks that record (organization, i) in ``ran``; the first waits for ``gate``"""
+    def task(i):
+        if gate is not None and i == 0:
+            gate.wait(10)
+        ran.append((organization, i))
+
+    return [pool.submit(organization, task, i) for i in range(count)]
+
+
+def test_a_large_organization_does_not_starve_a_small_one(pool):
+    fair = pool(1)
+    fair.queue('large')
+    fair.queue('small')
+    ran, gate = [], threading.Event()
+    large = queue_tasks(fair, 'large', 20, ran, gate)
+    small = queue_tasks(fair, 'small', 3, ran)
+    gate.set()
+    for future in large + small:
+        future.result(10)
+
+    # Turns alternate while both have work
+    assert ran[:6] == [('large', 0), ('small', 0), ('large', 1), ('small', 1), ('large', 2), ('small', 2)]
+    assert ran[6:] == [('large', i) for i in range(3, 20)]
+
+
+def test_a_paused_organization_frees_the_workers(pool):
+    fair = pool(2)
+    fair.IDLE_POLL = 0.01
+    budget = {'throttled': 0}
+    fair.queue('throttled', lambda: budget['throttled'])
+    fair.queue('other')
+    ran = []
+    throttled = queue_tasks(fair, 'throttled', 5, ran)
+    other = queue_tasks(fair, 'other', 10, ran)
+
+    for future in other:
+        future.result(10)
+    assert not any(future.done() for future in throttled)
+
+    budget['throttled'] = 1
+    for future in throttled:
+        future.result(10)
+    assert ran[10:] == [('throttled', i) for i in range(5)]
+
+
+def test_an_aborted_scan_drops_its_queued_work(pool):
+    fair = pool(1)
+    fair.queue('other')
+    ran, gate = [], threading.Event()
+    other = queue_tasks(fair, 'other', 1, ran, gate)  # Holds the only worker
+    with pytest.raises(RuntimeError):
+        with fair.queue('aborted') as queue:
+            aborted = [queue.submit(ran.append, ('aborted', i)) for i in range(5)]
+            raise RuntimeError("scan failed")
+    later = queue_tasks(fair, 'other', 3, ran)
+    gate.set()
+
+    for future in other + later:
+        future.result(10)
+    assert all(future.cancelled() for future in aborted)
+    assert [organization for organization, _ in ran] == ['other'] * 4
+
+
+def test_a_failing_organization_does_not_stop_the_others(mock_org, make_scanner, snapshot):
+    servers = {organization: mock_org(organization=organization, seed=seed)
+               for organization, seed in (('alpha', 1), ('beta', 2))}
+    multi = MultiOrgScanner([(organization, 'test-token') for organization in servers], max_workers=2,
+                            per_org_concurrency=2, base_urls={o: server.base_url for o, server in servers.items()})
+    try:
+        failing = multi.scanners['alpha']
+        scan_repository = failing._scan_repository
+        calls = []
+
+        def scan(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 2:
+                raise RuntimeError("token rejected")
+            return scan_repository(*args, **kwargs)
+
+        failing._scan_repository = scan
+        results = multi.scan()
+        assert not multi.pool._queues['alpha']  # Nothing of the aborted scan left queued
+    finally:
+        multi.close()
+
+    assert list(results) == ['beta']
+    assert 'token rejected' in multi.errors['alpha']
+    assert snapshot(results['beta']) == snapshot(make_scanner(servers['beta'], max_workers=4).scan_organization())
+
+
+def test_combined_results_keep_organizations_apart_and_count_shared_blobs_once(mock_org):
+    # The same seed gives both organizations the same content, and so the same blobs
+    servers = {organization: mock_org(organization=organization, seed=7) for organization in ('alpha', 'beta')}
+    multi = MultiOrgScanner([(organization, 'test-token') for organization in servers], max_workers=4,
+                            base_urls={o: server.base_url for o, server in servers.items()})
+    try:
+        org_results = multi.scan()
+        combined = combine_org_results(org_results, multi.blob_index())
+    finally:
+        multi.close()
+
+    alpha, beta = org_results['alpha'], org_results['beta']
+    assert alpha['total_large_files'] > 0
+    for key in ('total_projects', 'total_repos', 'total_files_scanned', 'total_large_files', 'total_size'):
+        assert combined[key] == alpha[key] + beta[key]
+    assert combined['unique_large_files'] == alpha['unique_large_files']
+    assert combined['unique_size'] == alpha['unique_size']
+    assert combined['unique_blob_count'] == alpha['unique_blob_count']
+    assert combined['unique_blob_bytes'] == alpha['unique_blob_bytes']
+
+    assert {stat['project'] for stat in combined['project_stats']} == {
+        f"{organization}/{stat['project']}" for organization, results in org_results.items()
+        for stat in results['project_stats']}
+    assert sorted((f['project'], f['file_path']) for f in combined['large_files']) == sorted(
+        (f"{organization}/{f['project']}", f['file_path'])
+        for organization, results in org_results.items() for f in results['large_files'])
+    assert set(combined['histograms']['projects']) == {stat['project'] for stat in combined['project_stats']}
@@ -0,0 +1,46 @@
+"""End-to-end organization scans against the mock server"""
+
+import pytest
+
+
+@pytest.mark.parametrize('workers', [4, 16])
+def test_results_do_not_depend_on_worker_count(mock_org, make_scanner, snapshot, workers):
+    server = mock_org()
+    baseline = make_scanner(server, max_workers=1).scan_organization()
+    results = make_scanner(server, max_workers=workers).scan_organization()
+
+    assert baseline['total_large_files'] > 0
+    assert snapshot(results) == snapshot(baseline)
+    # Forks share their source's tree; which of them lists it must not change the count
+    assert baseline['repos_deduplicated'] > 0
+    assert results['repos_deduplicated'] == baseline['repos_deduplicated']
+
+
+def test_throttling_and_paging_do_not_change_results(mock_org, make_scanner, snapshot):
+    server = mock_org()
+    baseline = make_scanner(server, max_workers=4).scan_organization()
+
+    server.org.shape.throttle_rate = 0.1
+    server.org.shape.throttle_retry_after = 0
+    scanner = make_scanner(server, max_workers=4)
+    scanner.PROJECTS_PAGE_SIZE = 1
+    results = scanner.scan_organization()
+
+    assert server.stats['throttled'] > 0
+    assert snapshot(results) == snapshot(baseline)
+
+
+def test_large_files_match_the_organization(mock_org, make_scanner):
+    server = mock_org(fork_ratio=0.0)
+    results = make_scanner(server, max_workers=4).scan_organization()
+
+    expected = set()
+    for project_idx, project in enumerate(server.org.projects):
+        for repo_idx, repo in enumerate(server.org.repositories(project_idx, server.base_url)):
+            for item in server.org.items(project_idx, repo_idx)['all']:
+                if item['gitObjectType'] == 'blob' and item['size'] >= 100 * 1024 * 1024:
+                    expected.add((project['name'], repo['name'], item['path'], item['size']))
+
+    assert {(f['project'], f['repository'], f['file_path'], f['size_bytes']) for f in results['large_files']} == expected
+    assert results['total_files_scanned'] == 3 * 4 * 300
+    assert not results['failed_repos']
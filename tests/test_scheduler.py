@@ -0,0 +1,57 @@
+"""RateLimitScheduler slots around streamed item listings"""
+
+import gc
+import threading
+
+import pytest
+import requests
+
+import azure_devops_large_files_scanner as scanner_module
+
+
+def test_streamed_listings_hold_their_slot_until_read(mock_org, make_scanner, monkeypatch):
+    server = mock_org(projects=2, repos_per_project=8, items_per_repo=3000, fork_ratio=0.0, latency_ms=5)
+    scanner = make_scanner(server, max_workers=8)
+    scanner.scheduler.max_concurrency = scanner.scheduler.concurrency_limit = 2
+
+    parse = scanner_module.iter_json_array_items
+    lock = threading.Lock()
+    streams = {'open': 0, 'most': 0}
+
+    def counted(chunks, key='value'):
+        with lock:
+            streams['open'] += 1
+            streams['most'] = max(streams['most'], streams['open'])
+        try:
+            yield from parse(chunks, key)
+        finally:
+            with lock:
+                streams['open'] -= 1
+
+    monkeypatch.setattr(scanner_module, 'iter_json_array_items', counted)
+    results = scanner.scan_organization()
+
+    assert results['total_files_scanned'] == 2 * 8 * 3000
+    assert streams['most'] <= 2
+    assert scanner.scheduler.in_flight == 0
+
+
+def test_slots_are_freed_on_errors_and_abandoned_streams(mock_org, make_scanner):
+    server = mock_org(projects=1, repos_per_project=1, items_per_repo=30)
+    scanner = make_scanner(server, max_workers=2)
+    scanner.scheduler.max_retries = 0
+    repo = scanner.get_repositories_in_project('Project000')[0]
+
+    server.org.shape.error_rate = 1.0
+    for _ in range(3):
+        with pytest.raises(requests.exceptions.HTTPError):
+            list(scanner.get_repository_items('Project000', repo['id']))
+    assert scanner.scheduler.in_flight == 0
+
+    server.org.shape.error_rate = 0.0
+    items = scanner.get_repository_items('Project000', repo['id'])
+    next(items)
+    assert scanner.scheduler.in_flight == 1
+    del items
+    gc.collect()
+    assert scanner.scheduler.in_flight == 0
@@ -0,0 +1,54 @@
+"""Sharded scans merged with merge_partials()"""
+
+import pytest
+
+from azure_devops_large_files_scanner import load_partial, merge_partials
+
+
+def scan_shards(make_scanner, server, tmp_path, count: int, **options):
+    partials = []
+    for index in range(1, count + 1):
+        scanner = make_scanner(server, max_workers=4, **options)
+        results = scanner.scan_organization(shard=(index, count))
+        partials.append(load_partial(scanner.save_partial(results, str(tmp_path / f"shard-{index}.partial.json"))))
+    return partials
+
+
+@pytest.mark.parametrize('count', [1, 2, 3])
+def test_merged_shards_equal_a_single_run(mock_org, make_scanner, snapshot, tmp_path, count):
+    server = mock_org()
+    single = make_scanner(server, max_workers=4).scan_organization()
+    partials = scan_shards(make_scanner, server, tmp_path, count)
+
+    merged = merge_partials(list(reversed(partials)))
+    assert snapshot(merged) == snapshot(single)
+    # Trees shared across shards are only recognised within a shard
+    assert merged['repos_deduplicated'] <= single['repos_deduplicated']
+
+
+def test_merge_takes_the_union_of_the_shard_listings(mock_org, make_scanner, tmp_path):
+    before = mock_org(projects=3, seed=7)
+    after = mock_org(projects=4, seed=7)  # Same organization once Project003 was created
+    first = scan_shards(make_scanner, before, tmp_path, 2)[0]
+    second = scan_shards(make_scanner, after, tmp_path, 2)[1]
+
+    merged = merge_partials([first, second])
+    assert merged['total_projects'] == 4
+    assert [stat['project'] for stat in merged['project_stats']][-1] == 'Project003'
+
+    repos = after.org.repositories(3, after.base_url)
+    missing = {repo['name'] for repo in repos if not any(r['repo_id'] == repo['id'] for r in second['repositories'])}
+    assert missing
+    assert {(f['project'], f['repository']) for f in merged['failed_repos']} == {('Project003', name) for name in missing}
+    assert merged['total_repos'] == 4 * 4
+
+
+def test_merge_needs_every_shard_of_one_scan(mock_org, make_scanner, tmp_path):
+    server = mock_org()
+    partials = scan_shards(make_scanner, server, tmp_path, 2)
+    with pytest.raises(ValueError):
+        merge_partials(partials[:1])
+
+    other_threshold = scan_shards(make_scanner, server, tmp_path, 2, min_size_mb=200)
+    with pytest.raises(ValueError):
+        merge_partials([partials[0], other_threshold[1]])
@@ -0,0 +1,108 @@
+"""ScanTelemetry of a scan of the mock organization"""
+
+import math
+import re
+
+import pytest
+
+SAMPLE = re.compile(r'^(?P<name>[a-zA-Z_:][a-zA-Z0-9_:]*)\{(?P<labels>.*)\} (?P<value>\S+)$')
+LABEL = re.compile(r'(?P<key>[a-zA-Z_][a-zA-Z0-9_]*)="(?P<value>(?:[^"\\]|\\.)*)"(?:,|$)')
+
+
+def parse_prometheus(text):
+    """Samples of the text exposition format as {(name, frozenset of labels): value}; fails on malformed lines"""
+    samples, types = {}, {}
+    for line in text.splitlines():
+        if line.startswith('# TYPE '):
+            _, _, name, kind = line.split(' ')
+            types[name] = kind
+            continue
+        if line.startswith('# HELP '):
+            continue
+        match = SAMPLE.match(line)
+        assert match, line
+        labels = match['labels']
+        pairs = LABEL.findall(labels)
+        assert ''.join(f'{key}="{value}",' for key, value in pairs).rstrip(',') == labels, line
+        name = match['name']
+        assert name in types or name.rsplit('_', 1)[0] in types, line
+        samples[(name, frozenset(pairs))] = float(match['value'])
+    return samples
+
+
+@pytest.fixture
+def scanned(mock_org, make_scanner):
+    """Scan of a throttling mock organization with every repository timing recorded"""
+    server = mock_org(projects=6, throttle_rate=0.1, throttle_retry_after=0, latency_ms=1, latency_jitter_ms=4)
+    scanner = make_scanner(server, max_workers=4)
+    timings = []
+    record_repository = scanner.telemetry.record_repository
+
+    def recording(repo_result, seconds):
+        timings.append((seconds, repo_result['project'], repo_result['repository']))
+        record_repository(repo_result, seconds)
+
+    scanner.telemetry.record_repository = recording
+    results = scanner.scan_organization()
+    return server, scanner, results, timings
+
+
+def test_requests_and_statuses_add_up_to_the_servers(scanned):
+    server, scanner, results, _ = scanned
+    endpoints = scanner.telemetry.to_dict()['endpoints']
+
+    assert {'projects', 'repositories', 'items'} <= set(endpoints)
+    assert sum(stats['requests'] for stats in endpoints.values()) == server.stats['requests']
+    assert server.stats['throttled'] > 0
+    assert sum(stats['status_codes'].get('429', 0) for stats in endpoints.values()) == server.stats['throttled']
+    assert sum(stats['throttled'] for stats in endpoints.values()) == server.stats['throttled']
+    for stats in endpoints.values():
+        assert sum(stats['status_codes'].values()) == stats['requests']
+        assert stats['errors'] == sum(count for code, count in stats['status_codes'].items() if code != '200')
+    assert endpoints['items']['bytes'] > 0
+    assert endpoints['items']['stream_seconds'] > 0
+    assert endpoints['items']['decode_seconds'] > 0
+    assert not results['failed_repos']
+
+
+def test_phases_percentiles_and_slowest_repositories(scanned):
+    _, scanner, results, timings = scanned
+    telemetry = scanner.telemetry
+    data = telemetry.to_dict()
+
+    for phase in ('list_projects', 'scan_repositories'):
+        assert data['phases'][phase]['wall_seconds'] > 0
+        assert data['phases'][phase]['cpu_seconds'] >= 0
+    assert data['phases']['list_projects']['wall_seconds'] <= data['phases']['scan_repositories']['wall_seconds']
+
+    for endpoint, stats in data['endpoints'].items():
+        latencies = sorted(telemetry.endpoints[endpoint]['latencies'])
+        nearest_rank = {key: latencies[math.ceil(len(latencies) * fraction) - 1]
+                        for key, fraction in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99))}
+        assert {key: stats['latency_seconds'][key] for key in nearest_rank} == nearest_rank
+        assert stats['latency_seconds']['max'] == latencies[-1]
+        assert stats['latency_seconds']['sum'] == pytest.approx(sum(latencies))
+
+    assert len(timings) == results['total_repos'] > telemetry.slowest_repos
+    expected = [(project, repository) for _, project, repository in sorted(timings, reverse=True)][:telemetry.slowest_repos]
+    assert [(r['project'], r['repository']) for r in data['slowest_repositories']] == expected
+    seconds = [r['seconds'] for r in data['slowest_repositories']]
+    assert seconds == sorted(seconds, reverse=True)
+
+
+def test_prometheus_text_parses(scanned):
+    _, scanner, _, _ = scanned
+    data = scanner.telemetry.to_dict()
+    samples = parse_prometheus(scanner.telemetry.to_prometheus())
+
+    for endpoint, stats in data['endpoints'].items():
+        labels = frozenset({('endpoint', endpoint)})
+        assert samples[('azure_devops_scan_http_requests_total', labels)] == stats['requests']
+        assert samples[('azure_devops_scan_http_throttled_total', labels)] == stats['throttled']
+        assert samples[('azure_devops_scan_http_request_duration_seconds_count', labels)] == stats['requests']
+        assert samples[('azure_devops_scan_http_request_duration_seconds',
+                        labels | {('quantile', '0.9')})] == stats['latency_seconds']['p90']
+    assert samples[('azure_devops_scan_phase_wall_seconds', frozenset({('phase', 'scan_repositories')}))] == \
+        data['phases']['scan_repositories']['wall_seconds']
+    slowest = [key for key in samples if key[0] == 'azure_devops_scan_repository_scan_seconds']
+    assert len(slowest) == len(data['slowest_repositories'])
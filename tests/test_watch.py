@@ -0,0 +1,131 @@
+"""Watch mode: PushWatcher and its service-hook endpoint"""
+
+import base64
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from azure_devops_large_files_scanner import PushWatcher
+
+# The unique blob totals of a watch count every blob seen since it started
+WATCH_KEYS = (
+    'total_projects', 'total_repos', 'total_files_scanned', 'total_large_files', 'total_size',
+    'unique_large_files', 'unique_size',
+)
+
+
+@pytest.fixture
+def watch(make_scanner):
+    """Seeded PushWatcher with its hook server running: ``watch(server, secret=None)`` -> (watcher, hook URL)"""
+    running = []
+
+    def start(server, secret: str = None):
+        watcher = PushWatcher(make_scanner(server, max_workers=4), debounce=0)
+        watcher.seed()
+        watcher.start()
+        hook = watcher.make_server('127.0.0.1', 0, secret)
+        threading.Thread(target=hook.serve_forever, daemon=True).start()
+        running.append((watcher, hook))
+        return watcher, f"http://127.0.0.1:{hook.server_address[1]}"
+
+    yield start
+    for watcher, hook in running:
+        hook.shutdown()
+        hook.server_close()
+        watcher.stop()
+
+
+def call(url: str, event: dict = None, password: str = None) -> int:
+    headers = {'Content-Type': 'application/json'}
+    if password is not None:
+        headers['Authorization'] = 'Basic ' + base64.b64encode(f"hook:{password}".encode()).decode()
+    data = json.dumps(event).encode() if event is not None else None
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, data=data, headers=headers), timeout=10) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def wait_until_idle(watcher, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = watcher.status()
+        if not status['pending'] and not status['in_progress']:
+            return status
+        time.sleep(0.05)
+    raise AssertionError(f"Watcher still busy: {watcher.status()}")
+
+
+def test_every_endpoint_needs_the_secret(mock_org, watch, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # Where an unauthorized /report would have written its workbook
+    server = mock_org(projects=1, repos_per_project=2, items_per_repo=50)
+    watcher, url = watch(server, secret='s3cret')
+    event = server.org.push(0, 0, server.base_url)
+
+    for password in (None, 'wrong'):
+        for path in ('/status', '/results', '/report'):
+            assert call(url + path, password=password) == 401
+        assert call(url + '/', event, password) == 401
+    assert watcher.status()['events'] == 0
+    assert list(tmp_path.iterdir()) == []
+
+    assert call(url + '/status', password='s3cret') == 200
+    assert call(url + '/results', password='s3cret') == 200
+    assert call(url + '/', event, 's3cret') == 202
+
+
+def test_without_a_secret_endpoints_are_open(mock_org, watch):
+    server = mock_org(projects=1, repos_per_project=2, items_per_repo=50)
+    _, url = watch(server)
+    assert call(url + '/status') == 200
+    assert call(url + '/', {'eventType': 'git.pullrequest.created'}) == 200
+
+
+def test_pushes_keep_results_current(mock_org, make_scanner, snapshot, watch):
+    server = mock_org(fork_ratio=0.0, large_file_ratio=0.2, files_per_folder=20)
+    watcher, url = watch(server)
+
+    pushes = [(0, 1), (1, 2), (1, 2), (2, 0)]  # Two pushes in a row to one repository
+    for project_idx, repo_idx in pushes:
+        assert call(url + '/', server.org.push(project_idx, repo_idx, server.base_url)) == 202
+    status = wait_until_idle(watcher)
+
+    assert status['events'] == len(pushes)
+    assert status['incremental'] > 0  # Pushes starting at the recorded commit patch the result in place
+    assert status['failed'] == 0
+    fresh = make_scanner(server, max_workers=4).scan_organization()
+    assert snapshot(watcher.results(), WATCH_KEYS) == snapshot(fresh, WATCH_KEYS)
+
+
+def test_pushes_to_other_branches_are_ignored(mock_org, watch):
+    server = mock_org(projects=1, repos_per_project=2, items_per_repo=50)
+    watcher, url = watch(server)
+    event = server.org.push(0, 0, server.base_url)
+    event['resource']['refUpdates'][0]['name'] = 'refs/heads/feature/elsewhere'
+
+    assert call(url + '/', event) == 200
+    assert watcher.status()['ignored'] == 1
+
+
+def test_repositories_created_during_the_watch_link_to_their_web_page(mock_org, watch):
+    server = mock_org(projects=1, repos_per_project=2, items_per_repo=50, large_file_ratio=0.2)
+    watcher, url = watch(server)
+    event = server.org.push(0, 1, server.base_url)
+    repo_id = event['resource']['repository']['id']
+    with watcher._lock:  # As if the repository was created after seed()
+        for state in (watcher.repos, watcher.repo_results, watcher.heads):
+            del state[repo_id]
+
+    assert call(url + '/', event) == 202
+    assert wait_until_idle(watcher)['rescanned'] == 1
+
+    web_url = server.org.repositories(0, server.base_url)[1]['webUrl']
+    assert event['resource']['repository']['remoteUrl'] != web_url  # The clone URL
+    results = watcher.results()
+    assert [stat['repo_url'] for stat in results['repo_stats'] if stat['repository'] == 'repo001'] == [web_url]
+    assert {f['repo_url'] for f in results['large_files'] if f['repository'] == 'repo001'} == {web_url}